@@ -0,0 +1,20 @@
+"""Command line entry point, e.g. ``python -m app migrate --status``."""
+from __future__ import annotations
+
+import sys
+
+from . import migrations
+
+COMMANDS = {
+    "migrate": migrations.main,
+}
+
+
+def main() -> int:
+    if len(sys.argv) < 2 or sys.argv[1] not in COMMANDS:
+        print(f"usage: python -m app {{{','.join(COMMANDS)}}} [options]", file=sys.stderr)
+        return 2
+    return COMMANDS[sys.argv[1]](sys.argv[2:])
+
+
+sys.exit(main())
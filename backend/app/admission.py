@@ -0,0 +1,193 @@
+"""Admission control and backpressure for the ingestion and export paths.
+
+Each lane caps how many requests run at once, globally and per client, and
+keeps a short bounded queue in front of the global cap.  Anything beyond that
+is answered immediately with ``429`` (client over its share) or ``503``
+(lane saturated) plus ``Retry-After``, so overload never piles up in the
+threadpool or on the SQLite writer.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import os
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from . import metrics
+
+ADMITTED = metrics.Counter("unet_admission_admitted", "Requests admitted per lane.", ("lane",))
+REJECTED = metrics.Counter("unet_admission_rejected", "Requests rejected per lane and reason.", ("lane", "reason"))
+ACTIVE = metrics.Gauge("unet_admission_active", "Requests currently running per lane.", ("lane",))
+QUEUED = metrics.Gauge("unet_admission_queued", "Requests waiting for a slot per lane.", ("lane",))
+
+
+def _env_number(name: str, default: float) -> float:
+    raw = os.environ.get(name)
+    return float(raw) if raw else default
+
+
+@dataclass(frozen=True)
+class LaneConfig:
+    name: str
+    max_concurrency: int
+    max_per_client: int
+    queue_size: int
+    queue_timeout: float
+
+    @classmethod
+    def from_env(cls, name: str, *, concurrency: int, per_client: int, queue: int, timeout: float) -> "LaneConfig":
+        prefix = f"UNET_{name.upper()}"
+        return cls(
+            name=name,
+            max_concurrency=int(_env_number(f"{prefix}_MAX_CONCURRENCY", concurrency)),
+            max_per_client=int(_env_number(f"{prefix}_MAX_PER_CLIENT", per_client)),
+            queue_size=int(_env_number(f"{prefix}_QUEUE_SIZE", queue)),
+            queue_timeout=_env_number(f"{prefix}_QUEUE_TIMEOUT", timeout),
+        )
+
+
+@dataclass(frozen=True)
+class Rejection:
+    status_code: int
+    reason: str
+    detail: str
+    retry_after: int
+
+
+class Lane:
+    """Concurrency slots plus a bounded FIFO of waiters; used from the event loop only."""
+
+    def __init__(self, config: LaneConfig) -> None:
+        self.config = config
+        self.active = 0
+        self.per_client: Dict[str, int] = {}
+        self.waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self, client: str) -> Optional[Rejection]:
+        config = self.config
+        if self.per_client.get(client, 0) >= config.max_per_client:
+            return self._reject(429, "client_limit", "请求过于频繁，请稍后重试", 1)
+        if self.active < config.max_concurrency and not self.waiters:
+            self._grant(client)
+            return None
+        if len(self.waiters) >= config.queue_size:
+            return self._reject(503, "queue_full", "服务繁忙，请稍后重试", math.ceil(config.queue_timeout) or 1)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        self.per_client[client] = self.per_client.get(client, 0) + 1
+        QUEUED.set(len(self.waiters), config.name)
+        try:
+            await asyncio.wait_for(waiter, timeout=config.queue_timeout)
+        except asyncio.TimeoutError:
+            # release() may have handed over the slot just as the wait timed
+            # out (wait_for can still raise then); keep it rather than leak it.
+            if not waiter.done() or waiter.cancelled():
+                self._forget(client)
+                return self._reject(503, "queue_timeout", "服务繁忙，请稍后重试", math.ceil(config.queue_timeout) or 1)
+        except asyncio.CancelledError:
+            # The client went away while queued; give back a slot if one was already handed over.
+            if waiter.done() and not waiter.cancelled():
+                self.release(client)
+            else:
+                self._forget(client)
+            raise
+        finally:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+            QUEUED.set(len(self.waiters), config.name)
+        # The slot was handed over by release(); only the bookkeeping is left.
+        ADMITTED.inc(1.0, config.name)
+        return None
+
+    def release(self, client: str) -> None:
+        self.active -= 1
+        self._forget(client)
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.active += 1
+                waiter.set_result(None)
+                break
+        ACTIVE.set(self.active, self.config.name)
+        QUEUED.set(len(self.waiters), self.config.name)
+
+    def _grant(self, client: str) -> None:
+        self.active += 1
+        self.per_client[client] = self.per_client.get(client, 0) + 1
+        ADMITTED.inc(1.0, self.config.name)
+        ACTIVE.set(self.active, self.config.name)
+
+    def _forget(self, client: str) -> None:
+        remaining = self.per_client.get(client, 0) - 1
+        if remaining > 0:
+            self.per_client[client] = remaining
+        else:
+            self.per_client.pop(client, None)
+
+    def _reject(self, status_code: int, reason: str, detail: str, retry_after: int) -> Rejection:
+        REJECTED.inc(1.0, self.config.name, reason)
+        return Rejection(status_code, reason, detail, retry_after)
+
+
+INGEST = Lane(LaneConfig.from_env("ingest", concurrency=8, per_client=4, queue=64, timeout=2.0))
+EXPORT = Lane(LaneConfig.from_env("export", concurrency=2, per_client=1, queue=4, timeout=5.0))
+
+ROUTES: List[Tuple[str, str, Lane]] = [
+    ("POST", "/api/interface4/events", INGEST),
+    ("GET", "/api/interface4/events/export", EXPORT),
+]
+
+
+def client_key(scope: Scope) -> str:
+    authorization = Headers(scope=scope).get("authorization")
+    if authorization:
+        return authorization
+    client = scope.get("client")
+    return client[0] if client else "anonymous"
+
+
+class AdmissionMiddleware:
+    """Holds a lane slot for the whole response, including streamed bodies."""
+
+    def __init__(self, app: ASGIApp, routes: Optional[List[Tuple[str, str, Lane]]] = None) -> None:
+        self.app = app
+        self.routes = {(method, path): lane for method, path, lane in (routes or ROUTES)}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        lane = self.routes.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        if lane is None:
+            await self.app(scope, receive, send)
+            return
+
+        client = client_key(scope)
+        rejection = await lane.acquire(client)
+        if rejection is not None:
+            await _send_rejection(send, rejection)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            lane.release(client)
+
+
+async def _send_rejection(send: Send, rejection: Rejection) -> None:
+    body = json.dumps({"detail": rejection.detail}, ensure_ascii=False).encode("utf-8")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": rejection.status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(rejection.retry_after).encode("latin-1")),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,372 @@
+"""Threshold, offline and communication alarms evaluated on every acquisition tick.
+
+Rules come from a JSON file named by ``UNET_ALARMS_CONFIG`` (``DEFAULT_RULES``
+otherwise)::
+
+    {"rules": [
+        {"kind": "high", "field": "temperature", "limit": 110, "hysteresis": 2, "delay": 10, "severity": "critical"},
+        {"kind": "low", "field": "level", "limit": 10, "devices": ["Hopper*"]},
+        {"kind": "rate", "field": "temperature", "limit": 0.5},
+        {"kind": "stale", "limit": 30},
+        {"kind": "offline"},
+        {"kind": "comm"}
+    ]}
+
+Each rule is expanded once per matching device and compiled into parallel
+arrays: the sample slot it reads, a sign that turns low limits into high
+ones, and its raise and clear levels.  A tick samples every slot once and
+compares all rules in a single pass over those arrays; only rules whose
+state actually changes are handled one by one.  An alarm raises after its
+condition has held for ``delay`` seconds and clears once the value is back
+past the limit by ``hysteresis``; a missing sample changes nothing.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from array import array
+from dataclasses import dataclass, field
+from datetime import datetime
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from . import data, db, metrics
+
+logger = logging.getLogger("unet.alarms")
+
+CONFIG_PATH = os.environ.get("UNET_ALARMS_CONFIG")
+MAX_ALERTS = 200
+
+EVALUATION_SECONDS = metrics.Histogram("unet_alarm_evaluation_seconds", "Duration of one alarm rule pass.")
+RULES = metrics.Gauge("unet_alarm_rules", "Compiled alarm rules (rule definitions times matching devices).")
+ACTIVE = metrics.Gauge("unet_alarm_active", "Alarms currently raised, by severity.", ("severity",))
+TRANSITIONS = metrics.Counter("unet_alarm_transitions", "Alarms raised and cleared.", ("kind", "action"))
+
+KINDS = ("high", "low", "rate", "stale", "offline", "comm")
+_DEFAULT_NAMES = {
+    "high": "{field}高于上限",
+    "low": "{field}低于下限",
+    "rate": "{field}变化过快",
+    "stale": "心跳超时",
+    "offline": "设备离线",
+    "comm": "通讯故障",
+}
+_NAN = float("nan")
+
+
+@dataclass
+class Rule:
+    kind: str
+    field: Optional[str] = None
+    limit: float = 0.5
+    hysteresis: float = 0.0
+    delay: float = 0.0
+    severity: str = "warning"
+    name: Optional[str] = None
+    devices: Tuple[str, ...] = ("*",)
+
+    @classmethod
+    def from_dict(cls, raw: Dict[str, object]) -> "Rule":
+        kind = str(raw["kind"])
+        if kind not in KINDS:
+            raise ValueError(f"unknown alarm kind: {kind!r}")
+        rule_field = raw.get("field")
+        if kind in ("high", "low", "rate") and not rule_field:
+            raise ValueError(f"{kind} alarm needs a field")
+        return cls(
+            kind=kind,
+            field=str(rule_field) if rule_field else None,
+            limit=float(raw.get("limit", 0.5)),
+            hysteresis=float(raw.get("hysteresis", 0.0)),
+            delay=float(raw.get("delay", 0.0)),
+            severity=str(raw.get("severity", "warning")),
+            name=raw.get("name"),
+            devices=tuple(str(item) for item in raw.get("devices") or ("*",)),
+        )
+
+    @property
+    def label(self) -> str:
+        return self.name or _DEFAULT_NAMES[self.kind].format(field=self.field)
+
+    @property
+    def source(self) -> str:
+        """What the rule samples: a device field, ``rate:<field>``, or a kind-level signal."""
+        if self.kind in ("high", "low"):
+            return str(self.field)
+        if self.kind == "rate":
+            return f"rate:{self.field}"
+        return self.kind
+
+
+DEFAULT_RULES = [
+    Rule("high", "temperature", limit=110.0, hysteresis=2.0, delay=10.0, severity="critical", name="温度过高"),
+    Rule("low", "level", limit=10.0, hysteresis=3.0, delay=10.0, name="料位过低"),
+    Rule("stale", limit=30.0, severity="critical"),
+    Rule("offline", severity="critical"),
+    Rule("comm", severity="critical"),
+]
+
+
+@dataclass
+class CompiledRules:
+    """Rules expanded per device, stored column-wise."""
+
+    device_ids: Tuple[str, ...]
+    slots: List[Tuple[int, str]]
+    rule_slot: array
+    sign: array
+    raise_at: array
+    clear_at: array
+    delay: array
+    meta: List[Tuple[Rule, int]] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.meta)
+
+
+def compile_rules(rules: Sequence[Rule], device_ids: Sequence[str]) -> CompiledRules:
+    slot_index: Dict[Tuple[int, str], int] = {}
+    compiled = CompiledRules(
+        device_ids=tuple(device_ids),
+        slots=[],
+        rule_slot=array("l"),
+        sign=array("d"),
+        raise_at=array("d"),
+        clear_at=array("d"),
+        delay=array("d"),
+    )
+    for rule in rules:
+        # Low limits are compared as high ones on the negated value.
+        sign = -1.0 if rule.kind == "low" else 1.0
+        for device, device_id in enumerate(device_ids):
+            if not any(fnmatchcase(device_id, pattern) for pattern in rule.devices):
+                continue
+            key = (device, rule.source)
+            if key not in slot_index:
+                slot_index[key] = len(compiled.slots)
+                compiled.slots.append(key)
+            compiled.rule_slot.append(slot_index[key])
+            compiled.sign.append(sign)
+            compiled.raise_at.append(sign * rule.limit)
+            compiled.clear_at.append(sign * rule.limit - rule.hysteresis)
+            compiled.delay.append(rule.delay)
+            compiled.meta.append((rule, device))
+    return compiled
+
+
+def _number(value: object) -> float:
+    if isinstance(value, bool):
+        return 1.0 if value else 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    return _NAN
+
+
+class AlarmEngine:
+    """Keeps per-rule alarm state and mirrors it into ``data.ALERTS``."""
+
+    def __init__(self, rules: Sequence[Rule]) -> None:
+        self.rules = list(rules)
+        self.compiled = compile_rules(self.rules, [])
+        self._lock = threading.Lock()
+        self._alert_sequence = 0
+        # Raised alarms from a state snapshot, adopted at the first compile.
+        self._restored: Dict[Tuple[str, str], str] = {}
+        self._reset_state()
+
+    @classmethod
+    def from_env(cls) -> "AlarmEngine":
+        if not CONFIG_PATH:
+            return cls(DEFAULT_RULES)
+        raw = json.loads(Path(CONFIG_PATH).read_text(encoding="utf-8"))
+        return cls([Rule.from_dict(item) for item in raw["rules"]])
+
+    def _reset_state(self) -> None:
+        count = len(self.compiled)
+        self.active: List[Optional[str]] = [None] * count  # alertId while raised
+        self.pending = array("d", [_NAN]) * count  # when the condition started holding
+        self._previous = array("d", [_NAN]) * len(self.compiled.slots)
+        self._previous_at = _NAN
+
+    def _recompile(self, devices: Sequence[Dict[str, object]], device_ids: Tuple[str, ...]) -> None:
+        # Devices come and go with the acquisition config; alarms raised on the
+        # old layout are dropped rather than remapped.
+        by_id = {str(device["deviceId"]): device for device in devices}
+        for (rule, device), alert_id in zip(self.compiled.meta, self.active):
+            if alert_id:
+                _drop_alert(alert_id)
+                if self.compiled.device_ids[device] in by_id:
+                    _set_device_alarm(by_id[self.compiled.device_ids[device]], rule.label, False)
+        self.compiled = compile_rules(self.rules, device_ids)
+        self._reset_state()
+        if self._restored:
+            self._adopt_restored(by_id)
+        RULES.set(len(self.compiled))
+
+    def state(self) -> Dict[str, object]:
+        """Raised alarms as ``[deviceId, rule key, alertId]`` rows, for the state snapshot."""
+        with self._lock:
+            compiled = self.compiled
+            raised = [
+                [compiled.device_ids[device], _rule_key(rule), alert_id]
+                for (rule, device), alert_id in zip(compiled.meta, self.active)
+                if alert_id
+            ]
+            return {"raised": raised, "sequence": self._alert_sequence}
+
+    def restore(self, state: Dict[str, object]) -> None:
+        """Take over alarms raised before a restart instead of raising them again."""
+        with self._lock:
+            self._alert_sequence = int(state.get("sequence", 0))
+            self._restored = {(str(device_id), str(key)): str(alert_id) for device_id, key, alert_id in state["raised"]}
+
+    def _adopt_restored(self, by_id: Dict[str, Dict[str, object]]) -> None:
+        # Alarms whose alert is still listed and whose rule and device still
+        # exist come back; the rest are dropped like on any recompile.
+        listed = {alert["alertId"] for alert in data.ALERTS}
+        compiled = self.compiled
+        for index, (rule, device) in enumerate(compiled.meta):
+            alert_id = self._restored.pop((compiled.device_ids[device], _rule_key(rule)), None)
+            if alert_id in listed:
+                self.active[index] = alert_id
+            elif alert_id:
+                _set_device_alarm(by_id[compiled.device_ids[device]], rule.label, False)
+        for (device_id, key), alert_id in self._restored.items():
+            _drop_alert(alert_id)
+            if device_id in by_id:
+                _set_device_alarm(by_id[device_id], key.split("|", 1)[1], False)
+        self._restored = {}
+        self._publish_active()
+
+    def sample(self, devices: Sequence[Dict[str, object]], now: float) -> array:
+        """Current value of every slot, NaN where a device has none."""
+        values = array("d", [_NAN]) * len(self.compiled.slots)
+        elapsed = now - self._previous_at
+        for index, (device, source) in enumerate(self.compiled.slots):
+            item = devices[device]
+            if source == "stale":
+                heartbeat = item.get("lastHeartbeat")
+                values[index] = now - db.to_ms(str(heartbeat)) / 1000 if heartbeat else _NAN
+            elif source == "offline":
+                values[index] = 1.0 if item.get("status") == "offline" else 0.0
+            elif source == "comm":
+                values[index] = 1.0 if item["deviceId"] in data.UNREACHABLE else 0.0
+            elif source.startswith("rate:"):
+                current = _number(item.get(source[5:]))
+                values[index] = abs(current - self._previous[index]) / elapsed if elapsed > 0 else _NAN
+                self._previous[index] = current
+            else:
+                values[index] = _number(item.get(source))
+        self._previous_at = now
+        return values
+
+    def evaluate(self, devices: Optional[Sequence[Dict[str, object]]] = None, now: Optional[float] = None) -> int:
+        """Run every rule once; returns how many alarms were raised or cleared."""
+        devices = data.DEVICES if devices is None else devices
+        now = time.time() if now is None else now
+        started = time.perf_counter()
+        with self._lock:
+            device_ids = tuple(str(device["deviceId"]) for device in devices)
+            if device_ids != self.compiled.device_ids:
+                self._recompile(devices, device_ids)
+            compiled = self.compiled
+            values = self.sample(devices, now)
+            signed = [values[slot] * sign for slot, sign in zip(compiled.rule_slot, compiled.sign)]
+            # NaN compares false both ways, so a missing sample neither raises nor clears.
+            candidates = [
+                index
+                for index, (value, high, low, alert, since) in enumerate(
+                    zip(signed, compiled.raise_at, compiled.clear_at, self.active, self.pending)
+                )
+                if (value < low if alert else (value > high or since == since))
+            ]
+            changed = 0
+            for index in candidates:
+                changed += self._step(index, signed[index], devices, now)
+        EVALUATION_SECONDS.observe(time.perf_counter() - started)
+        if changed:
+            self._publish_active()
+        return changed
+
+    def _step(self, index: int, value: float, devices: Sequence[Dict[str, object]], now: float) -> int:
+        compiled = self.compiled
+        rule, device = compiled.meta[index]
+        alert_id = self.active[index]
+        if alert_id:
+            self.active[index] = None
+            _drop_alert(alert_id)
+            _set_device_alarm(devices[device], rule.label, False)
+            TRANSITIONS.inc(1.0, rule.kind, "cleared")
+            return 1
+        if not value > compiled.raise_at[index]:
+            self.pending[index] = _NAN
+            return 0
+        since = self.pending[index]
+        if since != since:
+            since = self.pending[index] = now
+        if now - since < compiled.delay[index]:
+            return 0
+        self.pending[index] = _NAN
+        self.active[index] = self._raise(rule, devices[device], value * compiled.sign[index])
+        TRANSITIONS.inc(1.0, rule.kind, "raised")
+        return 1
+
+    def _raise(self, rule: Rule, device: Dict[str, object], value: float) -> str:
+        self._alert_sequence += 1
+        alert_id = f"A{datetime.utcnow():%Y%m%d%H%M%S}{self._alert_sequence % 10000:04d}"
+        name = device.get("name") or device["deviceId"]
+        if rule.kind in ("high", "low", "rate"):
+            message = f"{name}{rule.label}：{value:g}（限值 {rule.limit:g}）"
+        elif rule.kind == "stale":
+            message = f"{name}{rule.label}：{value:.0f} 秒无心跳"
+        else:
+            message = f"{name}{rule.label}"
+        data.ALERTS.insert(
+            0,
+            {
+                "alertId": alert_id,
+                "deviceId": device["deviceId"],
+                "severity": rule.severity,
+                "message": message,
+                "raisedAt": data._ts(),
+                "acknowledged": False,
+            },
+        )
+        del data.ALERTS[MAX_ALERTS:]
+        _set_device_alarm(device, rule.label, True)
+        return alert_id
+
+    def _publish_active(self) -> None:
+        counts: Dict[str, int] = {}
+        for (rule, _), alert_id in zip(self.compiled.meta, self.active):
+            if alert_id:
+                counts[rule.severity] = counts.get(rule.severity, 0) + 1
+        for severity in {rule.severity for rule in self.rules}:
+            ACTIVE.set(counts.get(severity, 0), severity)
+
+    def __call__(self) -> None:
+        # Runs inside simulate_tick and the Modbus poller; a bad rule must not break them.
+        try:
+            self.evaluate()
+        except Exception:
+            logger.warning("alarm evaluation failed", exc_info=True)
+
+
+def _rule_key(rule: Rule) -> str:
+    return f"{rule.source}|{rule.label}"
+
+
+def _drop_alert(alert_id: str) -> None:
+    data.ALERTS[:] = [alert for alert in data.ALERTS if alert["alertId"] != alert_id]
+
+
+def _set_device_alarm(device: Dict[str, object], label: str, raised: bool) -> None:
+    alarms = device.setdefault("alarms", [])
+    if raised and label not in alarms:
+        alarms.append(label)
+    elif not raised and label in alarms:
+        alarms.remove(label)
@@ -0,0 +1,163 @@
+"""Fingerprinted, precompressed static assets and response compression."""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import mimetypes
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Message, Receive, Scope, Send
+
+ASSET_PREFIX = "/assets/"
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+# Text formats worth compressing; images, archives and workbooks already are.
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/x-ndjson",
+    "image/svg+xml",
+)
+_PRECOMPRESS_SUFFIXES = {".js", ".css", ".html", ".svg", ".json", ".txt"}
+_HASHED_NAME = re.compile(r"^(?P<stem>.+)\.(?P<digest>[0-9a-f]{10})(?P<suffix>\.[^./]+)$")
+
+
+@dataclass
+class Asset:
+    path: str
+    digest: str
+    media_type: str
+    body: bytes
+    gzipped: Optional[bytes]
+
+    @property
+    def hashed_path(self) -> str:
+        stem, dot, suffix = self.path.rpartition(".")
+        return f"{stem}.{self.digest}{dot}{suffix}"
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.digest}"'
+
+
+class AssetManifest:
+    """Content hashes and gzip variants of the text assets in the frontend folder."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self._assets: Dict[str, Asset] = {}
+        self._index_html: Optional[bytes] = None
+        self._index_etag = ""
+
+    def build(self) -> "AssetManifest":
+        for file in sorted(self.root.rglob("*")):
+            if not file.is_file() or file.suffix not in _PRECOMPRESS_SUFFIXES:
+                continue
+            body = file.read_bytes()
+            digest = hashlib.sha256(body).hexdigest()[:10]
+            media_type = mimetypes.guess_type(file.name)[0] or "application/octet-stream"
+            packed = gzip.compress(body, compresslevel=9, mtime=0)
+            relative = file.relative_to(self.root).as_posix()
+            self._assets[relative] = Asset(
+                path=relative,
+                digest=digest,
+                media_type=media_type,
+                body=body,
+                gzipped=packed if len(packed) < len(body) else None,
+            )
+        index = self._assets.get("index.html")
+        if index:
+            html = index.body.decode("utf-8")
+            for asset in self._assets.values():
+                html = html.replace(
+                    f'"{ASSET_PREFIX}{asset.path}"', f'"{ASSET_PREFIX}{asset.hashed_path}"'
+                )
+            self._index_html = html.encode("utf-8")
+            self._index_etag = f'"{hashlib.sha256(self._index_html).hexdigest()[:10]}"'
+        return self
+
+    def lookup(self, path: str) -> Optional[Asset]:
+        """Resolve ``name.<digest>.ext`` to its asset when the digest is current."""
+        match = _HASHED_NAME.match(path)
+        if not match:
+            return None
+        asset = self._assets.get(f"{match['stem']}{match['suffix']}")
+        if asset is None or asset.digest != match["digest"]:
+            return None
+        return asset
+
+    def index_response(self, request_headers: Headers) -> Optional[Response]:
+        if self._index_html is None:
+            return None
+        headers = {"Cache-Control": REVALIDATE_CACHE, "ETag": self._index_etag}
+        if request_headers.get("if-none-match") == self._index_etag:
+            return Response(status_code=304, headers=headers)
+        return Response(self._index_html, media_type="text/html", headers=headers)
+
+
+def accepts_gzip(headers: Headers) -> bool:
+    return "gzip" in headers.get("accept-encoding", "")
+
+
+class FingerprintedStaticFiles(StaticFiles):
+    """Serves hashed asset URLs as immutable and everything else with revalidation."""
+
+    def __init__(self, *, manifest: AssetManifest, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.manifest = manifest
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        request_headers = Headers(scope=scope)
+        asset = self.manifest.lookup(path)
+        if asset is None:
+            response = await super().get_response(path, scope)
+            response.headers.setdefault("Cache-Control", REVALIDATE_CACHE)
+            return response
+
+        headers = {
+            "Cache-Control": IMMUTABLE_CACHE,
+            "ETag": asset.etag,
+            "Vary": "Accept-Encoding",
+        }
+        if request_headers.get("if-none-match") == asset.etag:
+            return Response(status_code=304, headers=headers)
+        if asset.gzipped is not None and accepts_gzip(request_headers):
+            headers["Content-Encoding"] = "gzip"
+            return Response(asset.gzipped, media_type=asset.media_type, headers=headers)
+        return Response(asset.body, media_type=asset.media_type, headers=headers)
+
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class _SelectiveGZipResponder(GZipResponder):
+    async def send_with_gzip(self, message: Message) -> None:
+        await super().send_with_gzip(message)
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            if not is_compressible(content_type):
+                # Treat it like a pre-encoded body so it passes through untouched.
+                self.content_encoding_set = True
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Negotiated gzip for large JSON/CSV bodies that skips already-compressed formats."""
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and accepts_gzip(Headers(scope=scope)):
+            responder = _SelectiveGZipResponder(
+                self.app, self.minimum_size, compresslevel=self.compresslevel
+            )
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
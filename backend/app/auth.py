@@ -6,7 +6,7 @@ from datetime import datetime, timedelta
 from typing import Dict, Optional
 from uuid import uuid4
 
-from . import data
+from . import data, metrics
 
 
 TOKEN_TTL = timedelta(hours=8)
@@ -43,6 +43,9 @@ class TokenStore:
             return None
         return user
 
+    def __len__(self) -> int:
+        return len(self._tokens)
+
     def revoke(self, token: str) -> None:
         self._tokens.pop(token, None)
 
@@ -71,3 +74,4 @@ def verify_credentials(username: str, password: str) -> Optional[AuthenticatedUs
 
 
 token_store = TokenStore()
+metrics.track_token_store(token_store.__len__)
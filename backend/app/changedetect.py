@@ -0,0 +1,85 @@
+"""Per-point change detection in front of interface 4 event creation.
+
+Every acquisition cycle feeds the decoded values of a device through its
+detector; only meaningful transitions come out as changes.  Analog points are
+filtered by an absolute and/or percent deadband measured from the last
+emitted value, an extra hysteresis margin when the direction of movement
+reverses, and a minimum interval between emits (a change held back by the
+interval is re-evaluated on the next cycle, so the settled value still gets
+through).  Discrete points (coils, status codes) emit on every edge.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, List
+
+from . import metrics
+from .pointtable import Point
+
+SAMPLES = metrics.Counter("unet_change_samples", "Point samples evaluated by the change detector.")
+EMITTED = metrics.Counter("unet_change_emitted", "Point changes passed on as interface 4 events.")
+
+
+@dataclass
+class Change:
+    point: Point
+    value: object
+    previous: object
+    at: float
+
+
+class _State:
+    __slots__ = ("value", "at", "direction")
+
+    def __init__(self, value: object, at: float) -> None:
+        self.value = value
+        self.at = at
+        self.direction = 0
+
+
+class ChangeDetector:
+    """Deadband/hysteresis filter over the event-enabled points of one device."""
+
+    def __init__(self, points: Iterable[Point]) -> None:
+        self.points = [point for point in points if point.events]
+        self.state: Dict[str, _State] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.points)
+
+    def evaluate(self, values: Dict[str, object], now: float) -> List[Change]:
+        changes: List[Change] = []
+        state = self.state
+        for point in self.points:
+            value = values.get(point.field)
+            if value is None:
+                continue
+            current = state.get(point.field)
+            if current is None:
+                # First sample only sets the baseline; a restart is not an edge.
+                state[point.field] = _State(value, now)
+                continue
+            previous = current.value
+            if value == previous:
+                continue
+            if isinstance(value, (bool, str)) or isinstance(previous, (bool, str)):
+                direction = 0
+            else:
+                delta = value - previous  # type: ignore[operator]
+                direction = 1 if delta > 0 else -1
+                basis = point.span if point.span is not None else abs(previous)  # type: ignore[arg-type]
+                threshold = max(point.deadband, basis * point.deadband_percent / 100.0)
+                if current.direction and direction != current.direction:
+                    threshold += point.hysteresis
+                if abs(delta) <= threshold:
+                    continue
+                if now - current.at < point.min_interval:
+                    continue
+            changes.append(Change(point, value, previous, now))
+            current.value = value
+            current.at = now
+            current.direction = direction
+        SAMPLES.inc(len(self.points))
+        if changes:
+            EMITTED.inc(len(changes))
+        return changes
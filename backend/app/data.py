@@ -2,10 +2,13 @@
 from __future__ import annotations
 
 from copy import deepcopy
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import itertools
 import random
-from typing import Dict, List, Optional
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+from . import metrics, profiling, tasks
 
 ISO_FORMAT = "%Y-%m-%dT%H:%M:%S"
 
@@ -24,6 +27,7 @@ USERS: Dict[str, Dict[str, object]] = {
             "tasks.manage",
             "alerts.manage",
             "users.view",
+            "system.profile",
         ],
     },
     "operator": {
@@ -187,69 +191,6 @@ DEVICES: List[Dict[str, object]] = [
     },
 ]
 
-TASKS: List[Dict[str, object]] = [
-    {
-        "taskId": "T20231018001",
-        "materialCode": "PA66",
-        "targetDevice": "Hopper01",
-        "quantity": 520,
-        "priority": "high",
-        "status": "in_progress",
-        "progress": 68,
-        "scheduledAt": "2023-10-18T08:15:00Z",
-        "updatedAt": _ts(),
-        "source": "ERP",
-    },
-    {
-        "taskId": "T20231018002",
-        "materialCode": "ABS-UV",
-        "targetDevice": "Hopper03",
-        "quantity": 430,
-        "priority": "medium",
-        "status": "queued",
-        "progress": 0,
-        "scheduledAt": "2023-10-18T09:00:00Z",
-        "updatedAt": _ts(),
-        "source": "MES",
-    },
-    {
-        "taskId": "T20231018003",
-        "materialCode": "PC+GF",
-        "targetDevice": "Hopper05",
-        "quantity": 610,
-        "priority": "high",
-        "status": "in_progress",
-        "progress": 42,
-        "scheduledAt": "2023-10-18T09:30:00Z",
-        "updatedAt": _ts(),
-        "source": "ERP",
-    },
-    {
-        "taskId": "T20231018004",
-        "materialCode": "TPU",
-        "targetDevice": "Hopper07",
-        "quantity": 360,
-        "priority": "low",
-        "status": "completed",
-        "progress": 100,
-        "scheduledAt": "2023-10-18T07:45:00Z",
-        "updatedAt": "2023-10-18T08:40:00Z",
-        "source": "Local",
-    },
-    {
-        "taskId": "T20231018005",
-        "materialCode": "PA66",
-        "targetDevice": "Vacuum01",
-        "quantity": 720,
-        "priority": "high",
-        "status": "in_progress",
-        "progress": 25,
-        "scheduledAt": "2023-10-18T10:00:00Z",
-        "updatedAt": _ts(),
-        "source": "ERP",
-    },
-]
-
 ALERTS: List[Dict[str, object]] = [
     {
         "alertId": "A2023101801",
@@ -308,9 +249,11 @@ AUDIT_LOGS: List[Dict[str, object]] = [
     },
 ]
 
+MODBUS_INTEGRATION = "Modbus 采集"
+
 INTEGRATIONS: List[Dict[str, object]] = [
     {
-        "name": "Modbus 采集",
+        "name": MODBUS_INTEGRATION,
         "target": "9 台集中供料设备",
         "status": "online",
         "latencyMs": 42,
@@ -332,32 +275,159 @@ INTEGRATIONS: List[Dict[str, object]] = [
     },
 ]
 
-_task_sequence = itertools.count(start=6)
+# Parts of the state fed by real acquisition ("devices" or an integration name);
+# the simulator leaves these alone.
+LIVE_SOURCES: Set[str] = set()
+
+# Called with a compact progress record whenever a task changes; used by the
+# ERP/MES feedback client.  Listeners must not block.
+TASK_LISTENERS: List[Callable[[Dict[str, object]], None]] = []
+
+# Called with (deviceId, status) whenever a device's status changes, and with
+# status None when a device is dropped; feeds the utilization history.
+DEVICE_LISTENERS: List[Callable[[str, Optional[str]], None]] = []
+
+# Called after every acquisition pass over DEVICES (a simulator tick or a
+# Modbus cycle); the alarm engine evaluates its rules here.
+ACQUISITION_LISTENERS: List[Callable[[], None]] = []
+
+# Devices whose last Modbus read failed, as opposed to reporting "offline".
+UNREACHABLE: Set[str] = set()
+
 _last_simulation = datetime.utcnow()
 
 
+# The simulator advances only the tasks the line would work on next, so a
+# large imported plan does not turn every tick into a bulk update.
+SIMULATED_TASKS = 30
+
 STATUS_TRANSITIONS = {
     "queued": ["in_progress"],
     "in_progress": ["in_progress", "completed"],
 }
 
 
+def _notify_device(device_id: str, status: Optional[str]) -> None:
+    for listener in DEVICE_LISTENERS:
+        listener(device_id, status)
+
+
+def _set_device_status(device: Dict[str, object], status: str) -> None:
+    if device["status"] != status:
+        device["status"] = status
+        _notify_device(str(device["deviceId"]), status)
+
+
+def acquisition_tick() -> None:
+    for listener in ACQUISITION_LISTENERS:
+        listener()
+
+
 def _simulate_devices() -> None:
     for device in DEVICES:
         device["temperature"] = round(device["temperature"] + random.uniform(-0.8, 0.9), 1)
         device["temperature"] = max(30.0, min(120.0, device["temperature"]))
         device["level"] = max(0, min(100, device["level"] + random.randint(-4, 4)))
         if device["status"] != "offline" and random.random() < 0.05:
-            device["status"] = random.choice(["online", "maintenance"])
+            _set_device_status(device, random.choice(["online", "maintenance"]))
         if device["status"] == "maintenance" and random.random() < 0.3:
-            device["status"] = "online"
+            _set_device_status(device, "online")
         if device["status"] == "online":
             device["throughput"] = round(max(0.0, device["throughput"] + random.uniform(-4, 5)), 1)
         device["lastHeartbeat"] = _ts()
 
 
+def apply_device_readings(
+    device_id: str,
+    values: Dict[str, object],
+    *,
+    name: Optional[str] = None,
+    material: Optional[str] = None,
+) -> None:
+    """Store one acquisition result for a device, registering unknown devices."""
+    device = next((item for item in DEVICES if item["deviceId"] == device_id), None)
+    if device is None:
+        device = {
+            "deviceId": device_id,
+            "name": name or device_id,
+            "status": "online",
+            "material": material or "集中供料",
+            "temperature": 0.0,
+            "level": 0,
+            "lastHeartbeat": _ts(),
+            "throughput": 0.0,
+            "alarms": [],
+        }
+        DEVICES.append(device)
+        _notify_device(device_id, "online")
+    for key, value in values.items():
+        if key == "status":
+            _set_device_status(device, str(value))
+        elif key in device:
+            device[key] = int(value) if key == "level" else value
+    if "status" not in values and device["status"] == "offline":
+        _set_device_status(device, "online")
+    UNREACHABLE.discard(device_id)
+    device["lastHeartbeat"] = _ts()
+
+
+def retain_devices(device_ids: Set[str]) -> None:
+    """Drop seeded demo devices that are not part of the acquisition config."""
+    for device in DEVICES:
+        if device["deviceId"] not in device_ids:
+            _notify_device(str(device["deviceId"]), None)
+    DEVICES[:] = [device for device in DEVICES if device["deviceId"] in device_ids]
+
+
+def mark_device_unreachable(device_id: str) -> None:
+    UNREACHABLE.add(device_id)
+    for device in DEVICES:
+        if device["deviceId"] == device_id:
+            _set_device_status(device, "offline")
+            device["throughput"] = 0.0
+            return
+
+
+def register_integration(name: str, target: str) -> None:
+    """Add an integration entry for a subsystem that reports its own status."""
+    if not any(integration["name"] == name for integration in INTEGRATIONS):
+        INTEGRATIONS.append(
+            {"name": name, "target": target, "status": "online", "latencyMs": 0, "lastUpdated": _ts()}
+        )
+
+
+def update_integration(
+    name: str,
+    *,
+    status: str,
+    latency_ms: int,
+    target: Optional[str] = None,
+    device_latency: Optional[Dict[str, int]] = None,
+) -> None:
+    for integration in INTEGRATIONS:
+        if integration["name"] == name:
+            integration["status"] = status
+            integration["latencyMs"] = latency_ms
+            if target is not None:
+                integration["target"] = target
+            if device_latency is not None:
+                integration["deviceLatencyMs"] = device_latency
+            integration["lastUpdated"] = _ts()
+            return
+
+
+def _notify_task(task: Dict[str, object]) -> None:
+    if not TASK_LISTENERS:
+        return
+    update = {key: task[key] for key in ("taskId", "status", "progress", "updatedAt", "source")}
+    for listener in TASK_LISTENERS:
+        listener(update)
+
+
 def _simulate_tasks() -> None:
-    for task in TASKS:
+    changed = []
+    for task in tasks.active(SIMULATED_TASKS):
+        before = (task["status"], task["progress"])
         if task["status"] == "queued" and random.random() < 0.3:
             task["status"] = "in_progress"
             task["updatedAt"] = _ts()
@@ -368,43 +438,25 @@ def _simulate_tasks() -> None:
                 task["status"] = "completed"
                 task["progress"] = 100
                 task["updatedAt"] = _ts()
-                AUDIT_LOGS.insert(
-                    0,
-                    {
-                        "logId": f"L{datetime.utcnow().strftime('%Y%m%d%H%M%S')}",
-                        "category": "任务调度",
-                        "description": f"任务 {task['taskId']} 已自动标记完成",
-                        "actor": "system",
-                        "timestamp": _ts(),
-                    },
-                )
-    while len(AUDIT_LOGS) > 50:
-        AUDIT_LOGS.pop()
+                _audit_task(f"任务 {task['taskId']} 已自动标记完成", "system", _ts())
+        if (task["status"], task["progress"]) != before:
+            changed.append(task)
+    tasks.save_progress(changed)
+    for task in changed:
+        _notify_task(task)
 
 
-def _simulate_alerts() -> None:
-    if random.random() < 0.1:
-        alert = random.choice(ALERTS)
-        if not alert["acknowledged"] and random.random() < 0.4:
-            alert["acknowledged"] = True
-    if random.random() < 0.12:
-        severity = random.choice(["warning", "critical", "info"])
-        device = random.choice(DEVICES)
-        alert = {
-            "alertId": f"A{datetime.utcnow().strftime('%Y%m%d%H%M%S')}",
-            "deviceId": device["deviceId"],
-            "severity": severity,
-            "message": f"{device['name']} 触发{severity}级提醒",
-            "raisedAt": _ts(),
-            "acknowledged": False,
-        }
-        ALERTS.insert(0, alert)
-    while len(ALERTS) > 20:
-        ALERTS.pop()
+def _refresh_task_counts() -> None:
+    midnight = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    active, completed = tasks.counts(int(midnight.replace(tzinfo=timezone.utc).timestamp() * 1000))
+    DASHBOARD_STATE["activeTasks"] = active
+    DASHBOARD_STATE["completedToday"] = completed
 
 
 def _simulate_integrations() -> None:
     for integration in INTEGRATIONS:
+        if integration["name"] in LIVE_SOURCES:
+            continue
         jitter = random.randint(-8, 9)
         integration["latencyMs"] = max(15, integration["latencyMs"] + jitter)
         if integration["name"].startswith("ERP") and integration["latencyMs"] > 250:
@@ -431,14 +483,16 @@ def simulate_tick() -> None:
     now = datetime.utcnow()
     if now - _last_simulation < timedelta(seconds=3):
         return
+    metrics.SIMULATE_TICK_INTERVAL.observe((now - _last_simulation).total_seconds())
     _last_simulation = now
-    _simulate_devices()
+    started = time.perf_counter()
+    if "devices" not in LIVE_SOURCES:
+        _simulate_devices()
+        acquisition_tick()
     _simulate_tasks()
-    _simulate_alerts()
     _simulate_integrations()
     _simulate_materials()
-    DASHBOARD_STATE["activeTasks"] = sum(1 for task in TASKS if task["status"] in {"queued", "in_progress"})
-    DASHBOARD_STATE["completedToday"] = sum(1 for task in TASKS if task["status"] == "completed")
+    _refresh_task_counts()
     DASHBOARD_STATE["equipmentOnline"] = sum(1 for device in DEVICES if device["status"] == "online")
     DASHBOARD_STATE["alarmCount"] = sum(1 for alert in ALERTS if not alert["acknowledged"])
     DASHBOARD_STATE["throughput"] = round(
@@ -446,8 +500,10 @@ def simulate_tick() -> None:
     )
     DASHBOARD_STATE["energyUsage"] = round(720 + random.uniform(-35, 40), 1)
     DASHBOARD_STATE["lastUpdated"] = _ts()
+    metrics.SIMULATE_TICK_SECONDS.observe(time.perf_counter() - started)
 
 
+@profiling.timed_phase("state")
 def get_dashboard_overview() -> Dict[str, object]:
     simulate_tick()
     result = deepcopy(DASHBOARD_STATE)
@@ -455,56 +511,85 @@ def get_dashboard_overview() -> Dict[str, object]:
     return result
 
 
+@profiling.timed_phase("state")
 def list_devices() -> List[Dict[str, object]]:
     simulate_tick()
     return deepcopy(DEVICES)
 
 
-def list_tasks() -> List[Dict[str, object]]:
+@profiling.timed_phase("state")
+def list_tasks(**filters: object) -> Dict[str, object]:
+    """One page of stored tasks; ``filters`` are those of :func:`tasks.query`."""
     simulate_tick()
-    return deepcopy(TASKS)
+    return tasks.query(**filters)  # type: ignore[arg-type]
 
 
-def create_task(payload: Dict[str, object]) -> Dict[str, object]:
-    task_id = f"T{datetime.utcnow().strftime('%Y%m%d')}{next(_task_sequence):03d}"
-    now = _ts()
-    task = {
-        "taskId": task_id,
-        "materialCode": payload.get("materialCode", ""),
-        "targetDevice": payload.get("targetDevice", ""),
-        "quantity": int(payload.get("quantity", 0)),
-        "priority": payload.get("priority", "medium"),
-        "status": "queued",
-        "progress": 0,
-        "scheduledAt": payload.get("scheduledAt", now),
-        "updatedAt": now,
-        "source": payload.get("source", "Manual"),
-    }
-    TASKS.insert(0, task)
+# Several audits can land in the same second (tasks completing in one tick),
+# so log ids carry a sequence after the timestamp, as alert ids do.
+_AUDIT_SEQUENCE = itertools.count(1)
+
+
+def _audit_task(description: str, actor: str, now: str) -> None:
     AUDIT_LOGS.insert(
         0,
         {
-            "logId": f"L{datetime.utcnow().strftime('%Y%m%d%H%M%S')}",
+            "logId": f"L{datetime.utcnow():%Y%m%d%H%M%S}{next(_AUDIT_SEQUENCE) % 10000:04d}",
             "category": "任务调度",
-            "description": f"创建手动任务 {task_id}，目标 {task['targetDevice']}",
-            "actor": payload.get("actor", "admin"),
+            "description": description,
+            "actor": actor,
             "timestamp": now,
         },
     )
-    while len(TASKS) > 30:
-        TASKS.pop()
     while len(AUDIT_LOGS) > 50:
         AUDIT_LOGS.pop()
-    DASHBOARD_STATE["activeTasks"] = sum(1 for task in TASKS if task["status"] in {"queued", "in_progress"})
+
+
+@profiling.timed_phase("state")
+def create_task(payload: Dict[str, object]) -> Dict[str, object]:
+    now = _ts()
+    task = tasks.insert([tasks.normalize({**payload, "taskId": None}, source="Manual", now=now)])[0]
+    _audit_task(f"创建手动任务 {task['taskId']}，目标 {task['targetDevice']}", str(payload.get("actor", "admin")), now)
+    _refresh_task_counts()
     DASHBOARD_STATE["lastUpdated"] = now
-    return deepcopy(task)
+    _notify_task(task)
+    return task
 
 
+@profiling.timed_phase("state")
+def import_tasks(items: List[Dict[str, object]], *, actor: str) -> List[Dict[str, object]]:
+    """Store a whole plan of already normalised tasks at once; see :func:`tasks.insert` for conflicts."""
+    stored = tasks.insert(items)
+    sources = sorted({str(task["source"]) for task in stored})
+    _audit_task(f"{'/'.join(sources)} 批量导入任务 {len(stored)} 个", actor, _ts())
+    _refresh_task_counts()
+    return stored
+
+
+@profiling.timed_phase("state")
+def receive_external_tasks(payloads: List[Dict[str, object]], source: str) -> int:
+    """Queue tasks issued by ERP/MES in one transaction; ids already known are skipped. Returns the number queued."""
+    now = _ts()
+    items = []
+    for payload in payloads:
+        try:
+            items.append(tasks.normalize({**payload, "source": source}, source=source, now=now))
+        except ValueError:
+            continue  # unparseable scheduledAt; not queued, so not acknowledged either
+    stored = tasks.insert(items, skip_existing=True)
+    for task in stored:
+        _audit_task(f"{source} 接口下发任务 {task['taskId']}，目标 {task['targetDevice']}", "system", now)
+    if stored:
+        _refresh_task_counts()
+    return len(stored)
+
+
+@profiling.timed_phase("state")
 def list_alerts() -> List[Dict[str, object]]:
     simulate_tick()
     return deepcopy(ALERTS)
 
 
+@profiling.timed_phase("state")
 def list_audit_logs(limit: Optional[int] = None) -> List[Dict[str, object]]:
     simulate_tick()
     logs = deepcopy(AUDIT_LOGS)
@@ -513,6 +598,7 @@ def list_audit_logs(limit: Optional[int] = None) -> List[Dict[str, object]]:
     return logs
 
 
+@profiling.timed_phase("state")
 def get_integrations() -> List[Dict[str, object]]:
     simulate_tick()
     return deepcopy(INTEGRATIONS)
@@ -1,16 +1,86 @@
 """SQLite-backed persistence helpers for interface 4 event records."""
 from __future__ import annotations
 
+import base64
+import binascii
+import heapq
+import itertools
+import json
+import os
 import random
+import secrets
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache, wraps
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
 
-DB_DIR = Path(__file__).resolve().parents[1] / "data"
+from . import hotwindow, metrics, profiling, querycache, shards
+
+DB_DIR = Path(os.environ.get("UNET_DATA_DIR") or Path(__file__).resolve().parents[1] / "data")
 DB_PATH = DB_DIR / "interface4_events.sqlite3"
 
+# Interface 4 events, and the webhook outbox entries written with them, are
+# split across one file per configured line (see app.shards); everything else
+# lives in DB_PATH.
+SHARDS = shards.load(DB_PATH)
+
+
+F = TypeVar("F", bound=Callable[..., object])
+
+# Set by app.webhooks while subscribers are served: event inserts then also
+# append to their shard's webhook_outbox in the same transaction, and
+# listeners are woken.
+OUTBOX_ENABLED = False
+INSERT_LISTENERS: List[Callable[[], None]] = []
+
+# Interface 4 list pages, invalidated by every event insert in this process.
+# UNET_QUERY_CACHE_SIZE=0 disables it; the age limit bounds how long writes
+# made by other processes on the same file can go unseen.  It sits in front of
+# the hot window, so it defaults to the window's sync interval: a longer age
+# would hide other processes' events for longer than the window itself does.
+EVENT_QUERY_CACHE = querycache.ResultCache(
+    "interface4_events",
+    max_entries=int(os.environ.get("UNET_QUERY_CACHE_SIZE", "256")),
+    max_age=float(os.environ.get("UNET_QUERY_CACHE_TTL", os.environ.get("UNET_HOT_WINDOW_SYNC", "2"))),
+)
+
+
+def _row_count(result: object) -> int:
+    if result is None:
+        return 0
+    if isinstance(result, dict):
+        items = result.get("items")
+        return len(items) if isinstance(items, list) else 1
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, int):
+        return result
+    return 1
+
+
+def instrumented(func: F) -> F:
+    """Record call duration and returned rows of a SQLite helper."""
+    name = func.__name__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        result = None
+        try:
+            with profiling.phase("sqlite"):
+                result = func(*args, **kwargs)
+            return result
+        finally:
+            metrics.DB_QUERY_SECONDS.observe(time.perf_counter() - started, name)
+            metrics.DB_QUERY_ROWS.inc(_row_count(result), name)
+
+    return wrapper  # type: ignore[return-value]
+
 
 def isoformat(dt: datetime) -> str:
     dt = dt.astimezone(timezone.utc)
@@ -18,9 +88,9 @@ def isoformat(dt: datetime) -> str:
 
 
 @contextmanager
-def get_connection():
+def get_connection(*, check_same_thread: bool = True, path: Optional[Path] = None):
     DB_DIR.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(path or DB_PATH, check_same_thread=check_same_thread)
     conn.row_factory = sqlite3.Row
     try:
         yield conn
@@ -28,129 +98,106 @@ def get_connection():
         conn.close()
 
 
-def init_db() -> None:
-    with get_connection() as conn:
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS interface4_events (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                event_id TEXT NOT NULL,
-                device_id TEXT,
-                point_code TEXT,
-                material_code TEXT,
-                batch_no TEXT,
-                produced_qty REAL,
-                unit TEXT,
-                trigger_value REAL,
-                status TEXT,
-                handler TEXT,
-                remarks TEXT,
-                trigger_source TEXT,
-                triggered_at TEXT NOT NULL,
-                created_at TEXT NOT NULL
-            )
-            """
-        )
-        conn.execute(
-            "CREATE INDEX IF NOT EXISTS idx_interface4_events_triggered_at ON interface4_events(triggered_at)"
-        )
-        conn.execute(
-            "CREATE INDEX IF NOT EXISTS idx_interface4_events_event_id ON interface4_events(event_id)"
+@instrumented
+def seed_events() -> None:
+    """Populate demo data when no shard holds any event yet."""
+    for shard in SHARDS.all:
+        with get_connection(path=shard.path) as conn:
+            if conn.execute("SELECT 1 FROM interface4_events LIMIT 1").fetchone():
+                return
+
+    base = datetime.utcnow().replace(tzinfo=timezone.utc)
+    statuses = ["captured", "processing", "completed", "failed"]
+    handlers = ["OPC 触发器", "Modbus 轮询", "产线扫码", "调度回写"]
+    materials = [
+        ("PA66", "干燥料斗 01"),
+        ("ABS-UV", "干燥料斗 03"),
+        ("PC+GF", "供料阀站 05"),
+        ("TPU", "色母投加 07"),
+    ]
+    payloads: List[Dict[str, object]] = []
+    for index in range(32):
+        material, device = random.choice(materials)
+        qty = round(random.uniform(120, 560), 1)
+        triggered_ms = (base - timedelta(minutes=6 * index + random.randint(0, 5)) - _EPOCH) // timedelta(seconds=1) * 1000
+        payloads.append(
+            {
+                "event_id": f"EVT-{base:%Y%m%d}{index:03d}",
+                "device_id": device,
+                "point_code": f"P{random.randint(100, 999)}",
+                "material_code": material,
+                "batch_no": f"B{base:%Y%m%d}{index:03d}",
+                "produced_qty": qty,
+                "unit": "kg",
+                "trigger_value": round(random.uniform(0, 1), 3),
+                "status": random.choice(statuses),
+                "handler": random.choice(handlers),
+                "remarks": "自动采集并入库",
+                "trigger_source": random.choice(["OPC_UA", "Modbus"]),
+                "triggered_ms": triggered_ms,
+                "created_ms": triggered_ms,
+                "idempotency_key": None,
+            }
         )
-        conn.commit()
-    seed_events()
 
+    for shard, rows in SHARDS.group(payloads):
+        with get_connection(path=shard.path) as conn:
+            conn.executemany(_INSERT_EVENT_SQL, rows)
+            conn.commit()
+    EVENT_QUERY_CACHE.bump()
+    HOT_WINDOW.touch()
 
-def seed_events() -> None:
-    """Populate demo data when the table is empty."""
-    with get_connection() as conn:
-        count = conn.execute("SELECT COUNT(*) FROM interface4_events").fetchone()[0]
-        if count:
-            return
-
-        base = datetime.utcnow().replace(tzinfo=timezone.utc)
-        statuses = ["captured", "processing", "completed", "failed"]
-        handlers = ["OPC 触发器", "Modbus 轮询", "产线扫码", "调度回写"]
-        materials = [
-            ("PA66", "干燥料斗 01"),
-            ("ABS-UV", "干燥料斗 03"),
-            ("PC+GF", "供料阀站 05"),
-            ("TPU", "色母投加 07"),
-        ]
-        payloads: List[Tuple] = []
-        for index in range(32):
-            material, device = random.choice(materials)
-            qty = round(random.uniform(120, 560), 1)
-            triggered_at = isoformat(base - timedelta(minutes=6 * index + random.randint(0, 5)))
-            payloads.append(
-                (
-                    f"EVT-{base:%Y%m%d}{index:03d}",
-                    device,
-                    f"P{random.randint(100, 999)}",  # point code
-                    material,
-                    f"B{base:%Y%m%d}{index:03d}",
-                    qty,
-                    "kg",
-                    round(random.uniform(0, 1), 3),
-                    random.choice(statuses),
-                    random.choice(handlers),
-                    "自动采集并入库",
-                    random.choice(["OPC_UA", "Modbus"]),
-                    triggered_at,
-                    triggered_at,
-                )
-            )
 
-        conn.executemany(
-            """
-            INSERT INTO interface4_events (
-                event_id,
-                device_id,
-                point_code,
-                material_code,
-                batch_no,
-                produced_qty,
-                unit,
-                trigger_value,
-                status,
-                handler,
-                remarks,
-                trigger_source,
-                triggered_at,
-                created_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            payloads,
-        )
-        conn.commit()
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+DAY_MS = 86_400_000
 
 
-def ensure_iso(value: str, *, end_of_day: bool = False) -> str:
+@lru_cache(maxsize=4096)
+def to_ms(value: str, *, end_of_day: bool = False) -> int:
+    """Epoch milliseconds for an ISO timestamp or a bare date; no offset means UTC.
+
+    ``end_of_day`` stretches a bare date to its last millisecond and leaves
+    full timestamps alone.  Filters repeat the same few values, so results are
+    memoised.
+    """
     value = value.strip()
     if not value:
         raise ValueError("empty timestamp")
     if len(value) == 10:
-        dt = datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc)
-        if end_of_day:
-            dt = dt + timedelta(hours=23, minutes=59, seconds=59)
-        return isoformat(dt)
-    if value.endswith("Z"):
+        start = (datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc) - _EPOCH) // timedelta(milliseconds=1)
+        return start + DAY_MS - 1 if end_of_day else start
+    if value[-1] in "Zz":
         value = value[:-1] + "+00:00"
     dt = datetime.fromisoformat(value)
-    if end_of_day and dt.tzinfo:
-        dt = dt.astimezone(timezone.utc)
-        dt = dt + timedelta(hours=23, minutes=59, seconds=59)
-    return isoformat(dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH) // timedelta(milliseconds=1)
+
+
+@lru_cache(maxsize=65536)
+def format_ms(value: int) -> str:
+    """The API's ISO form of epoch milliseconds; exports hit the same seconds many times over."""
+    text = (_EPOCH + timedelta(milliseconds=value)).strftime("%Y-%m-%dT%H:%M:%S")
+    return f"{text}.{value % 1000:03d}Z" if value % 1000 else f"{text}Z"
+
+
+def ensure_iso(value: str, *, end_of_day: bool = False) -> str:
+    return format_ms(to_ms(value, end_of_day=end_of_day))
+
+
+def now_ms() -> int:
+    return time.time_ns() // 1_000_000
 
 
 def _apply_filters(
     keyword: Optional[str],
     status: Optional[str],
-    start: Optional[str],
-    end: Optional[str],
-) -> Tuple[str, List[str]]:
+    device_id: Optional[str],
+    start_ms: Optional[int],
+    end_ms: Optional[int],
+) -> Tuple[str, List[object]]:
     clauses = []
-    params: List[str] = []
+    params: List[object] = []
     if keyword:
         clauses.append("(event_id LIKE ? OR material_code LIKE ? OR device_id LIKE ?)")
         pattern = f"%{keyword}%"
@@ -158,12 +205,15 @@ def _apply_filters(
     if status:
         clauses.append("status = ?")
         params.append(status)
-    if start:
-        clauses.append("triggered_at >= ?")
-        params.append(start)
-    if end:
-        clauses.append("triggered_at <= ?")
-        params.append(end)
+    if device_id:
+        clauses.append("device_id = ?")
+        params.append(device_id)
+    if start_ms is not None:
+        clauses.append("triggered_ms >= ?")
+        params.append(start_ms)
+    if end_ms is not None:
+        clauses.append("triggered_ms <= ?")
+        params.append(end_ms)
     where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
     return where, params
 
@@ -172,62 +222,359 @@ def query_interface4_events(
     *,
     keyword: Optional[str] = None,
     status: Optional[str] = None,
+    device_id: Optional[str] = None,
     start: Optional[str] = None,
     end: Optional[str] = None,
     page: int = 1,
     page_size: int = 20,
 ) -> Dict[str, object]:
-    start_iso = ensure_iso(start) if start else None
-    end_iso = ensure_iso(end, end_of_day=True) if end else None
+    """One page of matching events plus the total.
+
+    Served from ``EVENT_QUERY_CACHE`` when possible, otherwise from the hot
+    window when the query falls inside it, otherwise from SQLite.
+    """
+    start_ms = to_ms(start) if start else None
+    end_ms = to_ms(end, end_of_day=True) if end else None
+    key = (keyword or None, status or None, device_id or None, start_ms, end_ms, page, page_size)
+    return EVENT_QUERY_CACHE.get_or_load(key, lambda: _load_interface4_page(*key))  # type: ignore[return-value]
+
+
+def _load_interface4_page(
+    keyword: Optional[str],
+    status: Optional[str],
+    device_id: Optional[str],
+    start_ms: Optional[int],
+    end_ms: Optional[int],
+    page: int,
+    page_size: int,
+) -> Dict[str, object]:
+    if _sync_hot_window():
+        with HOT_WINDOW.lock:
+            found = HOT_WINDOW.page(keyword, status, device_id, start_ms, end_ms, page, page_size)
+        if found is not None:
+            hotwindow.LOOKUPS.inc(1.0, "memory")
+            rows, total = found
+            return {
+                "items": [_window_row(row) for row in rows],
+                "total": total,
+                "page": page,
+                "pageSize": page_size,
+            }
+        hotwindow.LOOKUPS.inc(1.0, "sqlite")
+    return _select_interface4_page(keyword, status, device_id, start_ms, end_ms, page, page_size)
+
+
+@instrumented
+def _select_interface4_page(
+    keyword: Optional[str],
+    status: Optional[str],
+    device_id: Optional[str],
+    start_ms: Optional[int],
+    end_ms: Optional[int],
+    page: int,
+    page_size: int,
+) -> Dict[str, object]:
     offset = max(page - 1, 0) * page_size
-    where, params = _apply_filters(keyword, status, start_iso, end_iso)
-    with get_connection() as conn:
-        total = conn.execute(f"SELECT COUNT(*) FROM interface4_events {where}", params).fetchone()[0]
-        rows = conn.execute(
-            f"""
-            SELECT * FROM interface4_events
-            {where}
-            ORDER BY triggered_at DESC
-            LIMIT ? OFFSET ?
-            """,
-            (*params, page_size, offset),
-        ).fetchall()
+    where, params = _apply_filters(keyword, status, device_id, start_ms, end_ms)
+    targets = SHARDS.all
+    # With several shards each one returns its first offset + page_size rows
+    # and the page is cut from their merge; one shard pages in SQL directly.
+    limit, skip = (page_size, offset) if len(targets) == 1 else (offset + page_size, 0)
+
+    def gather(shard: shards.Shard) -> Tuple[int, List[sqlite3.Row]]:
+        with get_connection(path=shard.path) as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM interface4_events {where}", params).fetchone()[0]
+            rows = conn.execute(
+                f"""
+                SELECT {_select_list(EVENT_COLUMNS)} FROM interface4_events
+                {where}
+                ORDER BY triggered_ms DESC, id DESC
+                LIMIT ? OFFSET ?
+                """,
+                (*params, limit, skip),
+            ).fetchall()
+        return total, rows
+
+    results = _scatter(gather, targets)
+    if len(results) == 1:
+        rows = results[0][1]
+    else:
+        merged = heapq.merge(*(rows for _, rows in results), key=_newest_first, reverse=True)
+        rows = list(itertools.islice(merged, offset, offset + page_size))
     return {
-        "items": [dict(row) for row in rows],
-        "total": total,
+        "items": [_event_row(row) for row in rows],
+        "total": sum(total for total, _ in results),
         "page": page,
         "pageSize": page_size,
     }
 
 
-def fetch_interface4_events(
+_T = TypeVar("_T")
+_SCATTER_POOL: Optional[ThreadPoolExecutor] = None
+
+
+def _scatter(func: Callable[[shards.Shard], _T], targets: Sequence[shards.Shard]) -> List[_T]:
+    """Run ``func`` on every shard, concurrently when there are several; sqlite3 releases the GIL while it works."""
+    global _SCATTER_POOL
+    if len(targets) == 1:
+        return [func(targets[0])]
+    if _SCATTER_POOL is None:
+        _SCATTER_POOL = ThreadPoolExecutor(max_workers=min(len(targets), 8), thread_name_prefix="unet-shard")
+    return list(_SCATTER_POOL.map(func, targets))
+
+
+def _newest_first(row: Sequence[object]) -> Tuple[object, object]:
+    # Merge key of rows selected as "triggered_ms AS triggered_at, id, ..." or the reverse.
+    return (row["triggered_at"], row["id"]) if isinstance(row, sqlite3.Row) else (row[0], row[1])
+
+
+EVENT_COLUMNS = (
+    "id",
+    "event_id",
+    "device_id",
+    "point_code",
+    "material_code",
+    "batch_no",
+    "produced_qty",
+    "unit",
+    "trigger_value",
+    "status",
+    "handler",
+    "remarks",
+    "trigger_source",
+    "triggered_at",
+    "created_at",
+)
+
+# API column -> stored column.  Timestamps are stored as epoch milliseconds
+# and formatted back to ISO strings when rows are read.
+_STORED_AS = {"triggered_at": "triggered_ms", "created_at": "created_ms"}
+
+
+def _select_list(columns: Sequence[str]) -> str:
+    return ", ".join(f"{_STORED_AS[column]} AS {column}" if column in _STORED_AS else column for column in columns)
+
+
+def _event_row(row: sqlite3.Row) -> Dict[str, object]:
+    record = dict(row)
+    for column in _STORED_AS:
+        if column in record:
+            record[column] = format_ms(record[column])
+    return record
+
+
+# Events triggered in the last UNET_HOT_WINDOW_HOURS, held in memory for the
+# list endpoint as EVENT_COLUMNS tuples with epoch ms timestamps (0 disables
+# it).  It catches up from SQLite by id after this process commits events, and
+# at least every UNET_HOT_WINDOW_SYNC seconds so events written by other
+# processes show up too.
+HOT_WINDOW_SYNC = float(os.environ.get("UNET_HOT_WINDOW_SYNC", "2"))
+HOT_WINDOW = hotwindow.HotWindow(
+    EVENT_COLUMNS,
+    hours=float(os.environ.get("UNET_HOT_WINDOW_HOURS", "6")),
+    max_rows=int(os.environ.get("UNET_HOT_WINDOW_ROWS", "100000")),
+)
+_STAMP_INDEXES = tuple(EVENT_COLUMNS.index(column) for column in _STORED_AS)
+
+
+def _window_row(row: Sequence[object]) -> Dict[str, object]:
+    record = dict(zip(EVENT_COLUMNS, row))
+    for index in _STAMP_INDEXES:
+        record[EVENT_COLUMNS[index]] = format_ms(row[index])  # type: ignore[arg-type]
+    return record
+
+
+def _sync_hot_window() -> bool:
+    """Bring ``HOT_WINDOW`` up to date with the shards; False when it is disabled."""
+    window = HOT_WINDOW
+    if not window.enabled:
+        return False
+    current = window.loaded and window.source is SHARDS
+    if current and not window.dirty and time.monotonic() - window.synced_at < HOT_WINDOW_SYNC:
+        return True
+    with window.lock:
+        now = now_ms()
+        if not window.loaded or window.source is not SHARDS:
+            _load_hot_window(now)
+        else:
+            # Clear the flag first: a commit racing with the catch-up sets it again.
+            window.dirty = False
+            seen = dict(window.seen)
+            fetched = _scatter(lambda shard: _rows_after(shard, seen.get(shard.name, 0)), SHARDS.all)
+            rows = [row for shard_rows in fetched for row in shard_rows]
+            for shard, shard_rows in zip(SHARDS.all, fetched):
+                if shard_rows:
+                    window.seen[shard.name] = shard_rows[-1][0]
+            window.add(rows, now)
+        window.synced_at = time.monotonic()
+    return True
+
+
+_WINDOW_SELECT = f"SELECT {', '.join(_STORED_AS.get(column, column) for column in EVENT_COLUMNS)} FROM interface4_events"
+
+
+@instrumented
+def _load_hot_window(now: int) -> None:
+    cutoff = HOT_WINDOW.cutoff_ms(now)
+
+    def read(shard: shards.Shard) -> Tuple[List[tuple], List[tuple], int]:
+        with get_connection(path=shard.path) as conn:
+            conn.row_factory = None
+            # One read transaction, so the rows, the counts and the id high-water mark agree.
+            conn.execute("BEGIN")
+            rows = conn.execute(f"{_WINDOW_SELECT} WHERE triggered_ms >= ?", (cutoff,)).fetchall()
+            older = conn.execute(
+                "SELECT status, device_id, COUNT(*) FROM interface4_events WHERE triggered_ms < ? GROUP BY status, device_id",
+                (cutoff,),
+            ).fetchall()
+            top = conn.execute("SELECT MAX(id) FROM interface4_events").fetchone()[0] or 0
+            conn.rollback()
+        return rows, older, top
+
+    results = _scatter(read, SHARDS.all)
+    counts: Dict[Tuple[object, object], int] = {}
+    for _, older, _ in results:
+        for row_status, row_device, count in older:
+            counts[row_status, row_device] = counts.get((row_status, row_device), 0) + count
+    HOT_WINDOW.load((row for rows, _, _ in results for row in rows), counts, now)
+    HOT_WINDOW.seen = {shard.name: top for shard, (_, _, top) in zip(SHARDS.all, results)}
+    HOT_WINDOW.source = SHARDS
+
+
+@instrumented
+def _rows_after(shard: shards.Shard, after_id: int) -> List[tuple]:
+    with get_connection(path=shard.path) as conn:
+        conn.row_factory = None
+        return conn.execute(f"{_WINDOW_SELECT} WHERE id > ? ORDER BY id", (after_id,)).fetchall()
+
+
+def encode_cursor(triggered_at: str, event_row_id: int) -> str:
+    """Opaque resume token for the export position just after this row."""
+    raw = f"{triggered_at}|{event_row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[int, int]:
+    """``(triggered_ms, id)`` of the row a token was issued for."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode("utf-8")
+        triggered_at, _, event_row_id = raw.rpartition("|")
+        if not triggered_at:
+            raise ValueError("missing timestamp")
+        return to_ms(triggered_at), int(event_row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise ValueError(f"invalid cursor: {token!r}") from exc
+
+
+def iter_interface4_events(
     *,
     keyword: Optional[str] = None,
     status: Optional[str] = None,
+    device_id: Optional[str] = None,
     start: Optional[str] = None,
     end: Optional[str] = None,
-) -> List[Dict[str, object]]:
-    start_iso = ensure_iso(start) if start else None
-    end_iso = ensure_iso(end, end_of_day=True) if end else None
-    where, params = _apply_filters(keyword, status, start_iso, end_iso)
-    with get_connection() as conn:
-        rows = conn.execute(
-            f"""
-            SELECT * FROM interface4_events
-            {where}
-            ORDER BY triggered_at DESC
-            """,
-            params,
-        ).fetchall()
-    return [dict(row) for row in rows]
-
-
-def insert_interface4_event(data: Dict[str, object]) -> Dict[str, object]:
-    now = isoformat(datetime.utcnow().replace(tzinfo=timezone.utc))
-    event_id = data.get("event_id") or f"EVT-{datetime.utcnow():%Y%m%d%H%M%S}"
+    after: Optional[Tuple[int, int]] = None,
+    columns: Sequence[str] = EVENT_COLUMNS,
+    batch_size: int = 1000,
+) -> Iterator[tuple]:
+    """Stream matching rows as plain tuples of ``columns``, newest first, in constant memory.
+
+    Rows are ordered by ``(triggered_ms, id)`` descending, so ``after`` (a
+    position from :func:`decode_cursor`) resumes strictly behind the last row
+    a client received; the triggered_ms index already ends in the rowid and
+    serves that order without a sort, and ids are unique across shards so the
+    merged order is the same.
+
+    Streaming responses advance the generator from varying threadpool threads,
+    so the connection is opened without the same-thread check; it is still only
+    used by one thread at a time.
+    """
+    unknown = set(columns) - set(EVENT_COLUMNS)
+    if unknown:
+        raise ValueError(f"unknown columns: {sorted(unknown)}")
+    start_ms = to_ms(start) if start else None
+    end_ms = to_ms(end, end_of_day=True) if end else None
+    where, params = _apply_filters(keyword, status, device_id, start_ms, end_ms)
+    if after is not None:
+        where = f"{where} AND" if where else "WHERE"
+        where += " (triggered_ms < ? OR (triggered_ms = ? AND id < ?))"
+        params.extend([after[0], after[0], after[1]])
+    targets = SHARDS.all
+    merge = len(targets) > 1
+    # Several shards are k-way merged on a (triggered_ms, id) prefix that is
+    # dropped again before the row is handed out.
+    select = f"triggered_ms, id, {_select_list(columns)}" if merge else _select_list(columns)
+    sql = f"SELECT {select} FROM interface4_events {where} ORDER BY triggered_ms DESC, id DESC"
+    streams = [_stream_shard(shard, sql, params, batch_size) for shard in targets]
+    source: Iterator[tuple] = streams[0]
+    if merge:
+        source = (row[2:] for row in heapq.merge(*streams, key=_newest_first, reverse=True))
+    stamps = [index for index, column in enumerate(columns) if column in _STORED_AS]
+    rows = 0
+    started = time.perf_counter()
+    try:
+        for row in source:
+            rows += 1
+            if stamps:
+                values = list(row)
+                for index in stamps:
+                    values[index] = format_ms(values[index])
+                row = tuple(values)
+            yield row
+    finally:
+        for stream in streams:
+            stream.close()
+        metrics.DB_QUERY_SECONDS.observe(time.perf_counter() - started, "iter_interface4_events")
+        metrics.DB_QUERY_ROWS.inc(rows, "iter_interface4_events")
+
+
+def _stream_shard(shard: shards.Shard, sql: str, params: Sequence[object], batch_size: int) -> Iterator[tuple]:
+    with get_connection(check_same_thread=False, path=shard.path) as conn:
+        conn.row_factory = None
+        cursor = conn.execute(sql, params)
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            yield from batch
+
+
+_INSERT_EVENT_SQL = """
+    INSERT INTO interface4_events (
+        event_id,
+        device_id,
+        point_code,
+        material_code,
+        batch_no,
+        produced_qty,
+        unit,
+        trigger_value,
+        status,
+        handler,
+        remarks,
+        trigger_source,
+        triggered_ms,
+        created_ms,
+        idempotency_key
+    ) VALUES (:event_id, :device_id, :point_code, :material_code, :batch_no, :produced_qty, :unit, :trigger_value, :status, :handler, :remarks, :trigger_source, :triggered_ms, :created_ms, :idempotency_key)
+    ON CONFLICT DO NOTHING
+"""
+_RETURNING_SQL = f"{_INSERT_EVENT_SQL} RETURNING {_select_list(EVENT_COLUMNS)}"
+
+# Fallback event ids: the second plus a per-process random node and sequence,
+# so ids generated in the same second by one or several workers never collide.
+_ID_NODE = secrets.token_hex(3)
+_ID_SEQUENCE = itertools.count()
+
+
+def new_event_id() -> str:
+    return f"EVT-{datetime.utcnow():%Y%m%d%H%M%S}-{_ID_NODE}{next(_ID_SEQUENCE) % 1_000_000:06d}"
+
+
+def _event_payload(data: Dict[str, object], now: int) -> Dict[str, object]:
+    event_id = data.get("event_id") or new_event_id()
     triggered_at = data.get("triggered_at")
-    triggered_iso = ensure_iso(triggered_at) if triggered_at else now
-    payload = {
+    return {
         "event_id": event_id,
         "device_id": data.get("device_id"),
         "point_code": data.get("point_code"),
@@ -240,34 +587,276 @@ def insert_interface4_event(data: Dict[str, object]) -> Dict[str, object]:
         "handler": data.get("handler") or "接口监听",
         "remarks": data.get("remarks"),
         "trigger_source": data.get("trigger_source") or "OPC_UA",
-        "triggered_at": triggered_iso,
-        "created_at": now,
+        "triggered_ms": to_ms(str(triggered_at)) if triggered_at else now,
+        "created_ms": now,
+        "idempotency_key": data.get("idempotency_key"),
     }
-    with get_connection() as conn:
-        cursor = conn.execute(
-            """
-            INSERT INTO interface4_events (
-                event_id,
-                device_id,
-                point_code,
-                material_code,
-                batch_no,
-                produced_qty,
-                unit,
-                trigger_value,
-                status,
-                handler,
-                remarks,
-                trigger_source,
-                triggered_at,
-                created_at
-            ) VALUES (:event_id, :device_id, :point_code, :material_code, :batch_no, :produced_qty, :unit, :trigger_value, :status, :handler, :remarks, :trigger_source, :triggered_at, :created_at)
-            """,
-            payload,
+
+
+# The unique indexes on event_id and idempotency_key only hold within one file,
+# so with several shards an insert first looks both up in every shard.  The
+# look-up and the insert run under locks striped by id and key, so two
+# requests carrying the same one cannot both get through in this process.
+_DEDUP_LOCKS = tuple(threading.Lock() for _ in range(64))
+_DEDUP_CHUNK = 400
+# Look-ups run on every insert, so each thread keeps a connection per shard
+# file open, keyed by (thread, path).  They are closed when SHARDS is replaced
+# and by close_connections() on shutdown.
+_DEDUP_CONNECTIONS: Dict[Tuple[int, Path], sqlite3.Connection] = {}
+_DEDUP_CONNECTIONS_LOCK = threading.Lock()
+_DEDUP_SOURCE: Optional[shards.ShardMap] = None
+
+
+@contextmanager
+def _dedup_guard(payloads: Sequence[Dict[str, object]]) -> Iterator[None]:
+    if len(SHARDS.all) == 1:
+        yield
+        return
+    stripes = sorted({hash(mark) % len(_DEDUP_LOCKS) for payload in payloads for mark in _dedup_marks(payload)})
+    for stripe in stripes:
+        _DEDUP_LOCKS[stripe].acquire()
+    try:
+        yield
+    finally:
+        for stripe in reversed(stripes):
+            _DEDUP_LOCKS[stripe].release()
+
+
+def _dedup_marks(payload: Dict[str, object]) -> List[Tuple[str, object]]:
+    marks = [("event_id", payload["event_id"])]
+    if payload.get("idempotency_key"):
+        marks.append(("idempotency_key", payload["idempotency_key"]))
+    return marks
+
+
+def _dedup_connection(shard: shards.Shard) -> sqlite3.Connection:
+    global _DEDUP_SOURCE
+    key = (threading.get_ident(), shard.path)
+    conn = _DEDUP_CONNECTIONS.get(key)
+    if conn is not None and _DEDUP_SOURCE is SHARDS:
+        return conn
+    with _DEDUP_CONNECTIONS_LOCK:
+        if _DEDUP_SOURCE is not SHARDS:
+            # Another layout: drop the connections to files it no longer has.
+            paths = {item.path for item in SHARDS.all}
+            for stale in [item for item in _DEDUP_CONNECTIONS if item[1] not in paths]:
+                _DEDUP_CONNECTIONS.pop(stale).close()
+            _DEDUP_SOURCE = SHARDS
+        conn = _DEDUP_CONNECTIONS.get(key)
+        if conn is None:
+            DB_DIR.mkdir(parents=True, exist_ok=True)
+            # Closed from whichever thread shuts down; only its own thread uses it otherwise.
+            conn = _DEDUP_CONNECTIONS[key] = sqlite3.connect(shard.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+    return conn
+
+
+def close_connections() -> None:
+    """Close the connections kept open for event id look-ups."""
+    with _DEDUP_CONNECTIONS_LOCK:
+        while _DEDUP_CONNECTIONS:
+            _DEDUP_CONNECTIONS.popitem()[1].close()
+
+
+def _stored_events(payloads: Sequence[Dict[str, object]]) -> Dict[Tuple[str, object], Dict[str, object]]:
+    """Rows of any shard holding one of the payloads' event ids or idempotency keys, keyed by ``_dedup_marks``."""
+    stored: Dict[Tuple[str, object], Dict[str, object]] = {}
+    for start in range(0, len(payloads), _DEDUP_CHUNK):
+        chunk = payloads[start : start + _DEDUP_CHUNK]
+        event_ids = [payload["event_id"] for payload in chunk]
+        keys = [payload["idempotency_key"] for payload in chunk if payload.get("idempotency_key")]
+        sql = (
+            f"SELECT {_select_list(EVENT_COLUMNS)}, idempotency_key FROM interface4_events "
+            f"WHERE event_id IN ({', '.join('?' for _ in event_ids)}) "
+            f"OR idempotency_key IN ({', '.join('?' for _ in keys)})"
         )
-        conn.commit()
-        inserted_id = cursor.lastrowid
-        row = conn.execute(
-            "SELECT * FROM interface4_events WHERE id = ?", (inserted_id,)
-        ).fetchone()
-    return dict(row)
+        # One indexed look-up per shard; cheaper in this thread than through _scatter.
+        for shard in SHARDS.all:
+            for row in _dedup_connection(shard).execute(sql, [*event_ids, *keys]).fetchall():
+                record = _event_row(row)
+                key = record.pop("idempotency_key")
+                stored.setdefault(("event_id", record["event_id"]), record)
+                if key:
+                    stored.setdefault(("idempotency_key", key), record)
+    return stored
+
+
+@instrumented
+def insert_interface4_event(data: Dict[str, object], *, idempotency_key: Optional[str] = None) -> Tuple[Dict[str, object], bool]:
+    """Insert one event into its device's shard unless its ``event_id`` or ``idempotency_key`` is already stored in any shard.
+
+    Returns the stored row and whether it was created by this call; a retry
+    gets the row of the original request back.
+    """
+    payload = _event_payload({**data, "idempotency_key": idempotency_key}, now_ms())
+    shard = SHARDS.route(payload["device_id"])  # type: ignore[arg-type]
+    with _dedup_guard([payload]):
+        if len(SHARDS.all) > 1:
+            stored = _stored_events([payload])
+            existing = stored.get(("idempotency_key", idempotency_key)) or stored.get(("event_id", payload["event_id"]))
+            if existing is not None:
+                return existing, False
+        with get_connection(path=shard.path) as conn:
+            row = conn.execute(_RETURNING_SQL, payload).fetchone()
+            if row is None:
+                conn.rollback()
+                existing = conn.execute(
+                    f"SELECT {_select_list(EVENT_COLUMNS)} FROM interface4_events "
+                    "WHERE idempotency_key = ? OR event_id = ? ORDER BY idempotency_key IS NULL LIMIT 1",
+                    (idempotency_key, payload["event_id"]),
+                ).fetchone()
+                return _event_row(existing), False
+            record = _event_row(row)
+            if OUTBOX_ENABLED:
+                _write_outbox(conn, [record])
+            conn.commit()
+    EVENT_QUERY_CACHE.bump()
+    HOT_WINDOW.touch()
+    _notify_inserted()
+    return record, True
+
+
+@instrumented
+def insert_interface4_events(records: List[Dict[str, object]]) -> int:
+    """Insert a batch of events, one transaction per shard, skipping event ids already stored in any shard; returns the rows added."""
+    if not records:
+        return 0
+    now = now_ms()
+    inserted = 0
+    payloads = [_event_payload(record, now) for record in records]
+    with _dedup_guard(payloads):
+        if len(SHARDS.all) > 1:
+            payloads = _without_stored(payloads)
+        for shard, group in SHARDS.group(payloads):
+            with get_connection(path=shard.path) as conn:
+                if OUTBOX_ENABLED:
+                    rows = [_event_row(row) for row in (conn.execute(_RETURNING_SQL, payload).fetchone() for payload in group) if row]
+                    _write_outbox(conn, rows)
+                    inserted += len(rows)
+                else:
+                    before = conn.total_changes
+                    conn.executemany(_INSERT_EVENT_SQL, group)
+                    inserted += conn.total_changes - before
+                conn.commit()
+    if inserted:
+        EVENT_QUERY_CACHE.bump()
+        HOT_WINDOW.touch()
+        _notify_inserted()
+    return inserted
+
+
+def _without_stored(payloads: List[Dict[str, object]]) -> List[Dict[str, object]]:
+    # Drops events stored in any shard, and repeats within the batch that
+    # would land in different shards; the first occurrence wins, as it does
+    # for ON CONFLICT DO NOTHING within one file.
+    stored = _stored_events(payloads)
+    seen = set()
+    kept = []
+    for payload in payloads:
+        marks = _dedup_marks(payload)
+        if any(mark in stored or mark in seen for mark in marks):
+            continue
+        seen.update(marks)
+        kept.append(payload)
+    return kept
+
+
+def _write_outbox(conn: sqlite3.Connection, rows: List[Dict[str, object]]) -> None:
+    # Into the outbox of the shard the events went to: the write takes no lock
+    # but that shard's, and the entries commit together with their events.
+    if not rows:
+        return
+    created_at = time.time()
+    conn.executemany(
+        "INSERT INTO webhook_outbox (payload, created_at) VALUES (?, ?)",
+        [(json.dumps(row, ensure_ascii=False), created_at) for row in rows],
+    )
+
+
+def _notify_inserted() -> None:
+    for listener in INSERT_LISTENERS:
+        listener()
+
+
+_OUTBOX_HEAD_SQL = "SELECT seq FROM sqlite_sequence WHERE name = 'webhook_outbox'"
+
+
+@instrumented
+def fetch_outbox(after: Dict[str, int], limit: int) -> Dict[str, object]:
+    """Up to ``limit`` outbox entries past each shard's cursor in ``after``, plus every shard's newest outbox id.
+
+    Items are ``(shard name, id, payload, created_at)``, merged across shards
+    in write order; each shard's entries keep their id order.
+    """
+
+    def read(shard: shards.Shard) -> Tuple[List[tuple], int]:
+        with get_connection(path=shard.path, check_same_thread=False) as conn:
+            rows = conn.execute(
+                "SELECT id, payload, created_at FROM webhook_outbox WHERE id > ? ORDER BY id LIMIT ?",
+                (after.get(shard.name, 0), limit),
+            ).fetchall()
+            head = conn.execute(_OUTBOX_HEAD_SQL).fetchone()
+        return [(shard.name, *row) for row in rows], head[0] if head else 0
+
+    results = _scatter(read, SHARDS.all)
+    merged = heapq.merge(*(rows for rows, _ in results), key=lambda item: item[3])
+    return {
+        "items": list(itertools.islice(merged, limit)),
+        "heads": {shard.name: head for shard, (_, head) in zip(SHARDS.all, results)},
+    }
+
+
+@instrumented
+def outbox_cursor(subscriber: str) -> Dict[str, int]:
+    """Last delivered outbox id per shard; a new subscriber starts at each shard's current head."""
+
+    def read(shard: shards.Shard) -> int:
+        with get_connection(path=shard.path, check_same_thread=False) as conn:
+            conn.execute(
+                f"""
+                INSERT OR IGNORE INTO webhook_cursors (subscriber, delivered_id, updated_at)
+                VALUES (?, COALESCE(({_OUTBOX_HEAD_SQL}), 0), ?)
+                """,
+                (subscriber, time.time()),
+            )
+            conn.commit()
+            row = conn.execute("SELECT delivered_id FROM webhook_cursors WHERE subscriber = ?", (subscriber,)).fetchone()
+        return row[0]
+
+    return dict(zip((shard.name for shard in SHARDS.all), _scatter(read, SHARDS.all)))
+
+
+@instrumented
+def advance_outbox_cursor(subscriber: str, delivered: Dict[str, int]) -> None:
+    """Record the last delivered id of each shard in ``delivered``."""
+    for shard in SHARDS.all:
+        if shard.name not in delivered:
+            continue
+        with get_connection(path=shard.path) as conn:
+            conn.execute(
+                "UPDATE webhook_cursors SET delivered_id = MAX(delivered_id, ?), updated_at = ? WHERE subscriber = ?",
+                (delivered[shard.name], time.time(), subscriber),
+            )
+            conn.commit()
+
+
+@instrumented
+def prune_outbox(subscribers: List[str]) -> int:
+    """Drop entries every listed subscriber has received, shard by shard."""
+    if not subscribers:
+        return 0
+    marks = ", ".join("?" for _ in subscribers)
+
+    def prune(shard: shards.Shard) -> int:
+        with get_connection(path=shard.path, check_same_thread=False) as conn:
+            cursor = conn.execute(
+                f"""
+                DELETE FROM webhook_outbox
+                WHERE id <= (SELECT MIN(delivered_id) FROM webhook_cursors WHERE subscriber IN ({marks}))
+                """,
+                subscribers,
+            )
+            conn.commit()
+        return cursor.rowcount
+
+    return sum(_scatter(prune, SHARDS.all))
@@ -0,0 +1,288 @@
+"""Outbound ERP/MES client: task intake and batched progress feedback.
+
+Each configured system gets a pooled keep-alive HTTP client guarded by a
+circuit breaker.  After ``failureThreshold`` consecutive failures the breaker
+opens and calls fail fast; once ``resetTimeout`` has passed a single probe is
+let through (half-open) and decides whether to close it again.  Intake polls
+``GET {baseUrl}/tasks``, feedback coalesces task updates per task id and
+posts them to ``POST {baseUrl}/tasks/status`` in batches.  Everything runs in
+background tasks, so a slow or failing ERP never reaches request handling;
+the measured latency and breaker state are published to ``INTEGRATIONS``.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from . import data, metrics
+
+if TYPE_CHECKING:  # pragma: no cover
+    import httpx
+
+logger = logging.getLogger("unet.erp")
+
+CONFIG_PATH = os.environ.get("UNET_ERP_CONFIG")
+
+# INTEGRATIONS entry per system; ERP is part of the demo state already.
+INTEGRATION_NAMES = {"ERP": "ERP 任务接口", "MES": "MES 任务接口"}
+
+CALL_SECONDS = metrics.Histogram(
+    "unet_erp_call_duration_seconds", "Round-trip time of ERP/MES calls.", ("system", "operation")
+)
+CALL_FAILURES = metrics.Counter("unet_erp_call_failures", "Failed or short-circuited ERP/MES calls.", ("system", "reason"))
+BREAKER_STATE = metrics.Gauge(
+    "unet_erp_circuit_open", "1 while the circuit breaker is open, 0.5 half-open, 0 closed.", ("system",)
+)
+FEEDBACK_PENDING = metrics.Gauge("unet_erp_feedback_pending", "Task updates waiting to be reported.", ("system",))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a system whose breaker is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe; event loop only."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def abandon(self) -> None:
+        """The call ended without an answer (cancelled, or a local error): no verdict, but free the probe."""
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+
+@dataclass
+class SystemConfig:
+    name: str
+    base_url: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    timeout: float = 2.0
+    max_connections: int = 4
+    poll_interval: float = 5.0
+    feedback_interval: float = 2.0
+    feedback_batch: int = 50
+    failure_threshold: int = 5
+    reset_timeout: float = 30.0
+    slow_ms: int = 500
+
+    @classmethod
+    def from_dict(cls, raw: Dict[str, object]) -> "SystemConfig":
+        return cls(
+            name=str(raw.get("name", "ERP")),
+            base_url=str(raw["baseUrl"]).rstrip("/"),
+            headers={str(key): str(value) for key, value in (raw.get("headers") or {}).items()},
+            timeout=float(raw.get("timeout", 2.0)),
+            max_connections=int(raw.get("maxConnections", 4)),
+            poll_interval=float(raw.get("pollInterval", 5.0)),
+            feedback_interval=float(raw.get("feedbackInterval", 2.0)),
+            feedback_batch=int(raw.get("feedbackBatch", 50)),
+            failure_threshold=int(raw.get("failureThreshold", 5)),
+            reset_timeout=float(raw.get("resetTimeout", 30.0)),
+            slow_ms=int(raw.get("slowMs", 500)),
+        )
+
+    @property
+    def integration(self) -> str:
+        return INTEGRATION_NAMES.get(self.name.upper(), f"{self.name} 任务接口")
+
+
+class SystemClient:
+    """Pooled client, breaker and feedback queue for one ERP/MES system."""
+
+    def __init__(self, config: SystemConfig) -> None:
+        # httpx takes a noticeable share of a cold start; only load it once a system is configured.
+        import httpx
+
+        self.config = config
+        self.breaker = CircuitBreaker(config.failure_threshold, config.reset_timeout)
+        self.client = httpx.AsyncClient(
+            base_url=config.base_url,
+            headers=config.headers,
+            timeout=config.timeout,
+            limits=httpx.Limits(max_connections=config.max_connections, max_keepalive_connections=config.max_connections),
+        )
+        # Latest update per task id; swapped out whole when a batch is sent.
+        self.pending: Dict[str, Dict[str, object]] = {}
+        self._pending_lock = threading.Lock()
+        self.cursor: Optional[str] = None
+        self.last_latency: Optional[float] = None
+        self.received = 0
+        self.reported = 0
+
+    def on_task_update(self, update: Dict[str, object]) -> None:
+        # Runs in whichever thread changed the task; never waits on the network.
+        if update.get("source") == self.config.name:
+            with self._pending_lock:
+                self.pending[str(update["taskId"])] = update
+
+    async def call(self, operation: str, method: str, path: str, **kwargs) -> "httpx.Response":
+        import httpx
+
+        name = self.config.name
+        if not self.breaker.allow():
+            CALL_FAILURES.inc(1.0, name, "circuit_open")
+            raise CircuitOpenError(name)
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+            response.raise_for_status()
+        except httpx.HTTPError as exc:
+            self._observe(operation, started)
+            self.breaker.record_failure()
+            reason = f"HTTP {exc.response.status_code}" if isinstance(exc, httpx.HTTPStatusError) else type(exc).__name__
+            CALL_FAILURES.inc(1.0, name, reason)
+            if self.breaker.state == OPEN:
+                logger.warning("%s circuit open after %s", name, reason)
+            self.publish()
+            raise
+        except BaseException:
+            # Otherwise a half-open probe cancelled at shutdown would keep the breaker shut for good.
+            self.breaker.abandon()
+            raise
+        self._observe(operation, started)
+        self.breaker.record_success()
+        self.publish()
+        return response
+
+    def _observe(self, operation: str, started: float) -> None:
+        self.last_latency = time.perf_counter() - started
+        CALL_SECONDS.observe(self.last_latency, self.config.name, operation)
+
+    async def fetch_tasks(self) -> int:
+        params = {"since": self.cursor} if self.cursor else None
+        response = await self.call("intake", "GET", "/tasks", params=params)
+        body = response.json()
+        # One transaction for the whole poll, off the event loop.
+        accepted = await asyncio.to_thread(data.receive_external_tasks, body.get("tasks", []), self.config.name)
+        self.cursor = body.get("cursor", self.cursor)
+        self.received += accepted
+        return accepted
+
+    async def send_feedback(self) -> int:
+        import httpx
+
+        with self._pending_lock:
+            batch, self.pending = self.pending, {}
+        if not batch:
+            return 0
+        updates = list(batch.values())
+        sent = 0
+        try:
+            for start in range(0, len(updates), self.config.feedback_batch):
+                chunk = updates[start : start + self.config.feedback_batch]
+                await self.call("feedback", "POST", "/tasks/status", json={"updates": chunk})
+                sent += len(chunk)
+        except (httpx.HTTPError, CircuitOpenError):
+            # Put back what was not sent unless a newer update for the same task arrived meanwhile.
+            with self._pending_lock:
+                for update in updates[sent:]:
+                    self.pending.setdefault(str(update["taskId"]), update)
+            raise
+        finally:
+            FEEDBACK_PENDING.set(len(self.pending), self.config.name)
+        self.reported += sent
+        return sent
+
+    def publish(self) -> None:
+        state = self.breaker.state
+        BREAKER_STATE.set({CLOSED: 0.0, HALF_OPEN: 0.5, OPEN: 1.0}[state], self.config.name)
+        latency_ms = round(self.last_latency * 1000) if self.last_latency is not None else 0
+        if state == OPEN:
+            status = "offline"
+        elif state == HALF_OPEN or latency_ms > self.config.slow_ms:
+            status = "degraded"
+        else:
+            status = "online"
+        data.update_integration(self.config.integration, status=status, latency_ms=latency_ms)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class ErpSync:
+    """Runs intake and feedback loops for every configured system."""
+
+    def __init__(self, systems: List[SystemConfig]) -> None:
+        self.systems = [SystemClient(config) for config in systems]
+        self._stopped = asyncio.Event()
+
+    @classmethod
+    def from_env(cls) -> Optional["ErpSync"]:
+        if not CONFIG_PATH:
+            return None
+        raw = json.loads(Path(CONFIG_PATH).read_text(encoding="utf-8"))
+        return cls([SystemConfig.from_dict(item) for item in raw["systems"]])
+
+    async def run(self) -> None:
+        for system in self.systems:
+            data.register_integration(system.config.integration, f"第三方 {system.config.name}")
+            data.LIVE_SOURCES.add(system.config.integration)
+            data.TASK_LISTENERS.append(system.on_task_update)
+        try:
+            await asyncio.gather(
+                *(self._loop(system, system.fetch_tasks, system.config.poll_interval) for system in self.systems),
+                *(self._loop(system, system.send_feedback, system.config.feedback_interval) for system in self.systems),
+            )
+        finally:
+            for system in self.systems:
+                data.TASK_LISTENERS.remove(system.on_task_update)
+                await system.close()
+
+    async def _loop(self, system: SystemClient, step, interval: float) -> None:
+        import httpx
+
+        while not self._stopped.is_set():
+            try:
+                await step()
+            except (httpx.HTTPError, CircuitOpenError):
+                pass  # counted in CALL_FAILURES; the breaker decides when to try again
+            except Exception as exc:
+                # A malformed body (say a list, or tasks that are not objects) must not end
+                # this loop, and through gather every other system's loops with it.
+                CALL_FAILURES.inc(1.0, system.config.name, type(exc).__name__)
+                logger.warning("%s %s failed", system.config.name, step.__name__, exc_info=True)
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def close(self) -> None:
+        self._stopped.set()
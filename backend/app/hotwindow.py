@@ -0,0 +1,220 @@
+"""In-memory window over the newest interface 4 events.
+
+Nearly every list view asks for the last few hours, so the newest events are
+also kept in memory as a ring of one-minute buckets: buckets older than the
+window (or beyond the row limit) are dropped from the old end as time moves
+on.  Events arrive slightly out of order across shards and writers, so each
+bucket keeps its rows sorted by ``(triggered_ms, id)`` together with small
+per-status and per-device lists.  For everything that has left the window
+only counts per ``(status, device)`` are kept, which lets the default page
+and its total be answered without touching SQLite.
+
+The window knows nothing about SQLite: ``app.db`` loads it, feeds it the rows
+committed since it last looked and falls back to SQL for queries the window
+cannot answer (see :meth:`HotWindow.page`).
+"""
+from __future__ import annotations
+
+import bisect
+import sys
+import threading
+from collections import Counter
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from . import metrics
+
+BUCKET_MS = 60_000
+
+LOOKUPS = metrics.Counter(
+    "unet_hot_window_lookups", "Interface 4 list queries by where they were answered (memory, sqlite).", ("result",)
+)
+ROWS = metrics.Gauge("unet_hot_window_rows", "Interface 4 events held in the hot window.")
+
+# Low-cardinality text columns; interning them keeps one copy per distinct value.
+_SHARED = ("device_id", "point_code", "material_code", "unit", "status", "handler", "trigger_source")
+_LOWEST = -(2**63)
+_HIGHEST = 2**63 - 1
+
+Row = Tuple[object, ...]
+
+
+class _Bucket:
+    __slots__ = ("rows", "by_status", "by_device")
+
+    def __init__(self) -> None:
+        self.rows: List[Row] = []
+        self.by_status: Dict[object, List[Row]] = {}
+        self.by_device: Dict[object, List[Row]] = {}
+
+
+class HotWindow:
+    """Rows of ``columns`` (timestamps as epoch ms) triggered within the last ``hours``, at most ``max_rows``.
+
+    Callers hold ``lock`` around loading, adding and querying.
+    """
+
+    def __init__(self, columns: Sequence[str], *, hours: float, max_rows: int) -> None:
+        self.span_ms = int(hours * 3_600_000)
+        self.max_rows = max_rows
+        self.lock = threading.RLock()
+        self._key = itemgetter(columns.index("triggered_at"), columns.index("id"))
+        self._triggered = columns.index("triggered_at")
+        self._status = columns.index("status")
+        self._device = columns.index("device_id")
+        self._shared = tuple(columns.index(column) for column in _SHARED)
+        self.clear()
+
+    @property
+    def enabled(self) -> bool:
+        return self.span_ms > 0 and self.max_rows > 0
+
+    @property
+    def floor_ms(self) -> int:
+        """Events triggered before this are only counted, not held."""
+        return self._floor * BUCKET_MS
+
+    def __len__(self) -> int:
+        return self._size
+
+    def clear(self) -> None:
+        self._buckets: Dict[int, _Bucket] = {}
+        self._order: List[int] = []  # bucket numbers, ascending
+        self._size = 0
+        self._floor = 0
+        self._older: Counter = Counter()  # (status, device_id) -> rows below the floor
+        self.loaded = False
+        self.dirty = False
+        self.synced_at = 0.0
+        self.seen: Dict[str, int] = {}  # shard name -> highest id taken in
+        self.source: object = None  # what the rows were loaded from; a different source means reload
+        ROWS.set(0)
+
+    def touch(self) -> None:
+        """Note that events were committed; the next query catches up first."""
+        self.dirty = True
+
+    def load(self, rows: Iterable[Row], older: Dict[Tuple[object, object], int], now_ms: int) -> None:
+        """Start over from ``rows`` (triggered at or after :meth:`cutoff_ms`) and the counts of everything older."""
+        self.clear()
+        self._floor = self.cutoff_ms(now_ms) // BUCKET_MS
+        self._older.update(older)
+        self.add(rows, now_ms)
+        self.loaded = True
+
+    def cutoff_ms(self, now_ms: int) -> int:
+        return (now_ms - self.span_ms) // BUCKET_MS * BUCKET_MS
+
+    def add(self, rows: Iterable[Row], now_ms: int) -> None:
+        key = self._key
+        for row in rows:
+            values = list(row)
+            for index in self._shared:
+                if type(values[index]) is str:
+                    values[index] = sys.intern(values[index])
+            row = tuple(values)
+            number = row[self._triggered] // BUCKET_MS
+            if number < self._floor:
+                self._older[row[self._status], row[self._device]] += 1
+                continue
+            bucket = self._buckets.get(number)
+            if bucket is None:
+                bucket = self._buckets[number] = _Bucket()
+                bisect.insort(self._order, number)
+            bisect.insort(bucket.rows, row, key=key)
+            bisect.insort(bucket.by_status.setdefault(row[self._status], []), row, key=key)
+            bisect.insort(bucket.by_device.setdefault(row[self._device], []), row, key=key)
+            self._size += 1
+        self._trim(now_ms)
+
+    def _trim(self, now_ms: int) -> None:
+        cutoff = self.cutoff_ms(now_ms) // BUCKET_MS
+        dropped = 0
+        while dropped < len(self._order) and (self._order[dropped] < cutoff or self._size > self.max_rows):
+            number = self._order[dropped]
+            bucket = self._buckets.pop(number)
+            for row in bucket.rows:
+                self._older[row[self._status], row[self._device]] += 1
+            self._size -= len(bucket.rows)
+            self._floor = max(self._floor, number + 1)
+            dropped += 1
+        if dropped:
+            del self._order[:dropped]
+        self._floor = max(self._floor, cutoff)
+        ROWS.set(self._size)
+
+    def page(
+        self,
+        keyword: Optional[str],
+        status: Optional[str],
+        device_id: Optional[str],
+        start_ms: Optional[int],
+        end_ms: Optional[int],
+        page: int,
+        page_size: int,
+    ) -> Optional[Tuple[List[Row], int]]:
+        """``(rows newest first, total)`` for one page, or None when SQLite has to answer.
+
+        A range starting inside the window is answered from its buckets.  An
+        open-ended range also counts the events that left the window, as long
+        as the page itself lies within the window.  Keyword searches always go
+        to SQLite, whose LIKE scan beats matching rows one by one in Python.
+        """
+        if keyword:
+            return None
+        floor = self.floor_ms
+        bounded = start_ms is not None and start_ms >= floor
+        if not bounded and (start_ms is not None or (end_ms is not None and end_ms < floor)):
+            return None
+        low = (start_ms if start_ms is not None else _LOWEST, _LOWEST)
+        high = (end_ms if end_ms is not None else _HIGHEST, _HIGHEST)
+        first = bisect.bisect_left(self._order, low[0] // BUCKET_MS) if start_ms is not None else 0
+        last = bisect.bisect_right(self._order, high[0] // BUCKET_MS) if end_ms is not None else len(self._order)
+
+        offset = max(page - 1, 0) * page_size
+        rows: List[Row] = []
+        total = 0
+        for number in reversed(self._order[first:last]):
+            candidates = self._candidates(self._buckets[number], status, device_id)
+            if not candidates:
+                continue
+            lo = bisect.bisect_left(candidates, low, key=self._key) if low[0] > number * BUCKET_MS else 0
+            hi = (
+                bisect.bisect_right(candidates, high, key=self._key)
+                if high[0] < (number + 1) * BUCKET_MS
+                else len(candidates)
+            )
+            count = hi - lo
+            # Newest first: this bucket's rows sit at positions total .. total + count.
+            wanted_from, wanted_to = max(offset - total, 0), min(offset + page_size - total, count)
+            if wanted_from < wanted_to:
+                rows.extend(candidates[hi - 1 - index] for index in range(wanted_from, wanted_to))
+            total += count
+        if not bounded:
+            older = self._older_count(status, device_id)
+            if older and offset + page_size > total:
+                return None  # the page reaches into events only SQLite holds
+            total += older
+        return rows, total
+
+    def _candidates(self, bucket: _Bucket, status: Optional[str], device_id: Optional[str]) -> List[Row]:
+        if status is not None and device_id is not None:
+            by_status = bucket.by_status.get(status, ())
+            by_device = bucket.by_device.get(device_id, ())
+            if len(by_status) <= len(by_device):
+                return [row for row in by_status if row[self._device] == device_id]
+            return [row for row in by_device if row[self._status] == status]
+        if status is not None:
+            return bucket.by_status.get(status, [])
+        if device_id is not None:
+            return bucket.by_device.get(device_id, [])
+        return bucket.rows
+
+    def _older_count(self, status: Optional[str], device_id: Optional[str]) -> int:
+        if status is None and device_id is None:
+            return sum(self._older.values())
+        return sum(
+            count
+            for (row_status, row_device), count in self._older.items()
+            if (status is None or row_status == status) and (device_id is None or row_device == device_id)
+        )
@@ -1,27 +1,69 @@
 """FastAPI application exposing a demo API and serving the MVP frontend."""
 from __future__ import annotations
 
+import asyncio
 import csv
+import json
+import zlib
+from contextlib import asynccontextmanager
 from io import StringIO
 from pathlib import Path
-from typing import Iterable, List
+from typing import AsyncIterator, Iterable, List
 
-from fastapi import Depends, FastAPI, Header, HTTPException, Query, status
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, StreamingResponse
-from fastapi.staticfiles import StaticFiles
-
-from . import auth, data, db, schemas
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
+
+from . import admission, alarms, assets, auth, data, db, erp, metrics, migrations, modbus, profiling, schemas, snapshot, tasks, telemetry, utilization, webhooks, xlsx
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    if migrations.MIGRATE_ON_STARTUP:
+        migrations.migrate(seed_demo=migrations.SEED_DEMO)
+    alarm_engine = alarms.AlarmEngine.from_env()
+    # Restore the live state before anything reads it, so a restart picks up where it stopped.
+    snapshots = snapshot.StateSnapshots.from_env(alarm_engine)
+    if snapshots is not None:
+        snapshots.load()
+    utilization.sync(data.DEVICES)
+    data.DEVICE_LISTENERS.append(utilization.on_device_status)
+    data.ACQUISITION_LISTENERS.append(alarm_engine)
+    # Background services are opt-in through their UNET_*_CONFIG files.
+    services = [
+        service
+        for service in (
+            modbus.ModbusPoller.from_env(),
+            webhooks.WebhookDispatcher.from_env(),
+            erp.ErpSync.from_env(),
+            telemetry.TelemetryStore.from_env(),
+        )
+        if service is not None
+    ]
+    running = [asyncio.create_task(service.run()) for service in services]
+    snapshotting = asyncio.create_task(snapshots.run()) if snapshots is not None else None
+    yield
+    for service in services:
+        await service.close()
+    await asyncio.gather(*running)
+    if snapshotting is not None:
+        # Last snapshot once acquisition has stopped writing to the state.
+        await snapshots.close()
+        await snapshotting
+    data.ACQUISITION_LISTENERS.remove(alarm_engine)
+    data.DEVICE_LISTENERS.remove(utilization.on_device_status)
+    utilization.close_all()
+    db.close_connections()
 
 
 app = FastAPI(
     title="UNET Supply Management MVP",
     description="Demo API and frontend prototype for the集中供料管理系统",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
-db.init_db()
-
+app.add_middleware(admission.AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -29,8 +71,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(assets.CompressionMiddleware, minimum_size=1024, compresslevel=6)
+app.add_middleware(profiling.ProfilingMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 
 
+@profiling.timed_phase("auth")
 def get_current_user(authorization: str = Header(..., alias="Authorization")) -> auth.AuthenticatedUser:
     if not authorization:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="缺少认证信息")
@@ -44,6 +90,15 @@ def get_current_user(authorization: str = Header(..., alias="Authorization")) ->
     return user
 
 
+def require_permission(permission: str):
+    def dependency(user: auth.AuthenticatedUser = Depends(get_current_user)) -> auth.AuthenticatedUser:
+        if permission not in user.permissions:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="权限不足")
+        return user
+
+    return dependency
+
+
 @app.post("/api/auth/login", response_model=schemas.LoginResponse)
 def login(credentials: schemas.LoginRequest) -> schemas.LoginResponse:
     user = auth.verify_credentials(credentials.username, credentials.password)
@@ -68,17 +123,93 @@ def monitoring_devices(_: auth.AuthenticatedUser = Depends(get_current_user)) ->
     return [schemas.DeviceStatus(**item) for item in data.list_devices()]
 
 
-@app.get("/api/tasks", response_model=List[schemas.Task])
-def list_tasks(_: auth.AuthenticatedUser = Depends(get_current_user)) -> List[schemas.Task]:
-    return [schemas.Task(**item) for item in data.list_tasks()]
+@app.get("/api/reports/utilization", response_model=schemas.UtilizationReport)
+def utilization_report(
+    start: str | None = Query(default=None, description="开始时间 (ISO 或日期)，默认本月 1 日"),
+    end: str | None = Query(default=None, description="结束时间 (ISO 或日期，含当天)，默认当前时刻"),
+    device_id: str | None = Query(default=None, alias="deviceId", description="只统计该设备"),
+    _: auth.AuthenticatedUser = Depends(get_current_user),
+) -> schemas.UtilizationReport:
+    try:
+        window = utilization.parse_window(start, end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="统计时间范围无效")
+    names = {str(device["deviceId"]): str(device["name"]) for device in data.DEVICES}
+    return schemas.UtilizationReport(**utilization.utilization_report(*window, device_id=device_id, names=names))
+
+
+@app.get("/api/telemetry/history", response_model=schemas.TelemetryHistory)
+def telemetry_history(
+    device_id: str = Query(..., alias="deviceId", description="设备编号"),
+    field: str = Query(default="temperature", description="指标：temperature / level / throughput"),
+    start: str | None = Query(default=None, description="开始时间 (ISO 或日期)，默认 24 小时前"),
+    end: str | None = Query(default=None, description="结束时间 (ISO 或日期，含当天)，默认当前时刻"),
+    resolution: int | None = Query(default=None, ge=1, description="聚合间隔 (秒)，默认按时间范围取约 500 个点"),
+    _: auth.AuthenticatedUser = Depends(get_current_user),
+) -> schemas.TelemetryHistory:
+    if field not in telemetry.FIELDS:
+        raise HTTPException(status_code=400, detail="未知的遥测指标")
+    try:
+        window = telemetry.parse_window(start, end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="查询时间范围无效")
+    try:
+        payload = telemetry.history(device_id, field, *window, resolution * 1000 if resolution else None)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"聚合间隔过小，单次最多返回 {telemetry.MAX_POINTS} 个点")
+    return schemas.TelemetryHistory(**payload)
+
+
+@app.get("/api/tasks", response_model=schemas.TaskListResponse)
+def list_tasks(
+    status: str | None = Query(default=None, description="状态过滤"),
+    target_device: str | None = Query(default=None, alias="targetDevice", description="目标设备"),
+    start: str | None = Query(default=None, description="计划时间起 (ISO 或日期)"),
+    end: str | None = Query(default=None, description="计划时间止 (ISO 或日期，含当天)"),
+    page: int = Query(default=1, ge=1, description="页码"),
+    page_size: int = Query(default=30, ge=1, le=500, alias="pageSize", description="分页大小"),
+    _: auth.AuthenticatedUser = Depends(get_current_user),
+) -> schemas.TaskListResponse:
+    try:
+        payload = data.list_tasks(
+            status=status, target_device=target_device, start=start, end=end, page=page, page_size=page_size
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="计划时间范围无效")
+    return schemas.TaskListResponse(**payload)
 
 
 @app.post("/api/tasks", response_model=schemas.TaskCreateResponse, status_code=status.HTTP_201_CREATED)
 def create_task(payload: schemas.TaskCreateRequest, user: auth.AuthenticatedUser = Depends(get_current_user)) -> schemas.TaskCreateResponse:
-    task = data.create_task({**payload.dict(), "actor": user.username})
+    try:
+        task = data.create_task({**payload.dict(), "actor": user.username})
+    except ValueError:
+        raise HTTPException(status_code=400, detail="计划时间无效")
     return schemas.TaskCreateResponse(**task)
 
 
+@app.post("/api/tasks/batch", response_model=schemas.TaskBatchResponse, status_code=status.HTTP_201_CREATED)
+def import_tasks(payload: schemas.TaskBatchRequest, user: auth.AuthenticatedUser = Depends(get_current_user)) -> schemas.TaskBatchResponse:
+    """Validate and store a whole plan in one transaction: either every task is queued or none is."""
+    now = data._ts()
+    items = []
+    seen = set()
+    for index, item in enumerate(payload.tasks, start=1):
+        if item.taskId and item.taskId in seen:
+            raise HTTPException(status_code=400, detail=f"第 {index} 条任务编号重复：{item.taskId}")
+        seen.add(item.taskId)
+        try:
+            items.append(tasks.normalize(item.dict(), source=payload.source, now=now))
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"第 {index} 条任务计划时间无效")
+    try:
+        stored = data.import_tasks(items, actor=user.username)
+    except tasks.TaskConflictError as exc:
+        shown = "、".join(exc.task_ids[:10]) + (" 等" if len(exc.task_ids) > 10 else "")
+        raise HTTPException(status_code=409, detail=f"任务编号已存在：{shown}")
+    return schemas.TaskBatchResponse(imported=len(stored), taskIds=[str(task["taskId"]) for task in stored])
+
+
 @app.get("/api/alerts", response_model=List[schemas.Alert])
 def list_alerts(_: auth.AuthenticatedUser = Depends(get_current_user)) -> List[schemas.Alert]:
     return [schemas.Alert(**item) for item in data.list_alerts()]
@@ -94,11 +225,18 @@ def list_integrations(_: auth.AuthenticatedUser = Depends(get_current_user)) ->
     return [schemas.IntegrationStatus(**item) for item in data.get_integrations()]
 
 
+@app.get("/api/integrations/webhooks", response_model=List[schemas.WebhookSubscriberStatus])
+def list_webhook_subscribers(
+    _: auth.AuthenticatedUser = Depends(get_current_user),
+) -> List[schemas.WebhookSubscriberStatus]:
+    return [schemas.WebhookSubscriberStatus(**item) for item in webhooks.subscriber_status()]
+
 
 @app.get("/api/interface4/events", response_model=schemas.Interface4EventListResponse)
 def list_interface4_events(
     keyword: str | None = Query(default=None, description="事件编号、物料或设备模糊匹配"),
     status: str | None = Query(default=None, description="状态过滤"),
+    device_id: str | None = Query(default=None, alias="deviceId", description="设备编号过滤"),
     start: str | None = Query(default=None, description="开始时间 (ISO 或日期)"),
     end: str | None = Query(default=None, description="结束时间 (ISO 或日期)"),
     page: int = Query(default=1, ge=1, description="页码"),
@@ -108,6 +246,7 @@ def list_interface4_events(
     payload = db.query_interface4_events(
         keyword=keyword,
         status=status,
+        device_id=device_id,
         start=start,
         end=end,
         page=page,
@@ -129,86 +268,244 @@ def list_interface4_events(
 )
 def create_interface4_event(
     payload: schemas.Interface4EventCreateRequest,
+    response: Response,
+    idempotency_key: str | None = Header(default=None, alias="Idempotency-Key", max_length=128),
     _: auth.AuthenticatedUser = Depends(get_current_user),
 ) -> schemas.Interface4Event:
-    record = db.insert_interface4_event(payload.dict(exclude_unset=True))
+    record, created = db.insert_interface4_event(
+        payload.dict(by_alias=True, exclude_unset=True), idempotency_key=idempotency_key
+    )
+    if not created:
+        # A retry of an event that is already stored: hand back the original row.
+        response.status_code = status.HTTP_200_OK
+        response.headers["Idempotent-Replayed"] = "true"
     return schemas.Interface4Event(**record)
 
 
+# Rows are flushed in chunks so compression works on whole blocks, not single lines.
+EXPORT_CHUNK_SIZE = 16 * 1024
+
+# (header, column, xlsx column width)
+EXPORT_COLUMNS = [
+    ("事件编号", "event_id", 22),
+    ("触发时间", "triggered_at", 21),
+    ("设备/料斗", "device_id", 14),
+    ("点位", "point_code", 10),
+    ("物料", "material_code", 10),
+    ("批次", "batch_no", 16),
+    ("产出数量", "produced_qty", 10),
+    ("单位", "unit", 6),
+    ("触发值", "trigger_value", 10),
+    ("状态", "status", 11),
+    ("来源", "trigger_source", 10),
+    ("处理通道", "handler", 12),
+    ("备注", "remarks", 24),
+]
+
+
+def _csv_stream(rows: Iterable[tuple]) -> Iterable[bytes]:
+    buffer = StringIO()
+
+    def flush() -> bytes:
+        chunk = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+        metrics.EXPORT_BYTES.inc(len(chunk), "csv")
+        return chunk
+
+    # The BOM makes Excel open the file as UTF-8 instead of the local code page.
+    buffer.write("\ufeff")
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, _, _ in EXPORT_COLUMNS])
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield flush()
+    yield flush()
+
+
+def _xlsx_stream(rows: Iterable[tuple]) -> Iterable[bytes]:
+    for chunk in xlsx.stream_workbook(
+        [header for header, _, _ in EXPORT_COLUMNS],
+        rows,
+        sheet_name="接口4事件",
+        widths=[width for _, _, width in EXPORT_COLUMNS],
+    ):
+        metrics.EXPORT_BYTES.inc(len(chunk), "xlsx")
+        yield chunk
+
+
+# NDJSON carries every column under the name GET /api/interface4/events uses
+# for it (the snake_case column name) plus a resume cursor per line.
+NDJSON_COLUMNS = list(db.EVENT_COLUMNS)
+
+
+def _ndjson_stream(rows: Iterable[tuple]) -> Iterable[bytes]:
+    id_index = NDJSON_COLUMNS.index("id")
+    triggered_index = NDJSON_COLUMNS.index("triggered_at")
+    encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+    pending: List[str] = []
+    size = 0
+    count = 0
+    for row in rows:
+        record = dict(zip(NDJSON_COLUMNS, row))
+        record["cursor"] = db.encode_cursor(row[triggered_index], row[id_index])
+        line = encode(record)
+        pending.append(line)
+        size += len(line) + 1
+        count += 1
+        if size >= EXPORT_CHUNK_SIZE:
+            chunk = ("\n".join(pending) + "\n").encode("utf-8")
+            pending.clear()
+            size = 0
+            metrics.EXPORT_BYTES.inc(len(chunk), "ndjson")
+            yield chunk
+    # A closing line lets clients tell a finished export from one cut off at a line boundary.
+    pending.append(encode({"complete": True, "rows": count}))
+    chunk = ("\n".join(pending) + "\n").encode("utf-8")
+    metrics.EXPORT_BYTES.inc(len(chunk), "ndjson")
+    yield chunk
+
+
+def _gzip_stream(chunks: Iterable[bytes]) -> Iterable[bytes]:
+    # Sync-flush per chunk so everything received before a dropped connection
+    # still decompresses; resumed downloads append as further gzip members.
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+# format -> (stream, columns, media type, file extension)
+EXPORT_FORMATS = {
+    "csv": (_csv_stream, [column for _, column, _ in EXPORT_COLUMNS], "text/csv", "csv"),
+    "ndjson": (_ndjson_stream, NDJSON_COLUMNS, "application/x-ndjson", "ndjson"),
+    "xlsx": (
+        _xlsx_stream,
+        [column for _, column, _ in EXPORT_COLUMNS],
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "xlsx",
+    ),
+}
+
+
 @app.get("/api/interface4/events/export", include_in_schema=False)
 def export_interface4_events(
     keyword: str | None = Query(default=None, description="事件编号、物料或设备模糊匹配"),
     status: str | None = Query(default=None, description="状态过滤"),
+    device_id: str | None = Query(default=None, alias="deviceId", description="设备编号过滤"),
     start: str | None = Query(default=None, description="开始时间 (ISO 或日期)"),
     end: str | None = Query(default=None, description="结束时间 (ISO 或日期)"),
+    format: str = Query(default="csv", pattern="^(csv|ndjson|xlsx)$", description="导出格式：csv、ndjson 或 xlsx"),
+    compress: str | None = Query(default=None, pattern="^gzip$", description="gzip：下载为 .gz 文件"),
+    cursor: str | None = Query(default=None, description="续传游标，从该位置之后继续导出"),
     _: auth.AuthenticatedUser = Depends(get_current_user),
 ) -> StreamingResponse:
-    events = db.fetch_interface4_events(
+    after = None
+    if cursor:
+        try:
+            after = db.decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="续传游标无效")
+    if compress and format == "xlsx":
+        raise HTTPException(status_code=400, detail="xlsx 本身已压缩，无需 gzip")
+    stream, columns, media_type, extension = EXPORT_FORMATS[format]
+    rows = db.iter_interface4_events(
         keyword=keyword,
         status=status,
+        device_id=device_id,
         start=start,
         end=end,
+        after=after,
+        columns=columns,
     )
+    body = stream(rows)
+    if compress:
+        # Served as a gzip file rather than Content-Encoding, so the middleware leaves it alone.
+        body = _gzip_stream(body)
+        media_type = "application/gzip"
+        extension += ".gz"
+    response = StreamingResponse(body, media_type=media_type)
+    response.headers["Content-Disposition"] = f"attachment; filename=interface4_events.{extension}"
+    return response
 
-    headers = [
-        "事件编号",
-        "触发时间",
-        "设备/料斗",
-        "点位",
-        "物料",
-        "批次",
-        "产出数量",
-        "单位",
-        "触发值",
-        "状态",
-        "来源",
-        "处理通道",
-        "备注",
-    ]
 
-    def generate() -> Iterable[str]:
-        buffer = StringIO()
-        writer = csv.writer(buffer)
-        writer.writerow(headers)
-        yield buffer.getvalue()
-        buffer.seek(0)
-        buffer.truncate(0)
-        for item in events:
-            writer.writerow(
-                [
-                    item.get("event_id"),
-                    item.get("triggered_at"),
-                    item.get("device_id"),
-                    item.get("point_code"),
-                    item.get("material_code"),
-                    item.get("batch_no"),
-                    item.get("produced_qty"),
-                    item.get("unit"),
-                    item.get("trigger_value"),
-                    item.get("status"),
-                    item.get("trigger_source"),
-                    item.get("handler"),
-                    item.get("remarks"),
-                ]
-            )
-            yield buffer.getvalue()
-            buffer.seek(0)
-            buffer.truncate(0)
-
-    response = StreamingResponse(generate(), media_type="text/csv; charset=utf-8")
-    response.headers["Content-Disposition"] = "attachment; filename=interface4_events.csv"
-    return response
+@app.post("/api/admin/profiling/start", response_model=schemas.ProfilingReport)
+def start_profiling(
+    payload: schemas.ProfilingStartRequest,
+    _: auth.AuthenticatedUser = Depends(require_permission("system.profile")),
+) -> schemas.ProfilingReport:
+    profiling.profiler.start(
+        duration=payload.durationSeconds,
+        interval=payload.intervalMs / 1000,
+        route_prefix=payload.routePrefix,
+        header=payload.header,
+    )
+    return schemas.ProfilingReport(**profiling.profiler.report())
+
+
+@app.post("/api/admin/profiling/stop", response_model=schemas.ProfilingReport)
+def stop_profiling(
+    _: auth.AuthenticatedUser = Depends(require_permission("system.profile")),
+) -> schemas.ProfilingReport:
+    profiling.profiler.stop()
+    return schemas.ProfilingReport(**profiling.profiler.report())
+
+
+@app.get("/api/admin/profiling", response_model=schemas.ProfilingReport)
+def profiling_report(
+    limit: int = Query(default=50, ge=1, le=500, description="返回的热点数量"),
+    format: str = Query(default="json", pattern="^(json|collapsed)$", description="collapsed 为火焰图折叠格式"),
+    _: auth.AuthenticatedUser = Depends(require_permission("system.profile")),
+):
+    if format == "collapsed":
+        return PlainTextResponse(profiling.profiler.collapsed())
+    return schemas.ProfilingReport(**profiling.profiler.report(limit))
+
+
+@app.get("/api/admin/slow-requests", response_model=schemas.SlowRequestLog)
+def list_slow_requests(
+    _: auth.AuthenticatedUser = Depends(require_permission("system.profile")),
+) -> schemas.SlowRequestLog:
+    log = profiling.slow_requests
+    return schemas.SlowRequestLog(thresholdMs=log.threshold_ms, items=list(log.entries))
+
+
+@app.put("/api/admin/slow-requests", response_model=schemas.SlowRequestLog)
+def update_slow_request_threshold(
+    payload: schemas.SlowRequestSettings,
+    _: auth.AuthenticatedUser = Depends(require_permission("system.profile")),
+) -> schemas.SlowRequestLog:
+    log = profiling.slow_requests
+    log.threshold_ms = payload.thresholdMs
+    return schemas.SlowRequestLog(thresholdMs=log.threshold_ms, items=list(log.entries))
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics() -> PlainTextResponse:
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 
 FRONTEND_DIR = Path(__file__).resolve().parents[2] / "frontend"
 INDEX_FILE = FRONTEND_DIR / "index.html"
 
 if FRONTEND_DIR.exists():
-    app.mount("/assets", StaticFiles(directory=FRONTEND_DIR), name="frontend-assets")
+    asset_manifest = assets.AssetManifest(FRONTEND_DIR).build()
+    app.mount(
+        "/assets",
+        assets.FingerprintedStaticFiles(directory=FRONTEND_DIR, manifest=asset_manifest),
+        name="frontend-assets",
+    )
+else:
+    asset_manifest = None
 
 
 @app.get("/", include_in_schema=False)
-async def serve_index() -> FileResponse:
+async def serve_index(request: Request) -> Response:
     if not INDEX_FILE.exists():
         raise HTTPException(status_code=404, detail="前端尚未构建")
+    if asset_manifest is not None:
+        response = asset_manifest.index_response(request.headers)
+        if response is not None:
+            return response
     return FileResponse(INDEX_FILE)
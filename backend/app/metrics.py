@@ -0,0 +1,275 @@
+"""Lock-cheap Prometheus metrics for the MVP API.
+
+Every recording thread writes into its own shard, so the hot path never takes a
+lock; shards are only summed when ``/metrics`` is scraped.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LabelValues = Tuple[str, ...]
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+INTERVAL_BUCKETS = (1.0, 2.0, 3.0, 4.0, 5.0, 7.5, 10.0, 15.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class _Shards:
+    """Per-thread dictionaries that are only mutated by their owning thread."""
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+        self._shards: List[Dict[LabelValues, object]] = []
+        self._lock = threading.Lock()
+
+    def local(self) -> Dict[LabelValues, object]:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard: Dict[LabelValues, object] = {}
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+    def snapshot(self) -> Iterator[Dict[LabelValues, object]]:
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            # dict() of a dict is a single C-level copy and is safe against the owner thread.
+            yield dict(shard)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def samples(self) -> Iterator[Tuple[str, LabelValues, float]]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines)
+
+    def _labels(self, extra: Sequence[Tuple[str, str]], values: LabelValues) -> Tuple[Tuple[str, str], ...]:
+        return tuple(zip(self.labelnames, values)) + tuple(extra)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._shards = _Shards()
+
+    def inc(self, amount: float = 1.0, *labels: str) -> None:
+        shard = self._shards.local()
+        shard[labels] = shard.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return sum(shard.get(labels, 0.0) for shard in self._shards.snapshot())
+
+    def samples(self) -> Iterator[Tuple[str, LabelValues, float]]:
+        totals: Dict[LabelValues, float] = {}
+        for shard in self._shards.snapshot():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0.0) + value
+        for labels in sorted(totals):
+            yield "_total", self._labels((), labels), totals[labels]
+
+
+class Gauge(Metric):
+    """Gauge with atomic ``set`` plus sharded ``inc``/``dec`` deltas, or a scrape-time callback."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        function: Optional[Callable[[], float]] = None,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._deltas = _Shards()
+        self._function = function
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+    def inc(self, amount: float = 1.0, *labels: str) -> None:
+        shard = self._deltas.local()
+        shard[labels] = shard.get(labels, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, *labels: str) -> None:
+        self.inc(-amount, *labels)
+
+    def samples(self) -> Iterator[Tuple[str, LabelValues, float]]:
+        if self._function is not None:
+            yield "", (), float(self._function())
+            return
+        totals = dict(self._values)
+        for shard in self._deltas.snapshot():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0.0) + value
+        for labels in sorted(totals):
+            yield "", self._labels((), labels), totals[labels]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._shards = _Shards()
+
+    def observe(self, value: float, *labels: str) -> None:
+        shard = self._shards.local()
+        series = shard.get(labels)
+        if series is None:
+            # One slot per bucket, one for +Inf, then sum and count.
+            series = shard[labels] = [0.0] * (len(self.buckets) + 3)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def samples(self) -> Iterator[Tuple[str, LabelValues, float]]:
+        totals: Dict[LabelValues, List[float]] = {}
+        for shard in self._shards.snapshot():
+            for labels, series in shard.items():
+                current = list(series)
+                merged = totals.setdefault(labels, [0.0] * len(current))
+                for index, value in enumerate(current):
+                    merged[index] += value
+        bounds = [_format_value(bound) for bound in self.buckets] + ["+Inf"]
+        for labels in sorted(totals):
+            series = totals[labels]
+            cumulative = 0.0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                yield "_bucket", self._labels((("le", bound),), labels), cumulative
+            yield "_sum", self._labels((), labels), series[-2]
+            yield "_count", self._labels((), labels), series[-1]
+
+
+REGISTRY: List[Metric] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "unet_http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ("method", "route", "status"),
+)
+HTTP_IN_FLIGHT = Gauge(
+    "unet_http_requests_in_flight",
+    "HTTP requests currently being served by route template.",
+    ("method", "route"),
+)
+DB_QUERY_SECONDS = Histogram(
+    "unet_db_query_duration_seconds",
+    "Time spent in each SQLite helper of db.py.",
+    ("function",),
+)
+DB_QUERY_ROWS = Counter(
+    "unet_db_query_rows",
+    "Rows returned by each SQLite helper of db.py.",
+    ("function",),
+)
+SIMULATE_TICK_SECONDS = Histogram(
+    "unet_simulate_tick_duration_seconds",
+    "Duration of one simulate_tick pass over the live state.",
+)
+SIMULATE_TICK_INTERVAL = Histogram(
+    "unet_simulate_tick_interval_seconds",
+    "Time between two consecutive simulate_tick passes.",
+    buckets=INTERVAL_BUCKETS,
+)
+EXPORT_BYTES = Counter(
+    "unet_export_bytes",
+    "Bytes streamed by export endpoints.",
+    ("format",),
+)
+
+
+def track_token_store(size: Callable[[], int]) -> Gauge:
+    return Gauge("unet_auth_tokens", "Bearer tokens currently held by the TokenStore.", function=size)
+
+
+def route_label(scope: Scope) -> str:
+    app = scope.get("app")
+    router = getattr(app, "router", None)
+    for route in getattr(router, "routes", ()):
+        match, _ = route.matches(scope)
+        if match is Match.FULL:
+            return getattr(route, "path", scope["path"])
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """Records per-route latency and in-flight requests for every HTTP call."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_label(scope)
+        status_code = "500"
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = str(message["status"])
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(1.0, method, route)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method, route, status_code)
+            HTTP_IN_FLIGHT.dec(1.0, method, route)
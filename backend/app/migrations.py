@@ -0,0 +1,462 @@
+"""Versioned SQLite schema migrations.
+
+Migrations run once per database under a file lock, either from the app
+lifespan or from the command line::
+
+    python -m app migrate               # apply pending migrations
+    python -m app migrate --status      # show the current schema version
+    python -m app migrate --seed-demo
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional
+
+from . import db, shards, tasks
+
+try:  # POSIX
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+
+SEED_DEMO = os.environ.get("UNET_SEED_DEMO", "").lower() in {"1", "true", "yes"}
+MIGRATE_ON_STARTUP = os.environ.get("UNET_MIGRATE_ON_STARTUP", "1").lower() not in {"0", "false", "no"}
+
+
+Step = Callable[[sqlite3.Connection, shards.Shard], None]
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    apply: Step
+    # Steps for tables only the main database holds skip the event shard files.
+    main_only: bool = False
+    # Some statements (journal_mode) cannot run inside a transaction.
+    transaction: bool = True
+
+    def applies_to(self, shard: shards.Shard) -> bool:
+        return not self.main_only or shard.name == shards.MAIN
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(
+    version: int, description: str, *, main_only: bool = False, transaction: bool = True
+) -> Callable[[Step], Step]:
+    def register(func: Step) -> Step:
+        if MIGRATIONS and MIGRATIONS[-1].version >= version:
+            raise RuntimeError(f"migration {version} registered out of order")
+        MIGRATIONS.append(Migration(version, description, func, main_only, transaction))
+        return func
+
+    return register
+
+
+@migration(1, "create interface4_events")
+def _create_interface4_events(conn: sqlite3.Connection, shard: shards.Shard) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS interface4_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_id TEXT NOT NULL,
+            device_id TEXT,
+            point_code TEXT,
+            material_code TEXT,
+            batch_no TEXT,
+            produced_qty REAL,
+            unit TEXT,
+            trigger_value REAL,
+            status TEXT,
+            handler TEXT,
+            remarks TEXT,
+            trigger_source TEXT,
+            triggered_at TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_interface4_events_triggered_at ON interface4_events(triggered_at)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_interface4_events_event_id ON interface4_events(event_id)"
+    )
+
+
+@migration(2, "create webhook outbox")
+def _create_webhook_outbox(conn: sqlite3.Connection, shard: shards.Shard) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS webhook_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            payload TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS webhook_cursors (
+            subscriber TEXT PRIMARY KEY,
+            delivered_id INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """
+    )
+
+
+
+@migration(3, "create device status intervals", main_only=True)
+def _create_device_status_intervals(conn: sqlite3.Connection, shard: shards.Shard) -> None:
+    # Run-length encoded status history: one row per stretch of unchanged
+    # status.  Closed rows never cross a UTC midnight and are also summed
+    # into device_status_daily; ended_at is NULL for the current stretch.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS device_status_intervals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            device_id TEXT NOT NULL,
+            status TEXT NOT NULL,
+            started_at REAL NOT NULL,
+            ended_at REAL
+        )
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_device_status_intervals_started_at "
+        "ON device_status_intervals(started_at, ended_at)"
+    )
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_device_status_intervals_open "
+        "ON device_status_intervals(device_id) WHERE ended_at IS NULL"
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS device_status_daily (
+            day TEXT NOT NULL,
+            device_id TEXT NOT NULL,
+            status TEXT NOT NULL,
+            seconds REAL NOT NULL,
+            PRIMARY KEY (day, device_id, status)
+        ) WITHOUT ROWID
+        """
+    )
+
+
+@migration(4, "unique interface4 event ids and idempotency keys")
+def _unique_interface4_event_ids(conn: sqlite3.Connection, shard: shards.Shard) -> None:
+    conn.execute("ALTER TABLE interface4_events ADD COLUMN idempotency_key TEXT")
+    # Earlier same-second fallback ids could collide; keep the first row's id
+    # and suffix the others with their row id so nothing is lost.
+    conn.execute(
+        """
+        UPDATE interface4_events SET event_id = event_id || '-' || id
+        WHERE id NOT IN (SELECT MIN(id) FROM interface4_events GROUP BY event_id)
+        """
+    )
+    conn.execute("DROP INDEX IF EXISTS idx_interface4_events_event_id")
+    conn.execute("CREATE UNIQUE INDEX idx_interface4_events_event_id ON interface4_events(event_id)")
+    conn.execute(
+        "CREATE UNIQUE INDEX idx_interface4_events_idempotency_key "
+        "ON interface4_events(idempotency_key) WHERE idempotency_key IS NOT NULL"
+    )
+
+
+# julianday() honours "Z" and "+08:00" alike, so every stored offset lands on
+# the same UTC timeline.
+_EPOCH_MS_SQL = "CAST(ROUND((julianday({0}) - 2440587.5) * 86400000.0) AS INTEGER)"
+
+
+@migration(5, "store interface4 event timestamps as epoch milliseconds")
+def _interface4_epoch_ms(conn: sqlite3.Connection, shard: shards.Shard) -> None:
+    # Rebuilt rather than altered in place: DROP COLUMN needs SQLite 3.35 and
+    # the text timestamps should not linger in every row.
+    conn.execute(
+        """
+        CREATE TABLE interface4_events_ms (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_id TEXT NOT NULL,
+            device_id TEXT,
+            point_code TEXT,
+            material_code TEXT,
+            batch_no TEXT,
+            produced_qty REAL,
+            unit TEXT,
+            trigger_value REAL,
+            status TEXT,
+            handler TEXT,
+            remarks TEXT,
+            trigger_source TEXT,
+            triggered_ms INTEGER NOT NULL,
+            created_ms INTEGER NOT NULL,
+            idempotency_key TEXT
+        )
+        """
+    )
+    triggered = _EPOCH_MS_SQL.format("COALESCE(triggered_at, created_at)")
+    created = _EPOCH_MS_SQL.format("COALESCE(created_at, triggered_at)")
+    conn.execute(
+        f"""
+        INSERT INTO interface4_events_ms
+        SELECT id, event_id, device_id, point_code, material_code, batch_no, produced_qty, unit, trigger_value,
+               status, handler, remarks, trigger_source,
+               COALESCE({triggered}, 0), COALESCE({created}, 0), idempotency_key
+        FROM interface4_events
+        """
+    )
+    conn.execute("DROP TABLE interface4_events")
+    conn.execute("ALTER TABLE interface4_events_ms RENAME TO interface4_events")
+    conn.execute("CREATE INDEX idx_interface4_events_triggered_ms ON interface4_events(triggered_ms)")
+    conn.execute("CREATE UNIQUE INDEX idx_interface4_events_event_id ON interface4_events(event_id)")
+    conn.execute(
+        "CREATE UNIQUE INDEX idx_interface4_events_idempotency_key "
+        "ON interface4_events(idempotency_key) WHERE idempotency_key IS NOT NULL"
+    )
+
+
+@migration(6, "create tasks", main_only=True)
+def _create_tasks(conn: sqlite3.Connection, shard: shards.Shard) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tasks (
+            task_id TEXT PRIMARY KEY,
+            material_code TEXT NOT NULL,
+            target_device TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            priority TEXT NOT NULL,
+            status TEXT NOT NULL,
+            progress INTEGER NOT NULL,
+            scheduled_ms INTEGER NOT NULL,
+            updated_ms INTEGER NOT NULL,
+            source TEXT NOT NULL
+        )
+        """
+    )
+    # (status, updated_ms) also answers the dashboard's per-status counts from the index alone.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status, updated_ms)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_target_device ON tasks(target_device, scheduled_ms)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_scheduled ON tasks(scheduled_ms)")
+
+
+@migration(7, "index interface 4 events by device")
+def _index_events_by_device(conn: sqlite3.Connection, shard: shards.Shard) -> None:
+    # Serves the deviceId filter for ranges older than the in-memory hot window.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_interface4_events_device ON interface4_events(device_id, triggered_ms)")
+
+
+@migration(8, "create telemetry tiers", main_only=True)
+def _create_telemetry(conn: sqlite3.Connection, shard: shards.Shard) -> None:
+    # Raw samples plus 1-minute and 1-hour min/avg/max rollups, all keyed by
+    # (device, time) so a device's history is one range of the primary key.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS telemetry_raw (
+            device_id TEXT NOT NULL,
+            sampled_ms INTEGER NOT NULL,
+            temperature REAL,
+            level REAL,
+            throughput REAL,
+            PRIMARY KEY (device_id, sampled_ms)
+        ) WITHOUT ROWID
+        """
+    )
+    for table in ("telemetry_1m", "telemetry_1h"):
+        conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                device_id TEXT NOT NULL,
+                bucket_ms INTEGER NOT NULL,
+                samples INTEGER NOT NULL,
+                temperature_min REAL,
+                temperature_avg REAL,
+                temperature_max REAL,
+                level_min REAL,
+                level_avg REAL,
+                level_max REAL,
+                throughput_min REAL,
+                throughput_avg REAL,
+                throughput_max REAL,
+                PRIMARY KEY (device_id, bucket_ms)
+            ) WITHOUT ROWID
+            """
+        )
+    # How far each rollup tier has been compacted: buckets before done_ms are final.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS telemetry_rollups (
+            tier TEXT PRIMARY KEY,
+            done_ms INTEGER NOT NULL
+        )
+        """
+    )
+
+
+@migration(9, "keep webhook outbox entries in each shard")
+def _outbox_per_shard(conn: sqlite3.Connection, shard: shards.Shard) -> None:
+    # Every file already has webhook_outbox from migration 2; event and outbox
+    # ids of an event shard start at its own range so they never collide with
+    # another shard's.
+    if not shard.id_base:
+        return
+    for table in ("interface4_events", "webhook_outbox"):
+        conn.execute(
+            "INSERT INTO sqlite_sequence (name, seq) SELECT ?, 0 "
+            "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)",
+            (table, table),
+        )
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (shard.id_base, table))
+
+
+@migration(10, "write-ahead log for every database file", transaction=False)
+def _write_ahead_log(conn: sqlite3.Connection, shard: shards.Shard) -> None:
+    # Writers to every shard look up event ids in all of them on each insert;
+    # in WAL mode those reads never wait for another file's commits.
+    conn.execute("PRAGMA journal_mode=WAL")
+
+
+@migration(11, "drop main database tables from event shards")
+def _drop_shard_extras(conn: sqlite3.Connection, shard: shards.Shard) -> None:
+    # Event shards used to run the whole chain and got empty copies of these;
+    # nothing ever writes them outside the main database.
+    if shard.name == shards.MAIN:
+        return
+    for table in (
+        "tasks",
+        "device_status_intervals",
+        "device_status_daily",
+        "telemetry_raw",
+        "telemetry_1m",
+        "telemetry_1h",
+        "telemetry_rollups",
+    ):
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    try:
+        row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] or 0
+
+
+@contextmanager
+def _file_lock(path: Path) -> Iterator[None]:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+        else:
+            handle.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _apply_pending(conn: sqlite3.Connection, shard: shards.Shard) -> List[Migration]:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+        """
+    )
+    conn.commit()
+    version = current_version(conn)
+    applied: List[Migration] = []
+    for step in MIGRATIONS:
+        if step.version <= version or not step.applies_to(shard):
+            continue
+        if not step.transaction:
+            step.apply(conn, shard)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if step.transaction:
+                step.apply(conn, shard)
+            conn.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                (step.version, step.description, db.isoformat(datetime.now(timezone.utc))),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(step)
+    return applied
+
+
+def migrate(*, seed_demo: bool = False) -> List[Migration]:
+    """Bring the main database and every event shard up to ``LATEST_VERSION``; cheap when they already are.
+
+    Returns the steps applied to the main database.
+    """
+    applied: List[Migration] = []
+    for shard in db.SHARDS.all:
+        steps = _migrate_file(shard)
+        if shard is db.SHARDS.main:
+            applied = steps
+    if seed_demo:
+        db.seed_events()
+        tasks.seed_demo()
+    return applied
+
+
+def _migrate_file(shard: shards.Shard) -> List[Migration]:
+    latest = max(step.version for step in MIGRATIONS if step.applies_to(shard))
+    with db.get_connection(path=shard.path) as conn:
+        if current_version(conn) >= latest:
+            return []
+    lock = ".migrate.lock" if shard is db.SHARDS.main else f".migrate.{shard.name}.lock"
+    with _file_lock(db.DB_DIR / lock):
+        with db.get_connection(path=shard.path) as conn:
+            # isolation_level=None lets each migration manage its own transaction.
+            conn.isolation_level = None
+            applied = _apply_pending(conn, shard)
+    return applied
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app migrate", description="Apply UNET SQLite schema migrations.")
+    parser.add_argument("--status", action="store_true", help="print the schema version and exit")
+    parser.add_argument("--seed-demo", action="store_true", help="insert demo events into an empty table")
+    args = parser.parse_args(argv)
+
+    if args.status:
+        for shard in db.SHARDS.all:
+            with db.get_connection(path=shard.path) as conn:
+                print(f"schema version {current_version(conn)} (latest {LATEST_VERSION}) at {shard.path}")
+        return 0
+    applied = migrate(seed_demo=args.seed_demo)
+    for step in applied:
+        print(f"applied {step.version:04d} {step.description}")
+    if not applied:
+        print(f"schema already at version {LATEST_VERSION}")
+    return 0
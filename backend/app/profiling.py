@@ -0,0 +1,260 @@
+"""On-demand sampling profiler and slow-request phase timings."""
+from __future__ import annotations
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import wraps
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Set, TypeVar
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger("unet.profiling")
+
+F = TypeVar("F", bound=Callable[..., object])
+
+SLOW_REQUEST_MS = float(os.environ.get("UNET_SLOW_REQUEST_MS", "500"))
+SLOW_REQUEST_HISTORY = 50
+MAX_STACK_DEPTH = 64
+# Leaf frames of threads that are parked, not working; sampling them is noise.
+IDLE_FRAMES = {"selectors:select", "threading:wait", "queue:get", "_worker:get"}
+
+
+@dataclass(eq=False)
+class RequestTrace:
+    method: str
+    path: str
+    started: float
+    profiled: bool = False
+    phases: Dict[str, float] = field(default_factory=dict)
+    threads: Set[int] = field(default_factory=set)
+    depth: int = 0
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("unet_request_trace", default=None)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Attribute the enclosed time to ``name`` on the current request, if any.
+
+    Nested phases are folded into the outermost one so nothing is counted twice.
+    """
+    trace = _current_trace.get()
+    if trace is None or trace.depth:
+        yield
+        return
+    if trace.profiled:
+        trace.threads.add(threading.get_ident())
+    trace.depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.depth -= 1
+        trace.phases[name] = trace.phases.get(name, 0.0) + time.perf_counter() - started
+
+
+def timed_phase(name: str) -> Callable[[F], F]:
+    def decorator(func: F) -> F:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def _frame_label(code) -> str:
+    return f"{Path(code.co_filename).stem}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """Samples thread stacks on an interval and aggregates them as collapsed stacks."""
+
+    def __init__(self) -> None:
+        self.running = False
+        self.route_prefix: Optional[str] = None
+        self.header: Optional[str] = None
+        self.interval = 0.005
+        self.started_at: Optional[str] = None
+        self.deadline = 0.0
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self._active: Set[RequestTrace] = set()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def filtered(self) -> bool:
+        return bool(self.route_prefix or self.header)
+
+    def start(
+        self,
+        *,
+        duration: float,
+        interval: float,
+        route_prefix: Optional[str] = None,
+        header: Optional[str] = None,
+    ) -> None:
+        self.stop()
+        self.route_prefix = route_prefix or None
+        self.header = header.lower() if header else None
+        self.interval = interval
+        self.started_at = datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
+        self.deadline = time.monotonic() + duration
+        self.samples = 0
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="unet-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=1.0)
+        self._thread = None
+        self.running = False
+
+    def matches(self, scope: Scope) -> bool:
+        if not self.running:
+            return False
+        if self.route_prefix and not scope["path"].startswith(self.route_prefix):
+            return False
+        if self.header and not Headers(scope=scope).get(self.header):
+            return False
+        return True
+
+    def attach(self, trace: RequestTrace) -> None:
+        trace.profiled = True
+        trace.threads.add(threading.get_ident())
+        self._active.add(trace)
+
+    def detach(self, trace: RequestTrace) -> None:
+        self._active.discard(trace)
+
+    def _target_threads(self) -> Optional[Set[int]]:
+        if not self.filtered:
+            return None
+        targets: Set[int] = set()
+        for trace in list(self._active):
+            targets.update(list(trace.threads))
+        return targets
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            if time.monotonic() >= self.deadline:
+                break
+            targets = self._target_threads()
+            if targets is not None and not targets:
+                continue
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or (targets is not None and thread_id not in targets):
+                    continue
+                labels: List[str] = []
+                while frame is not None and len(labels) < MAX_STACK_DEPTH:
+                    labels.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                if labels and labels[0] in IDLE_FRAMES:
+                    continue
+                self.stacks[";".join(reversed(labels))] += 1
+                self.samples += 1
+        self.running = False
+
+    def report(self, limit: int = 50) -> Dict[str, object]:
+        stacks = self.stacks.copy()
+        leaves: Counter = Counter()
+        for stack, count in stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return {
+            "running": self.running,
+            "startedAt": self.started_at,
+            "intervalMs": round(self.interval * 1000, 3),
+            "routePrefix": self.route_prefix,
+            "header": self.header,
+            "samples": self.samples,
+            "hotFunctions": [{"function": name, "samples": count} for name, count in leaves.most_common(limit)],
+            "stacks": [{"stack": stack, "samples": count} for stack, count in stacks.most_common(limit)],
+        }
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class SlowRequestLog:
+    def __init__(self, threshold_ms: float) -> None:
+        self.threshold_ms = threshold_ms
+        self.entries: Deque[Dict[str, object]] = deque(maxlen=SLOW_REQUEST_HISTORY)
+
+    def record(self, trace: RequestTrace, status_code: int, total: float) -> None:
+        total_ms = total * 1000
+        if total_ms < self.threshold_ms:
+            return
+        phases = {name: round(seconds * 1000, 3) for name, seconds in trace.phases.items()}
+        # Whatever is not auth or data access is model building and response encoding.
+        phases["serialization"] = round(max(0.0, total_ms - sum(phases.values())), 3)
+        entry = {
+            "method": trace.method,
+            "path": trace.path,
+            "status": status_code,
+            "totalMs": round(total_ms, 3),
+            "phasesMs": phases,
+            "recordedAt": datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z"),
+        }
+        self.entries.appendleft(entry)
+        logger.warning(
+            "slow request %s %s %.1fms %s",
+            trace.method,
+            trace.path,
+            total_ms,
+            " ".join(f"{name}={value:.1f}ms" for name, value in phases.items()),
+        )
+
+
+class ProfilingMiddleware:
+    """Opens a trace per API request, feeding the profiler and the slow-request log."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace(method=scope["method"], path=scope["path"], started=time.perf_counter())
+        if profiler.matches(scope):
+            profiler.attach(trace)
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        token = _current_trace.set(trace)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current_trace.reset(token)
+            profiler.detach(trace)
+            slow_requests.record(trace, status_code, time.perf_counter() - trace.started)
+
+
+profiler = SamplingProfiler()
+slow_requests = SlowRequestLog(SLOW_REQUEST_MS)
@@ -0,0 +1,116 @@
+"""Small LRU cache for query results, invalidated by a table write-version.
+
+Each entry remembers the write-version of the table it was read at; a lookup
+made after a write sees a newer version and misses, so results are never
+served across a write done by this process.  Writes by other processes are
+not visible to the version, which is what ``max_age`` bounds.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Tuple
+
+from . import metrics
+
+LOOKUPS = metrics.Counter(
+    "unet_query_cache_lookups", "Result cache lookups by outcome (hit, miss, stale, expired).", ("cache", "result")
+)
+EVICTIONS = metrics.Counter("unet_query_cache_evictions", "Entries dropped to stay within the size limit.", ("cache",))
+ENTRIES = metrics.Gauge("unet_query_cache_entries", "Entries currently held.", ("cache",))
+
+MISSING = object()
+
+
+class ResultCache:
+    """Thread-safe LRU keyed on normalised query parameters; values are shared, treat them as read-only."""
+
+    def __init__(self, name: str, *, max_entries: int = 256, max_age: float = 30.0) -> None:
+        self.name = name
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries: "OrderedDict[Hashable, Tuple[int, float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_age > 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def bump(self) -> None:
+        """Invalidate everything read before now; called after each committed write."""
+        with self._lock:
+            self._version += 1
+
+    def get(self, key: Hashable) -> object:
+        if not self.enabled:
+            return MISSING
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                result = "miss"
+            elif entry[0] != self._version:
+                result = "stale"
+                del self._entries[key]
+            elif now - entry[1] > self.max_age:
+                result = "expired"
+                del self._entries[key]
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                LOOKUPS.inc(1.0, self.name, "hit")
+                return entry[2]
+            self.misses += 1
+            size = len(self._entries)
+        LOOKUPS.inc(1.0, self.name, result)
+        ENTRIES.set(size, self.name)
+        return MISSING
+
+    def put(self, key: Hashable, version: int, value: object) -> None:
+        """Store ``value`` read at ``version`` unless a write has happened since."""
+        if not self.enabled:
+            return
+        evicted = 0
+        with self._lock:
+            if version != self._version:
+                return
+            self._entries[key] = (version, time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            size = len(self._entries)
+        if evicted:
+            EVICTIONS.inc(evicted, self.name)
+        ENTRIES.set(size, self.name)
+
+    def get_or_load(self, key: Hashable, load: Callable[[], object]) -> object:
+        value = self.get(key)
+        if value is MISSING:
+            version = self._version  # read before loading so a concurrent write discards the result
+            value = load()
+            self.put(key, version, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        ENTRIES.set(0, self.name)
+
+    def stats(self) -> Dict[str, object]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "version": self._version,
+        }
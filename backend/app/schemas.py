@@ -1,7 +1,7 @@
 """Pydantic models shared by the FastAPI routes."""
 from __future__ import annotations
 
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -54,6 +54,40 @@ class DeviceStatus(Schema):
     alarms: List[str]
 
 
+class DeviceUtilization(Schema):
+    deviceId: str
+    name: str
+    onlineSeconds: float
+    maintenanceSeconds: float
+    offlineSeconds: float
+    observedSeconds: float
+    utilization: float = Field(..., description="在线时长 / 有记录时长")
+
+
+class UtilizationReport(Schema):
+    start: str
+    end: str
+    items: List[DeviceUtilization]
+
+
+class TelemetryPoint(Schema):
+    at: str
+    samples: int
+    min: float
+    avg: float
+    max: float
+
+
+class TelemetryHistory(Schema):
+    deviceId: str
+    field: str
+    tier: str
+    resolutionSeconds: float
+    start: str
+    end: str
+    points: List[TelemetryPoint]
+
+
 class Task(Schema):
     taskId: str
     materialCode: str
@@ -80,6 +114,33 @@ class TaskCreateResponse(Task):
     pass
 
 
+class TaskListResponse(Schema):
+    items: List[Task]
+    total: int
+    page: int
+    pageSize: int
+
+
+class TaskBatchItem(Schema):
+    taskId: Optional[str] = Field(default=None, max_length=64, description="外部系统单号，缺省时自动生成")
+    materialCode: str = Field(..., min_length=1)
+    targetDevice: str = Field(..., min_length=1)
+    quantity: int = Field(..., gt=0)
+    priority: str = Field(default="medium", regex="^(low|medium|high)$")
+    scheduledAt: Optional[str] = None
+    source: Optional[str] = None
+
+
+class TaskBatchRequest(Schema):
+    source: str = Field(default="ERP", description="计划来源，单条未指定时使用")
+    tasks: List[TaskBatchItem] = Field(..., min_items=1, max_items=5000)
+
+
+class TaskBatchResponse(Schema):
+    imported: int
+    taskIds: List[str]
+
+
 class Alert(Schema):
     alertId: str
     deviceId: str
@@ -103,6 +164,20 @@ class IntegrationStatus(Schema):
     status: str
     latencyMs: int
     lastUpdated: str
+    deviceLatencyMs: Optional[Dict[str, int]] = None
+
+
+class WebhookSubscriberStatus(Schema):
+    name: str
+    url: str
+    pendingEvents: int
+    lagSeconds: float
+    deliveredEvents: int
+    consecutiveFailures: int
+    lastError: Optional[str]
+    lastLatencyMs: Optional[int]
+    lastDeliveredAt: Optional[str]
+    delivering: bool = Field(..., description="本进程是否持有投递租约；其他进程只写发件箱")
 
 
 class Interface4Event(Schema):
@@ -145,3 +220,48 @@ class Interface4EventListResponse(Schema):
     page: int
     pageSize: int
 
+
+class ProfilingStartRequest(Schema):
+    durationSeconds: float = Field(default=30.0, gt=0, le=600, description="采样时长（秒）")
+    intervalMs: float = Field(default=5.0, ge=1, le=1000, description="采样间隔（毫秒）")
+    routePrefix: Optional[str] = Field(default=None, description="仅采样匹配该路径前缀的请求")
+    header: Optional[str] = Field(default=None, description="仅采样携带该请求头的请求")
+
+
+class ProfiledFunction(Schema):
+    function: str
+    samples: int
+
+
+class ProfiledStack(Schema):
+    stack: str
+    samples: int
+
+
+class ProfilingReport(Schema):
+    running: bool
+    startedAt: Optional[str]
+    intervalMs: float
+    routePrefix: Optional[str]
+    header: Optional[str]
+    samples: int
+    hotFunctions: List[ProfiledFunction]
+    stacks: List[ProfiledStack]
+
+
+class SlowRequest(Schema):
+    method: str
+    path: str
+    status: int
+    totalMs: float
+    phasesMs: Dict[str, float]
+    recordedAt: str
+
+
+class SlowRequestLog(Schema):
+    thresholdMs: float
+    items: List[SlowRequest]
+
+
+class SlowRequestSettings(Schema):
+    thresholdMs: float = Field(..., ge=0, description="慢请求阈值（毫秒）")
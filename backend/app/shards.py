@@ -0,0 +1,99 @@
+"""Interface 4 event shards: one SQLite file, and so one writer lock, per line.
+
+Configured with a JSON file named by ``UNET_SHARDS_CONFIG``::
+
+    {"shards": [
+        {"name": "line1", "devices": ["Hopper0[1-3]", "干燥料斗 *"]},
+        {"name": "line2", "devices": ["Hopper0[4-9]"]}
+    ]}
+
+Events are routed by ``device_id`` against the fnmatch patterns, first match
+wins; events of other devices, or without one, stay in the main database
+file.  Every shard hands out row ids from its own range, so ``id`` stays
+unique across shards and ``(triggered_ms, id)`` still orders all events.
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import zlib
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+CONFIG_PATH = os.environ.get("UNET_SHARDS_CONFIG")
+
+MAIN = "main"
+# 2^20 ranges of 2^32 ids keep every id below 2^53, exact in JavaScript.
+ID_RANGE_BITS = 32
+_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def id_base(name: str) -> int:
+    """First row id of a shard; derived from the name so reordering the config is harmless."""
+    if name == MAIN:
+        return 0
+    return (zlib.crc32(name.encode("utf-8")) % 0xFFFFF + 1) << ID_RANGE_BITS
+
+
+@dataclass(frozen=True)
+class Shard:
+    name: str
+    path: Path
+    devices: Tuple[str, ...] = ()
+
+    @property
+    def id_base(self) -> int:
+        return id_base(self.name)
+
+    def matches(self, device_id: str) -> bool:
+        return any(fnmatchcase(device_id, pattern) for pattern in self.devices)
+
+
+class ShardMap:
+    """The main shard plus the configured ones, with memoised device routing."""
+
+    def __init__(self, main: Shard, shards: Sequence[Shard] = ()) -> None:
+        bases: Dict[int, str] = {}
+        for shard in shards:
+            if shard.name == MAIN or not _NAME.match(shard.name):
+                raise ValueError(f"invalid shard name: {shard.name!r}")
+            if shard.id_base in bases:
+                raise ValueError(f"shards {bases[shard.id_base]!r} and {shard.name!r} share an id range; rename one")
+            bases[shard.id_base] = shard.name
+        self.main = main
+        self.all: Tuple[Shard, ...] = (main, *shards)
+        self._routes: Dict[Optional[str], Shard] = {}
+
+    def route(self, device_id: Optional[str]) -> Shard:
+        shard = self._routes.get(device_id)
+        if shard is None:
+            shard = next((item for item in self.all[1:] if device_id and item.matches(device_id)), self.main)
+            self._routes[device_id] = shard
+        return shard
+
+    def group(self, items: Sequence[Dict[str, object]]) -> List[Tuple[Shard, List[Dict[str, object]]]]:
+        """Split records by the shard of their ``device_id``, keeping their order within each shard."""
+        groups: Dict[str, Tuple[Shard, List[Dict[str, object]]]] = {}
+        for item in items:
+            shard = self.route(item.get("device_id"))  # type: ignore[arg-type]
+            groups.setdefault(shard.name, (shard, []))[1].append(item)
+        return list(groups.values())
+
+
+def load(main_path: Path, config_path: Optional[str] = CONFIG_PATH) -> ShardMap:
+    main = Shard(MAIN, main_path)
+    if not config_path:
+        return ShardMap(main)
+    raw = json.loads(Path(config_path).read_text(encoding="utf-8"))
+    shards = [
+        Shard(
+            name=str(item["name"]),
+            path=main_path.with_name(f"{main_path.stem}.{item['name']}{main_path.suffix}"),
+            devices=tuple(str(pattern) for pattern in item.get("devices") or ()),
+        )
+        for item in raw.get("shards") or ()
+    ]
+    return ShardMap(main, shards)
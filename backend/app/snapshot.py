@@ -0,0 +1,206 @@
+"""Periodic snapshots of the in-memory live state for warm restarts.
+
+Devices, alerts, audit entries, integrations, dashboard counters and the
+alarm engine's raised alarms live in ``data`` and would otherwise fall back to
+the seeded demo values on every restart.  ``StateSnapshots`` writes them to
+``state.snapshot`` in the data directory every ``UNET_SNAPSHOT_INTERVAL``
+seconds (default 5, ``0`` disables snapshots) and once more on shutdown, and
+loads the file back before the services start.
+
+The file is a short header followed by a :mod:`marshal` payload::
+
+    b"UNETSNAP" | format version (u16) | marshal version (u16) | CRC-32 (u32) | payload
+
+It is written to a temporary file, fsynced and renamed over the previous
+snapshot, so a crash mid-write leaves the last complete one.  A file that is
+truncated, fails its checksum or was written by another format or marshal
+version is ignored and the seeded state is kept.  Tasks are stored in SQLite
+and are not part of the snapshot.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import marshal
+import os
+import struct
+import tempfile
+import time
+import zlib
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Optional
+
+from . import data, db, metrics
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .alarms import AlarmEngine
+
+logger = logging.getLogger("unet.snapshot")
+
+INTERVAL = float(os.environ.get("UNET_SNAPSHOT_INTERVAL", "5"))
+PATH = db.DB_DIR / "state.snapshot"
+
+MAGIC = b"UNETSNAP"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct(">8sHHI")
+
+SAVE_SECONDS = metrics.Histogram("unet_snapshot_save_seconds", "Duration of one state snapshot write.")
+SNAPSHOT_BYTES = metrics.Gauge("unet_snapshot_bytes", "Size of the last state snapshot written.")
+
+
+def capture(alarm_engine: Optional["AlarmEngine"] = None) -> Dict[str, object]:
+    """The live state as plain lists and dicts."""
+    return {
+        "savedAt": db.now_ms(),
+        "dashboard": data.DASHBOARD_STATE,
+        "materials": data.MATERIAL_SUMMARY,
+        "devices": data.DEVICES,
+        "unreachable": sorted(data.UNREACHABLE),
+        "alerts": data.ALERTS,
+        "audits": data.AUDIT_LOGS,
+        "integrations": data.INTEGRATIONS,
+        "alarms": alarm_engine.state() if alarm_engine is not None else None,
+    }
+
+
+def encode(state: Dict[str, object]) -> bytes:
+    # marshal.dumps runs without releasing the GIL, so request threads cannot
+    # mutate the state halfway through the copy.
+    payload = marshal.dumps(state)
+    return _HEADER.pack(MAGIC, FORMAT_VERSION, marshal.version, zlib.crc32(payload)) + payload
+
+
+def decode(blob: bytes) -> Dict[str, object]:
+    """The state stored in ``blob``; raises ValueError when it is not a usable snapshot."""
+    if len(blob) < _HEADER.size:
+        raise ValueError("snapshot is truncated")
+    magic, version, marshal_version, checksum = _HEADER.unpack_from(blob)
+    if magic != MAGIC or version != FORMAT_VERSION or marshal_version != marshal.version:
+        raise ValueError("snapshot has an unknown format")
+    payload = memoryview(blob)[_HEADER.size :]
+    if zlib.crc32(payload) != checksum:
+        raise ValueError("snapshot checksum mismatch")
+    state = marshal.loads(payload)
+    if not isinstance(state, dict):
+        raise ValueError("snapshot payload is not a mapping")
+    return state
+
+
+def restore(state: Dict[str, object], alarm_engine: Optional["AlarmEngine"] = None) -> None:
+    """Replace the live state in place; other modules keep references to these objects.
+
+    Every section is read first, so a snapshot with a missing or malformed
+    one raises (KeyError, TypeError, ValueError) before anything is replaced.
+    """
+    dashboard = dict(state["dashboard"])
+    materials = list(state["materials"])
+    devices = list(state["devices"])
+    unreachable = set(state["unreachable"])
+    alerts = list(state["alerts"])
+    audits = list(state["audits"])
+    integrations = list(state["integrations"])
+    alarms = None
+    if alarm_engine is not None and state.get("alarms"):
+        raw = state["alarms"]
+        alarms = {
+            "sequence": int(raw.get("sequence", 0)),
+            "raised": [(str(device_id), str(key), str(alert_id)) for device_id, key, alert_id in raw["raised"]],
+        }
+
+    data.DASHBOARD_STATE.clear()
+    data.DASHBOARD_STATE.update(dashboard)
+    data.MATERIAL_SUMMARY[:] = materials
+    data.DEVICES[:] = devices
+    data.UNREACHABLE.clear()
+    data.UNREACHABLE.update(unreachable)
+    data.ALERTS[:] = alerts
+    data.AUDIT_LOGS[:] = audits
+    data.INTEGRATIONS[:] = integrations
+    if alarms is not None:
+        alarm_engine.restore(alarms)
+
+
+def write_atomic(path: Path, blob: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # A temporary file of its own, so several workers never write into each other's.
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.name + ".", suffix=".tmp", delete=False) as handle:
+        try:
+            handle.write(blob)
+            handle.flush()
+            os.fsync(handle.fileno())
+        except BaseException:
+            handle.close()
+            os.unlink(handle.name)
+            raise
+    try:
+        os.replace(handle.name, path)
+    except BaseException:
+        os.unlink(handle.name)
+        raise
+
+
+class StateSnapshots:
+    """Loads the last snapshot at startup and keeps writing new ones."""
+
+    def __init__(self, path: Path, interval: float, alarm_engine: Optional["AlarmEngine"] = None) -> None:
+        self.path = path
+        self.interval = interval
+        self.alarm_engine = alarm_engine
+        self._stopped = asyncio.Event()
+
+    @classmethod
+    def from_env(cls, alarm_engine: Optional["AlarmEngine"] = None) -> Optional["StateSnapshots"]:
+        if INTERVAL <= 0:
+            return None
+        return cls(PATH, INTERVAL, alarm_engine)
+
+    def load(self) -> bool:
+        """Restore the last snapshot; returns False when there is none or it is unusable."""
+        started = time.perf_counter()
+        try:
+            state = decode(self.path.read_bytes())
+            restore(state, self.alarm_engine)
+        except FileNotFoundError:
+            return False
+        except (ValueError, EOFError, TypeError, KeyError) as exc:
+            logger.warning("ignoring unusable state snapshot %s: %s", self.path, exc)
+            return False
+        logger.info(
+            "restored state snapshot from %s (%.0f s old) in %.1f ms",
+            db.format_ms(int(state["savedAt"])),
+            (db.now_ms() - int(state["savedAt"])) / 1000,
+            (time.perf_counter() - started) * 1000,
+        )
+        return True
+
+    def save(self) -> int:
+        """Write a snapshot now; returns its size in bytes."""
+        started = time.perf_counter()
+        blob = encode(capture(self.alarm_engine))
+        write_atomic(self.path, blob)
+        SAVE_SECONDS.observe(time.perf_counter() - started)
+        SNAPSHOT_BYTES.set(len(blob))
+        return len(blob)
+
+    async def _save(self) -> None:
+        # Encode on the loop thread, write and fsync off it.
+        started = time.perf_counter()
+        blob = encode(capture(self.alarm_engine))
+        await asyncio.to_thread(write_atomic, self.path, blob)
+        SAVE_SECONDS.observe(time.perf_counter() - started)
+        SNAPSHOT_BYTES.set(len(blob))
+
+    async def run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self._save()
+            except (OSError, ValueError):
+                logger.warning("state snapshot failed", exc_info=True)
+
+    async def close(self) -> None:
+        """Stop the loop; ``run`` writes one final snapshot on its way out."""
+        self._stopped.set()
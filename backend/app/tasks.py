@@ -0,0 +1,260 @@
+"""SQLite-backed replenishment task store.
+
+Tasks live in the ``tasks`` table of the main database with timestamps as
+epoch milliseconds, indexed for the lookups the API and the dashboard make:
+by task id, by status, by target device and by scheduled time.  Rows come
+back as the camelCase dicts the ``schemas.Task`` model expects.
+"""
+from __future__ import annotations
+
+import sqlite3
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from . import db
+
+PRIORITIES = ("low", "medium", "high")
+ACTIVE_STATUSES = ("queued", "in_progress")
+
+# API field -> column; timestamps are converted separately.
+_COLUMNS = {
+    "taskId": "task_id",
+    "materialCode": "material_code",
+    "targetDevice": "target_device",
+    "quantity": "quantity",
+    "priority": "priority",
+    "status": "status",
+    "progress": "progress",
+    "scheduledAt": "scheduled_ms",
+    "updatedAt": "updated_ms",
+    "source": "source",
+}
+_SELECT = f"SELECT {', '.join(_COLUMNS.values())} FROM tasks"
+_INSERT_SQL = f"""
+    INSERT INTO tasks ({', '.join(_COLUMNS.values())})
+    VALUES ({', '.join(':' + column for column in _COLUMNS.values())})
+"""
+
+DEMO_TASKS: List[Dict[str, object]] = [
+    {
+        "taskId": "T20231018001",
+        "materialCode": "PA66",
+        "targetDevice": "Hopper01",
+        "quantity": 520,
+        "priority": "high",
+        "status": "in_progress",
+        "progress": 68,
+        "scheduledAt": "2023-10-18T08:15:00Z",
+        "source": "ERP",
+    },
+    {
+        "taskId": "T20231018002",
+        "materialCode": "ABS-UV",
+        "targetDevice": "Hopper03",
+        "quantity": 430,
+        "priority": "medium",
+        "status": "queued",
+        "progress": 0,
+        "scheduledAt": "2023-10-18T09:00:00Z",
+        "source": "MES",
+    },
+    {
+        "taskId": "T20231018003",
+        "materialCode": "PC+GF",
+        "targetDevice": "Hopper05",
+        "quantity": 610,
+        "priority": "high",
+        "status": "in_progress",
+        "progress": 42,
+        "scheduledAt": "2023-10-18T09:30:00Z",
+        "source": "ERP",
+    },
+    {
+        "taskId": "T20231018004",
+        "materialCode": "TPU",
+        "targetDevice": "Hopper07",
+        "quantity": 360,
+        "priority": "low",
+        "status": "completed",
+        "progress": 100,
+        "scheduledAt": "2023-10-18T07:45:00Z",
+        "source": "Local",
+    },
+    {
+        "taskId": "T20231018005",
+        "materialCode": "PA66",
+        "targetDevice": "Vacuum01",
+        "quantity": 720,
+        "priority": "high",
+        "status": "in_progress",
+        "progress": 25,
+        "scheduledAt": "2023-10-18T10:00:00Z",
+        "source": "ERP",
+    },
+]
+
+
+class TaskConflictError(ValueError):
+    """Raised when a plan carries task ids that are already stored."""
+
+    def __init__(self, task_ids: Sequence[str]) -> None:
+        super().__init__(f"task ids already exist: {', '.join(task_ids)}")
+        self.task_ids = list(task_ids)
+
+
+def _task(row: sqlite3.Row) -> Dict[str, object]:
+    task = {name: row[column] for name, column in _COLUMNS.items()}
+    task["scheduledAt"] = db.format_ms(row["scheduled_ms"])
+    task["updatedAt"] = db.format_ms(row["updated_ms"])
+    return task
+
+
+def _params(task: Dict[str, object]) -> Dict[str, object]:
+    params = {column: task.get(name) for name, column in _COLUMNS.items()}
+    params["scheduled_ms"] = db.to_ms(str(task["scheduledAt"]))
+    params["updated_ms"] = db.to_ms(str(task["updatedAt"]))
+    return params
+
+
+def normalize(payload: Dict[str, object], *, source: str, now: str) -> Dict[str, object]:
+    """A queued task from a create/import payload; raises ValueError for an unusable ``scheduledAt``."""
+    scheduled = payload.get("scheduledAt") or now
+    return {
+        "taskId": payload.get("taskId") or None,
+        "materialCode": payload.get("materialCode") or "",
+        "targetDevice": payload.get("targetDevice") or "",
+        "quantity": int(payload.get("quantity") or 0),
+        "priority": payload.get("priority") or "medium",
+        "status": "queued",
+        "progress": 0,
+        "scheduledAt": db.ensure_iso(str(scheduled)),
+        "updatedAt": now,
+        "source": payload.get("source") or source,
+    }
+
+
+def _next_ids(conn: sqlite3.Connection, count: int) -> List[str]:
+    # T<yyyymmdd><sequence>: continue after today's highest stored sequence.
+    prefix = f"T{datetime.now(timezone.utc):%Y%m%d}"
+    highest = conn.execute(
+        "SELECT MAX(CAST(substr(task_id, ?) AS INTEGER)) FROM tasks WHERE task_id > ? AND task_id < ?",
+        (len(prefix) + 1, prefix, prefix + ":"),
+    ).fetchone()[0]
+    start = (highest or 0) + 1
+    return [f"{prefix}{sequence:03d}" for sequence in range(start, start + count)]
+
+
+@db.instrumented
+def insert(items: List[Dict[str, object]], *, skip_existing: bool = False) -> List[Dict[str, object]]:
+    """Store normalised tasks in one transaction and return those stored.
+
+    Tasks without an id get the next ``T<date><seq>`` ids.  Ids that are
+    already stored either raise :class:`TaskConflictError` with nothing
+    written, or with ``skip_existing`` are left out, as are all but the last
+    of ids repeated within ``items``.
+    """
+    if not items:
+        return []
+    with db.get_connection() as conn:
+        # IMMEDIATE takes the write lock up front so id allocation and the
+        # conflict check see the same table as the insert.
+        conn.execute("BEGIN IMMEDIATE")
+        given = [str(item["taskId"]) for item in items if item.get("taskId")]
+        existing = set()
+        for start in range(0, len(given), 500):
+            chunk = given[start : start + 500]
+            marks = ", ".join("?" for _ in chunk)
+            existing.update(row[0] for row in conn.execute(f"SELECT task_id FROM tasks WHERE task_id IN ({marks})", chunk))
+        if existing and not skip_existing:
+            conn.rollback()
+            raise TaskConflictError(sorted(existing))
+        stored = [item for item in items if item.get("taskId") not in existing]
+        if skip_existing:
+            # One poll can carry a task id twice; the last occurrence is the newest.
+            last = {item["taskId"]: index for index, item in enumerate(stored) if item.get("taskId")}
+            stored = [item for index, item in enumerate(stored) if not item.get("taskId") or last[item["taskId"]] == index]
+        missing = [item for item in stored if not item.get("taskId")]
+        for item, task_id in zip(missing, _next_ids(conn, len(missing))):
+            item["taskId"] = task_id
+        conn.executemany(_INSERT_SQL, [_params(item) for item in stored])
+        conn.commit()
+    return stored
+
+
+@db.instrumented
+def query(
+    *,
+    status: Optional[str] = None,
+    target_device: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    page: int = 1,
+    page_size: int = 30,
+) -> Dict[str, object]:
+    """One page of tasks, latest scheduled first, plus the total matching the filters."""
+    clauses = []
+    params: List[object] = []
+    if status:
+        clauses.append("status = ?")
+        params.append(status)
+    if target_device:
+        clauses.append("target_device = ?")
+        params.append(target_device)
+    if start:
+        clauses.append("scheduled_ms >= ?")
+        params.append(db.to_ms(start))
+    if end:
+        clauses.append("scheduled_ms <= ?")
+        params.append(db.to_ms(end, end_of_day=True))
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    with db.get_connection() as conn:
+        total = conn.execute(f"SELECT COUNT(*) FROM tasks {where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"{_SELECT} {where} ORDER BY scheduled_ms DESC, task_id DESC LIMIT ? OFFSET ?",
+            (*params, page_size, max(page - 1, 0) * page_size),
+        ).fetchall()
+    return {"items": [_task(row) for row in rows], "total": total, "page": page, "pageSize": page_size}
+
+
+@db.instrumented
+def active(limit: int) -> List[Dict[str, object]]:
+    """Queued and running tasks in scheduled order, the ones the line works on next."""
+    marks = ", ".join("?" for _ in ACTIVE_STATUSES)
+    with db.get_connection() as conn:
+        rows = conn.execute(
+            f"{_SELECT} WHERE status IN ({marks}) ORDER BY scheduled_ms, task_id LIMIT ?",
+            (*ACTIVE_STATUSES, limit),
+        ).fetchall()
+    return [_task(row) for row in rows]
+
+
+@db.instrumented
+def save_progress(items: Iterable[Dict[str, object]]) -> int:
+    rows = [(item["status"], item["progress"], db.to_ms(str(item["updatedAt"])), item["taskId"]) for item in items]
+    if not rows:
+        return 0
+    with db.get_connection() as conn:
+        conn.executemany("UPDATE tasks SET status = ?, progress = ?, updated_ms = ? WHERE task_id = ?", rows)
+        conn.commit()
+    return len(rows)
+
+
+@db.instrumented
+def counts(completed_since_ms: int) -> Tuple[int, int]:
+    """(active tasks, tasks completed since the given time); both served by idx_tasks_status."""
+    marks = ", ".join("?" for _ in ACTIVE_STATUSES)
+    with db.get_connection() as conn:
+        running = conn.execute(f"SELECT COUNT(*) FROM tasks WHERE status IN ({marks})", ACTIVE_STATUSES).fetchone()[0]
+        completed = conn.execute(
+            "SELECT COUNT(*) FROM tasks WHERE status = 'completed' AND updated_ms >= ?", (completed_since_ms,)
+        ).fetchone()[0]
+    return running, completed
+
+
+def seed_demo() -> None:
+    """Insert the demo tasks into an empty table."""
+    with db.get_connection() as conn:
+        if conn.execute("SELECT 1 FROM tasks LIMIT 1").fetchone():
+            return
+    now = db.format_ms(db.now_ms() // 1000 * 1000)
+    insert([{**task, "updatedAt": now} for task in DEMO_TASKS], skip_existing=True)
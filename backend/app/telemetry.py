@@ -0,0 +1,414 @@
+"""Device telemetry history in three tiers with automatic downsampling.
+
+Every acquisition pass (a simulator tick or a Modbus cycle) takes one sample of
+temperature, level and throughput from each device that reported since the
+last pass.  ``TelemetryStore`` buffers them in memory and writes each cycle's
+samples to ``telemetry_raw`` in one transaction every ``flushInterval``
+seconds.  Every ``compactInterval`` seconds it rolls finished minutes of raw
+samples into ``telemetry_1m`` and finished hours of those into
+``telemetry_1h`` (min, sample-weighted average and max per field), then
+deletes whatever has passed its tier's retention, but never rows the next tier
+has not taken in yet.  ``telemetry_rollups`` records up to where each tier is
+complete, so a pass only reads rows that arrived since the previous one.
+
+Each table is therefore bounded by its retention rather than by how long the
+plant has been running: by default a device keeps two days of raw samples,
+30 days of minutes and five years of hours.  :func:`history` answers a trend
+query from the coarsest tier whose step still meets the requested resolution
+and that reaches back to the start of the window, filling the part that tier
+has not been compacted up to yet from the tier below.
+
+The file named by ``UNET_TELEMETRY_CONFIG`` may override the defaults::
+
+    {"flushInterval": 5, "compactInterval": 60, "retentionDays": {"raw": 2, "minute": 30, "hour": 1825}}
+
+``"enabled": false`` stops recording; stored history stays queryable.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from . import data, db, metrics
+
+logger = logging.getLogger("unet.telemetry")
+
+CONFIG_PATH = os.environ.get("UNET_TELEMETRY_CONFIG")
+
+FIELDS = ("temperature", "level", "throughput")
+DEFAULT_RETENTION_DAYS = {"raw": 2.0, "minute": 30.0, "hour": 1825.0}
+# A query returns at most this many points; without a resolution it aims for DEFAULT_POINTS.
+MAX_POINTS = 5000
+DEFAULT_POINTS = 500
+# Samples kept in memory while SQLite is unavailable; the oldest are dropped beyond this.
+MAX_BUFFERED = 200_000
+
+SAMPLES = metrics.Counter("unet_telemetry_samples", "Raw telemetry samples written.")
+FLUSH_SECONDS = metrics.Histogram("unet_telemetry_flush_seconds", "Duration of one telemetry batch write.")
+COMPACT_SECONDS = metrics.Histogram("unet_telemetry_compact_seconds", "Duration of one telemetry compaction pass.")
+QUERIES = metrics.Counter("unet_telemetry_queries", "Telemetry history queries by the tier that answered.", ("tier",))
+
+# (deviceId, epoch ms, temperature, level, throughput)
+Sample = Tuple[str, int, Optional[float], Optional[float], Optional[float]]
+# (epoch ms, samples, min, avg, max)
+Point = Tuple[int, int, float, float, float]
+
+
+@dataclass(frozen=True)
+class Tier:
+    name: str
+    table: str
+    time_column: str
+    step_ms: int
+    retention_ms: int
+
+
+@dataclass
+class TelemetryConfig:
+    enabled: bool = True
+    flush_interval: float = 5.0
+    compact_interval: float = 60.0
+    retention_days: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_RETENTION_DAYS))
+
+    @classmethod
+    def from_dict(cls, raw: Dict[str, object]) -> "TelemetryConfig":
+        retention = dict(DEFAULT_RETENTION_DAYS)
+        retention.update({str(key): float(value) for key, value in (raw.get("retentionDays") or {}).items()})
+        if set(retention) != set(DEFAULT_RETENTION_DAYS) or min(retention.values()) <= 0:
+            raise ValueError("retentionDays takes positive raw, minute and hour values")
+        return cls(
+            enabled=bool(raw.get("enabled", True)),
+            flush_interval=float(raw.get("flushInterval", 5.0)),
+            compact_interval=float(raw.get("compactInterval", 60.0)),
+            retention_days=retention,
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "TelemetryConfig":
+        return cls.from_dict(json.loads(Path(path).read_text(encoding="utf-8")))
+
+    def tiers(self) -> Tuple[Tier, ...]:
+        """Finest first; raw samples nominally arrive once per flush interval."""
+        days = {name: int(value * db.DAY_MS) for name, value in self.retention_days.items()}
+        return (
+            Tier("raw", "telemetry_raw", "sampled_ms", max(int(self.flush_interval * 1000), 1000), days["raw"]),
+            Tier("minute", "telemetry_1m", "bucket_ms", 60_000, days["minute"]),
+            Tier("hour", "telemetry_1h", "bucket_ms", 3_600_000, days["hour"]),
+        )
+
+
+@lru_cache(maxsize=1)
+def config() -> TelemetryConfig:
+    return TelemetryConfig.load(Path(CONFIG_PATH)) if CONFIG_PATH else TelemetryConfig()
+
+
+def _number(value: object) -> Optional[float]:
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+@db.instrumented
+def write_samples(samples: Sequence[Sample]) -> int:
+    """Store one batch of raw samples in a single transaction."""
+    with db.get_connection(check_same_thread=False) as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO telemetry_raw (device_id, sampled_ms, temperature, level, throughput) "
+            "VALUES (?, ?, ?, ?, ?)",
+            samples,
+        )
+        conn.commit()
+    return len(samples)
+
+
+def _rollup_sql(source: Tier, target: Tier) -> str:
+    if source.time_column == "sampled_ms":
+        count = "COUNT(*)"
+        aggregates = ", ".join(f"MIN({name}), AVG({name}), MAX({name})" for name in FIELDS)
+    else:
+        count = "SUM(samples)"
+        # Weight each average only by the minutes in which the field had a value.
+        aggregates = ", ".join(
+            f"MIN({name}_min), SUM({name}_avg * samples) / SUM(CASE WHEN {name}_avg IS NOT NULL THEN samples END), "
+            f"MAX({name}_max)"
+            for name in FIELDS
+        )
+    return f"""
+        INSERT OR REPLACE INTO {target.table}
+        SELECT device_id, {source.time_column} / {target.step_ms} * {target.step_ms}, {count}, {aggregates}
+        FROM {source.table}
+        WHERE device_id = ? AND {source.time_column} >= ? AND {source.time_column} < ?
+        GROUP BY 2
+    """
+
+
+def _device_ids(conn: sqlite3.Connection, tier: Tier) -> List[str]:
+    # Skip from one device to the next through the primary key instead of
+    # reading every row for DISTINCT.
+    rows = conn.execute(
+        f"""
+        WITH RECURSIVE ids(device_id) AS (
+            SELECT MIN(device_id) FROM {tier.table}
+            UNION ALL
+            SELECT (SELECT MIN(device_id) FROM {tier.table} WHERE device_id > ids.device_id)
+            FROM ids WHERE ids.device_id IS NOT NULL
+        )
+        SELECT device_id FROM ids WHERE device_id IS NOT NULL
+        """
+    )
+    return [row[0] for row in rows]
+
+
+def _watermarks(conn: sqlite3.Connection) -> Dict[str, int]:
+    return {row[0]: row[1] for row in conn.execute("SELECT tier, done_ms FROM telemetry_rollups")}
+
+
+@db.instrumented
+def compact(tiers: Sequence[Tier], *, now_ms: Optional[int] = None, grace_ms: int = 0) -> Dict[str, int]:
+    """Roll finished buckets into the coarser tiers and expire old rows; returns rows changed per tier.
+
+    Raw samples younger than ``grace_ms`` may still be waiting to be flushed,
+    so the minute they fall into is left for the next pass.
+    """
+    now = db.now_ms() if now_ms is None else now_ms
+    changed: Dict[str, int] = {tier.name: 0 for tier in tiers}
+    with db.get_connection(check_same_thread=False) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        done = _watermarks(conn)
+        ready = now - grace_ms  # the source tier is complete up to here
+        for source, target in zip(tiers, tiers[1:]):
+            since = done.get(target.name, 0)
+            until = ready // target.step_ms * target.step_ms
+            if until > since:
+                sql = _rollup_sql(source, target)
+                for device_id in _device_ids(conn, source):
+                    changed[target.name] += conn.execute(sql, (device_id, since, until)).rowcount
+                conn.execute("INSERT OR REPLACE INTO telemetry_rollups (tier, done_ms) VALUES (?, ?)", (target.name, until))
+                done[target.name] = until
+            # The next tier may only take buckets this one has finished.
+            ready = done.get(target.name, 0)
+        for index, tier in enumerate(tiers):
+            cutoff = now - tier.retention_ms
+            if index + 1 < len(tiers):
+                cutoff = min(cutoff, done.get(tiers[index + 1].name, 0))
+            sql = f"DELETE FROM {tier.table} WHERE device_id = ? AND {tier.time_column} < ?"
+            for device_id in _device_ids(conn, tier):
+                changed[tier.name] += conn.execute(sql, (device_id, cutoff)).rowcount
+        conn.commit()
+    return changed
+
+
+def pick_tier(tiers: Sequence[Tier], start_ms: int, resolution_ms: int, now_ms: int) -> int:
+    """Index of the coarsest tier no coarser than ``resolution_ms`` that still holds ``start_ms``."""
+    index = 0
+    for position, tier in enumerate(tiers):
+        if tier.step_ms <= resolution_ms:
+            index = position
+    while index + 1 < len(tiers) and start_ms < now_ms - tiers[index].retention_ms:
+        index += 1
+    return index
+
+
+def _rebucket(points: Iterable[Point], step_ms: int) -> List[Point]:
+    """Merge ascending points into ``step_ms`` buckets, weighting averages by samples."""
+    merged: Dict[int, List[float]] = {}
+    for at, samples, low, avg, high in points:
+        bucket = at // step_ms * step_ms
+        current = merged.get(bucket)
+        if current is None:
+            merged[bucket] = [samples, low, avg * samples, high]
+        else:
+            current[0] += samples
+            current[1] = min(current[1], low)
+            current[2] += avg * samples
+            current[3] = max(current[3], high)
+    return [(at, int(n), low, total / n, high) for at, (n, low, total, high) in merged.items()]
+
+
+def _points(
+    conn: sqlite3.Connection,
+    tiers: Sequence[Tier],
+    index: int,
+    done: Dict[str, int],
+    device_id: str,
+    name: str,
+    start_ms: int,
+    end_ms: int,
+) -> List[Point]:
+    tier = tiers[index]
+    if index == 0:
+        return conn.execute(
+            f"""
+            SELECT sampled_ms, 1, {name}, {name}, {name} FROM telemetry_raw
+            WHERE device_id = ? AND sampled_ms >= ? AND sampled_ms < ? AND {name} IS NOT NULL
+            ORDER BY sampled_ms
+            """,
+            (device_id, start_ms, end_ms),
+        ).fetchall()
+    complete = done.get(tier.name, 0)
+    # Buckets overlapping the window, up to where the tier is complete.
+    points = conn.execute(
+        f"""
+        SELECT bucket_ms, samples, {name}_min, {name}_avg, {name}_max FROM {tier.table}
+        WHERE device_id = ? AND bucket_ms > ? AND bucket_ms < ? AND {name}_avg IS NOT NULL
+        ORDER BY bucket_ms
+        """,
+        (device_id, start_ms - tier.step_ms, min(end_ms, complete)),
+    ).fetchall()
+    if end_ms > complete:
+        recent = _points(conn, tiers, index - 1, done, device_id, name, max(start_ms, complete), end_ms)
+        points.extend(_rebucket(recent, tier.step_ms))
+    return points
+
+
+def parse_window(start: Optional[str], end: Optional[str], *, now_ms: Optional[int] = None) -> Tuple[int, int]:
+    """Epoch ms bounds for ISO/date strings; defaults to the last 24 hours.
+
+    A bare end date includes that whole day.
+    """
+    now = db.now_ms() if now_ms is None else now_ms
+    hi = (db.to_ms(end, end_of_day=True) + 1 if len(end.strip()) == 10 else db.to_ms(end)) if end else now
+    lo = db.to_ms(start) if start else hi - db.DAY_MS
+    if hi <= lo:
+        raise ValueError("end must be after start")
+    return lo, hi
+
+
+@db.instrumented
+def history(
+    device_id: str,
+    name: str,
+    start_ms: int,
+    end_ms: int,
+    resolution_ms: Optional[int] = None,
+    *,
+    now_ms: Optional[int] = None,
+    tiers: Optional[Sequence[Tier]] = None,
+) -> Dict[str, object]:
+    """Min/avg/max of one field per ``resolution_ms`` bucket in ``[start_ms, end_ms)``.
+
+    Without a resolution the window is split into about ``DEFAULT_POINTS``
+    buckets; raises ValueError for an unknown field or more than
+    ``MAX_POINTS`` buckets.
+    """
+    if name not in FIELDS:
+        raise ValueError(f"unknown telemetry field {name!r}")
+    tiers = tiers or config().tiers()
+    span = end_ms - start_ms
+    if resolution_ms is None:
+        resolution_ms = max(span // DEFAULT_POINTS, tiers[0].step_ms)
+    if resolution_ms <= 0 or span > resolution_ms * MAX_POINTS:
+        raise ValueError("resolution too fine for the window")
+    index = pick_tier(tiers, start_ms, resolution_ms, db.now_ms() if now_ms is None else now_ms)
+    with db.get_connection() as conn:
+        conn.row_factory = None
+        points = _points(conn, tiers, index, _watermarks(conn), device_id, name, start_ms, end_ms)
+    if index == 0 or resolution_ms > tiers[index].step_ms:
+        points = _rebucket(points, resolution_ms)
+    QUERIES.inc(1, tiers[index].name)
+    return {
+        "deviceId": device_id,
+        "field": name,
+        "tier": tiers[index].name,
+        "resolutionSeconds": resolution_ms / 1000,
+        "start": db.format_ms(start_ms),
+        "end": db.format_ms(end_ms),
+        "points": [
+            {"at": db.format_ms(at), "samples": samples, "min": low, "avg": round(avg, 3), "max": high}
+            for at, samples, low, avg, high in points
+        ],
+    }
+
+
+class TelemetryStore:
+    """Samples ``data.DEVICES`` after each acquisition pass and keeps the tiers up to date."""
+
+    def __init__(self, config: TelemetryConfig) -> None:
+        self.config = config
+        self.tiers = config.tiers()
+        self._buffer: List[Sample] = []
+        self._heartbeats: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self._compacted_at = 0.0
+        self._stopped = asyncio.Event()
+
+    @classmethod
+    def from_env(cls) -> Optional["TelemetryStore"]:
+        settings = config()
+        return cls(settings) if settings.enabled else None
+
+    def __call__(self) -> None:
+        # Runs inside simulate_tick and the Modbus poller; it only copies values.
+        self.sample(data.DEVICES)
+
+    def sample(self, devices: Iterable[Dict[str, object]], at_ms: Optional[int] = None) -> int:
+        """Buffer a sample of every device whose heartbeat moved since the last one."""
+        at = db.now_ms() if at_ms is None else at_ms
+        taken = 0
+        with self._lock:
+            for device in devices:
+                device_id = str(device["deviceId"])
+                heartbeat = device.get("lastHeartbeat")
+                if heartbeat == self._heartbeats.get(device_id):
+                    continue  # unreachable or not polled since: nothing new to record
+                self._heartbeats[device_id] = heartbeat
+                self._buffer.append((device_id, at, *(_number(device.get(name)) for name in FIELDS)))
+                taken += 1
+        return taken
+
+    def flush(self) -> int:
+        """Write everything buffered in one transaction; kept for the next try if that fails."""
+        with self._lock:
+            samples, self._buffer = self._buffer, []
+        if not samples:
+            return 0
+        started = time.perf_counter()
+        try:
+            write_samples(samples)
+        except sqlite3.Error:
+            with self._lock:
+                self._buffer[:0] = samples
+                del self._buffer[: max(0, len(self._buffer) - MAX_BUFFERED)]
+            raise
+        FLUSH_SECONDS.observe(time.perf_counter() - started)
+        SAMPLES.inc(len(samples))
+        return len(samples)
+
+    def compact(self, now_ms: Optional[int] = None) -> Dict[str, int]:
+        started = time.perf_counter()
+        # Leave a minute open until samples taken in it have surely been flushed.
+        changed = compact(self.tiers, now_ms=now_ms, grace_ms=int(self.config.flush_interval * 2000))
+        COMPACT_SECONDS.observe(time.perf_counter() - started)
+        return changed
+
+    async def _step(self) -> None:
+        try:
+            await asyncio.to_thread(self.flush)
+            if not self._stopped.is_set() and time.monotonic() - self._compacted_at >= self.config.compact_interval:
+                self._compacted_at = time.monotonic()
+                await asyncio.to_thread(self.compact)
+        except sqlite3.Error:
+            logger.warning("telemetry write failed", exc_info=True)
+
+    async def run(self) -> None:
+        data.ACQUISITION_LISTENERS.append(self)
+        try:
+            while not self._stopped.is_set():
+                try:
+                    await asyncio.wait_for(self._stopped.wait(), timeout=self.config.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                await self._step()
+        finally:
+            data.ACQUISITION_LISTENERS.remove(self)
+
+    async def close(self) -> None:
+        """Stop the loop; ``run`` flushes what is buffered on its way out."""
+        self._stopped.set()
@@ -0,0 +1,213 @@
+"""Device status history and equipment-utilization reports.
+
+Status changes arrive through ``data.DEVICE_LISTENERS`` and are stored run-length
+encoded: ``device_status_intervals`` holds one row per stretch of unchanged
+status, with ``ended_at`` NULL for the current one.  Closed stretches are split
+at UTC midnight and their durations summed into ``device_status_daily``, so a
+report reads one row per device, day and status for the whole days of its
+window and only the interval rows of the two partial days at its edges.  The
+cost of a monthly report therefore does not grow with how often devices change
+state, and no heartbeat samples are involved at all.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from . import db
+
+logger = logging.getLogger("unet.utilization")
+
+DAY = 86400.0
+
+_CLIPPED_SQL = """
+    SELECT device_id, status, SUM(MIN(ended_at, :hi) - MAX(started_at, :lo))
+    FROM device_status_intervals
+    WHERE started_at >= :day AND started_at < :hi AND ended_at > :lo
+    GROUP BY device_id, status
+"""
+# Only the partial index on open rows suits this; a started_at bound would
+# tempt the planner into the range index instead.
+_OPEN_SQL = """
+    SELECT device_id, status, :hi - MAX(started_at, :lo)
+    FROM device_status_intervals
+    WHERE ended_at IS NULL
+"""
+_DAILY_SQL = """
+    SELECT device_id, status, SUM(seconds)
+    FROM device_status_daily
+    WHERE day >= ? AND day < ?
+    GROUP BY device_id, status
+"""
+
+# Serialises the read-then-write of the open interval between request threads.
+_lock = threading.Lock()
+
+
+def _day(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d")
+
+
+def _close(conn: sqlite3.Connection, row_id: int, device_id: str, status: str, started: float, ended: float) -> None:
+    if ended <= started:
+        conn.execute("DELETE FROM device_status_intervals WHERE id = ?", (row_id,))
+        return
+    pieces: List[Tuple[float, float]] = []
+    lo = started
+    while lo < ended:
+        hi = min(ended, (math.floor(lo / DAY) + 1) * DAY)
+        pieces.append((lo, hi))
+        lo = hi
+    conn.execute("UPDATE device_status_intervals SET ended_at = ? WHERE id = ?", (pieces[0][1], row_id))
+    conn.executemany(
+        "INSERT INTO device_status_intervals (device_id, status, started_at, ended_at) VALUES (?, ?, ?, ?)",
+        [(device_id, status, lo, hi) for lo, hi in pieces[1:]],
+    )
+    conn.executemany(
+        """
+        INSERT INTO device_status_daily (day, device_id, status, seconds) VALUES (?, ?, ?, ?)
+        ON CONFLICT (day, device_id, status) DO UPDATE SET seconds = seconds + excluded.seconds
+        """,
+        [(_day(lo), device_id, status, hi - lo) for lo, hi in pieces],
+    )
+
+
+@db.instrumented
+def record_transitions(changes: Iterable[Tuple[str, Optional[str], float]]) -> int:
+    """Apply ``(device_id, status, at)`` changes in time order; status None ends the history."""
+    written = 0
+    with _lock, db.get_connection(check_same_thread=False) as conn:
+        for device_id, status, at in changes:
+            row = conn.execute(
+                "SELECT id, status, started_at FROM device_status_intervals WHERE device_id = ? AND ended_at IS NULL",
+                (device_id,),
+            ).fetchone()
+            if row is not None:
+                if row["status"] == status:
+                    continue
+                _close(conn, row["id"], device_id, row["status"], row["started_at"], max(at, row["started_at"]))
+            if status is not None:
+                conn.execute(
+                    "INSERT INTO device_status_intervals (device_id, status, started_at) VALUES (?, ?, ?)",
+                    (device_id, status, at),
+                )
+            written += 1
+        conn.commit()
+    return written
+
+
+def on_device_status(device_id: str, status: Optional[str]) -> None:
+    # Runs inside simulate_tick and the Modbus poller; a failed write must not break them.
+    try:
+        record_transitions([(device_id, status, time.time())])
+    except sqlite3.Error:
+        logger.warning("could not record status %s for %s", status, device_id, exc_info=True)
+
+
+def sync(devices: Sequence[Dict[str, object]], at: Optional[float] = None) -> int:
+    """Open or continue an interval for every device and end those no longer present."""
+    at = time.time() if at is None else at
+    known = {str(device["deviceId"]) for device in devices}
+    with db.get_connection() as conn:
+        gone = [
+            row[0]
+            for row in conn.execute("SELECT device_id FROM device_status_intervals WHERE ended_at IS NULL")
+            if row[0] not in known
+        ]
+    changes = [(device_id, None, at) for device_id in gone]
+    changes += [(str(device["deviceId"]), str(device["status"]), at) for device in devices]
+    return record_transitions(changes)
+
+
+def close_all(at: Optional[float] = None) -> int:
+    """End every open interval, e.g. on shutdown so downtime is not counted as any status."""
+    return sync([], at)
+
+
+@db.instrumented
+def status_seconds(start: float, end: float, *, now: Optional[float] = None) -> Dict[str, Dict[str, float]]:
+    """Seconds spent in each status per device within ``[start, end)``."""
+    end = min(end, time.time() if now is None else now)
+    totals: Dict[str, Dict[str, float]] = {}
+    if end <= start:
+        return totals
+
+    def add(rows: Iterable[Tuple[str, str, float]]) -> None:
+        for device_id, status, seconds in rows:
+            if seconds and seconds > 0:
+                bucket = totals.setdefault(device_id, {})
+                bucket[status] = bucket.get(status, 0.0) + seconds
+
+    first_day = math.ceil(start / DAY) * DAY
+    last_day = math.floor(end / DAY) * DAY
+    with db.get_connection() as conn:
+        conn.row_factory = None
+        if first_day < last_day:
+            add(conn.execute(_DAILY_SQL, (_day(first_day), _day(last_day))))
+            edges = [(start, first_day), (last_day, end)]
+        else:
+            edges = [(start, end)]
+        for lo, hi in edges:
+            if hi > lo:
+                add(conn.execute(_CLIPPED_SQL, {"lo": lo, "hi": hi, "day": math.floor(lo / DAY) * DAY}))
+        add(conn.execute(_OPEN_SQL, {"lo": start, "hi": end}))
+    return totals
+
+
+def parse_window(start: Optional[str], end: Optional[str], *, now: Optional[float] = None) -> Tuple[float, float]:
+    """Epoch bounds for ISO/date strings; defaults to the current month so far.
+
+    A bare end date includes that whole day.
+    """
+    now = time.time() if now is None else now
+    if start:
+        lo = db.to_ms(start) / 1000
+    else:
+        lo = datetime.fromtimestamp(now, timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0).timestamp()
+    if end:
+        hi = (db.to_ms(end, end_of_day=True) + 1 if len(end.strip()) == 10 else db.to_ms(end)) / 1000
+    else:
+        hi = now
+    if hi <= lo:
+        raise ValueError("end must be after start")
+    return lo, hi
+
+
+def utilization_report(
+    start: float,
+    end: float,
+    *,
+    device_id: Optional[str] = None,
+    names: Optional[Dict[str, str]] = None,
+) -> Dict[str, object]:
+    names = names or {}
+    totals = status_seconds(start, end)
+    device_ids = sorted(set(totals) | set(names))
+    if device_id:
+        device_ids = [item for item in device_ids if item == device_id]
+    items = []
+    for item in device_ids:
+        seconds = totals.get(item, {})
+        observed = sum(seconds.values())
+        online = seconds.get("online", 0.0)
+        items.append(
+            {
+                "deviceId": item,
+                "name": names.get(item, item),
+                "onlineSeconds": round(online, 1),
+                "maintenanceSeconds": round(seconds.get("maintenance", 0.0), 1),
+                "offlineSeconds": round(seconds.get("offline", 0.0), 1),
+                "observedSeconds": round(observed, 1),
+                "utilization": round(online / observed, 4) if observed else 0.0,
+            }
+        )
+    return {
+        "start": db.isoformat(datetime.fromtimestamp(start, timezone.utc)),
+        "end": db.isoformat(datetime.fromtimestamp(min(end, time.time()), timezone.utc)),
+        "items": items,
+    }
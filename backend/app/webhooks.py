@@ -0,0 +1,353 @@
+"""Batched webhook fan-out of interface 4 events.
+
+Event inserts append to the ``webhook_outbox`` table of their shard in the same
+transaction (see ``db.OUTBOX_ENABLED``).  Each subscriber keeps a durable
+cursor into every shard's outbox, reads them merged in write order, and is
+served by its own worker, which posts one batch at a time over
+the subscriber's own keep-alive connection.  Every API process with webhooks
+configured fills the outbox, but only the one holding the delivery lease (a
+lock on ``.webhooks.lock`` in the data directory) delivers; the others stand
+by and take over when it exits.  Nothing is shared between
+subscribers, so one that hangs until the timeout never holds up delivery to
+the others.  Failed batches are retried from the cursor with exponential
+backoff, so a slow or dead subscriber only delays itself and never the ingest
+path.
+Delivery is at least once; receivers should de-duplicate on ``eventId``.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from . import data, db, metrics, schemas
+
+try:  # POSIX
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+if TYPE_CHECKING:  # pragma: no cover
+    import httpx
+
+logger = logging.getLogger("unet.webhooks")
+
+CONFIG_PATH = os.environ.get("UNET_WEBHOOKS_CONFIG")
+WEBHOOK_INTEGRATION = "Webhook 推送"
+
+DELIVERED = metrics.Counter("unet_webhook_delivered_events", "Events delivered per subscriber.", ("subscriber",))
+FAILURES = metrics.Counter("unet_webhook_failures", "Failed webhook batches.", ("subscriber", "reason"))
+BATCH_SECONDS = metrics.Histogram(
+    "unet_webhook_batch_duration_seconds", "Round-trip time of one webhook batch.", ("subscriber",)
+)
+LAG_EVENTS = metrics.Gauge("unet_webhook_lag_events", "Outbox entries not yet delivered.", ("subscriber",))
+LAG_SECONDS = metrics.Gauge("unet_webhook_lag_seconds", "Age of the oldest undelivered entry.", ("subscriber",))
+
+# Outbox rows hold the raw database row; subscribers receive the API field names.
+_API_NAMES = {
+    (model_field.alias or name): name for name, model_field in schemas.Interface4Event.__fields__.items()
+}
+
+
+@dataclass
+class SubscriberConfig:
+    name: str
+    url: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    batch_size: int = 100
+
+    @classmethod
+    def from_dict(cls, raw: Dict[str, object], *, batch_size: int) -> "SubscriberConfig":
+        return cls(
+            name=str(raw["name"]),
+            url=str(raw["url"]),
+            headers={str(key): str(value) for key, value in (raw.get("headers") or {}).items()},
+            batch_size=int(raw.get("batchSize", batch_size)),
+        )
+
+
+@dataclass
+class WebhookConfig:
+    subscribers: List[SubscriberConfig]
+    timeout: float = 5.0
+    backoff_initial: float = 1.0
+    backoff_max: float = 300.0
+    poll_interval: float = 1.0
+
+    @classmethod
+    def load(cls, path: Path) -> "WebhookConfig":
+        raw = json.loads(Path(path).read_text(encoding="utf-8"))
+        batch_size = int(raw.get("batchSize", 100))
+        return cls(
+            subscribers=[SubscriberConfig.from_dict(item, batch_size=batch_size) for item in raw["subscribers"]],
+            timeout=float(raw.get("timeout", 5.0)),
+            backoff_initial=float(raw.get("backoffInitial", 1.0)),
+            backoff_max=float(raw.get("backoffMax", 300.0)),
+            poll_interval=float(raw.get("pollInterval", 1.0)),
+        )
+
+
+class Subscriber:
+    """Delivery state of one subscriber; the cursor itself lives in SQLite."""
+
+    def __init__(self, config: SubscriberConfig) -> None:
+        self.config = config
+        self.delivered_ids: Dict[str, int] = {}
+        self.head_ids: Dict[str, int] = {}
+        self.oldest_pending: Optional[float] = None
+        self.delivered = 0
+        self.failures = 0
+        self.retry_at = 0.0
+        self.last_error: Optional[str] = None
+        self.last_latency: Optional[float] = None
+        self.last_delivered_at: Optional[str] = None
+        self.wake = asyncio.Event()
+        self.client: Optional["httpx.AsyncClient"] = None
+
+    @property
+    def pending(self) -> int:
+        return sum(max(0, head - self.delivered_ids.get(shard, 0)) for shard, head in self.head_ids.items())
+
+    @property
+    def lag_seconds(self) -> float:
+        return max(0.0, time.time() - self.oldest_pending) if self.oldest_pending and self.pending else 0.0
+
+    def status(self) -> Dict[str, object]:
+        return {
+            "name": self.config.name,
+            "url": self.config.url,
+            "pendingEvents": self.pending,
+            "lagSeconds": round(self.lag_seconds, 3),
+            "deliveredEvents": self.delivered,
+            "consecutiveFailures": self.failures,
+            "lastError": self.last_error,
+            "lastLatencyMs": round(self.last_latency * 1000) if self.last_latency is not None else None,
+            "lastDeliveredAt": self.last_delivered_at,
+        }
+
+
+class DeliveryLease:
+    """Exclusive lock on ``path`` marking the one process that delivers; the OS drops it when that process dies."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._handle = None
+
+    @property
+    def held(self) -> bool:
+        return self._handle is not None
+
+    def acquire(self) -> bool:
+        """Take the lease without waiting; False while another process holds it."""
+        if self._handle is not None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        handle = open(self.path, "a+b")
+        try:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            handle.close()
+            return False
+        self._handle = handle
+        return True
+
+    def release(self) -> None:
+        # Closing the file drops the lock.
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+
+class WebhookDispatcher:
+    """One worker and one keep-alive connection per subscriber."""
+
+    def __init__(self, config: WebhookConfig) -> None:
+        # httpx takes a noticeable share of a cold start; only load it once subscribers are configured.
+        import httpx
+
+        self.config = config
+        self.subscribers = [Subscriber(item) for item in config.subscribers]
+        self.lease = DeliveryLease(db.DB_DIR / ".webhooks.lock")
+        self._stopped = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        for subscriber in self.subscribers:
+            # A worker has one batch in flight at a time, so one connection each is enough.
+            subscriber.client = httpx.AsyncClient(
+                timeout=config.timeout,
+                limits=httpx.Limits(max_connections=1, max_keepalive_connections=1),
+            )
+
+    @classmethod
+    def from_env(cls) -> Optional["WebhookDispatcher"]:
+        if not CONFIG_PATH:
+            return None
+        return cls(WebhookConfig.load(Path(CONFIG_PATH)))
+
+    def notify(self) -> None:
+        """Wake the workers; safe to call from the threadpool that runs inserts."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake_all)
+
+    def _wake_all(self) -> None:
+        for subscriber in self.subscribers:
+            subscriber.wake.set()
+
+    async def run(self) -> None:
+        global _active
+        self._loop = asyncio.get_running_loop()
+        # Filled by every process, whichever one delivers.
+        db.OUTBOX_ENABLED = True
+        db.INSERT_LISTENERS.append(self.notify)
+        data.register_integration(WEBHOOK_INTEGRATION, f"{len(self.subscribers)} 个订阅方")
+        data.LIVE_SOURCES.add(WEBHOOK_INTEGRATION)
+        _active = self
+        try:
+            if await self._lead():
+                for subscriber in self.subscribers:
+                    subscriber.delivered_ids = await asyncio.to_thread(db.outbox_cursor, subscriber.config.name)
+                await asyncio.gather(*(self._work(subscriber) for subscriber in self.subscribers), self._prune())
+        finally:
+            # This process no longer serves the outbox; stop filling it.
+            db.OUTBOX_ENABLED = False
+            db.INSERT_LISTENERS.remove(self.notify)
+            self.lease.release()
+            if _active is self:
+                _active = None
+            for subscriber in self.subscribers:
+                await subscriber.client.aclose()
+
+    async def close(self) -> None:
+        self._stopped.set()
+        self._wake_all()
+
+    async def _sleep(self, event: asyncio.Event, timeout: float) -> None:
+        waiters = [asyncio.ensure_future(event.wait()), asyncio.ensure_future(self._stopped.wait())]
+        try:
+            await asyncio.wait(waiters, timeout=max(0.0, timeout), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    async def _lead(self) -> bool:
+        """Wait until this process holds the delivery lease; False when stopped first."""
+        while not self._stopped.is_set():
+            if await asyncio.to_thread(self.lease.acquire):
+                return True
+            # Standing by: keep the lag figures current for the status endpoint.
+            for subscriber in self.subscribers:
+                subscriber.delivered_ids = await asyncio.to_thread(db.outbox_cursor, subscriber.config.name)
+                batch = await asyncio.to_thread(db.fetch_outbox, subscriber.delivered_ids, 1)
+                subscriber.head_ids.update(batch["heads"])
+                subscriber.oldest_pending = batch["items"][0][3] if batch["items"] else None
+                self._publish_lag(subscriber)
+            await self._sleep(self._stopped, self.config.poll_interval)
+        return False
+
+    async def _work(self, subscriber: Subscriber) -> None:
+        while not self._stopped.is_set():
+            delay = subscriber.retry_at - time.monotonic()
+            if delay > 0:
+                await self._sleep(self._stopped, delay)
+                continue
+            subscriber.wake.clear()
+            batch = await asyncio.to_thread(db.fetch_outbox, subscriber.delivered_ids, subscriber.config.batch_size)
+            items = batch["items"]
+            for shard, head in batch["heads"].items():
+                subscriber.head_ids[shard] = max(subscriber.head_ids.get(shard, 0), head)
+            subscriber.oldest_pending = items[0][3] if items else None
+            self._publish_lag(subscriber)
+            if not items:
+                await self._sleep(subscriber.wake, self.config.poll_interval)
+                continue
+            delivered = await self._deliver(subscriber, items)
+            if delivered:
+                # Items of one shard come in id order, so the last one seen is its new cursor.
+                last_ids = {shard: outbox_id for shard, outbox_id, _, _ in items}
+                await asyncio.to_thread(db.advance_outbox_cursor, subscriber.config.name, last_ids)
+                subscriber.delivered_ids.update(last_ids)
+                subscriber.delivered += len(items)
+                DELIVERED.inc(len(items), subscriber.config.name)
+            self._publish_integration()
+
+    async def _deliver(self, subscriber: Subscriber, items: List[tuple]) -> bool:
+        import httpx
+
+        config = subscriber.config
+        events = [{_API_NAMES.get(key, key): value for key, value in json.loads(item[2]).items()} for item in items]
+        body = json.dumps({"subscriber": config.name, "events": events}, ensure_ascii=False).encode("utf-8")
+        headers = {
+            "Content-Type": "application/json",
+            "X-Unet-Delivery": f"{items[0][1]}-{items[-1][1]}",
+            **config.headers,
+        }
+        started = time.perf_counter()
+        try:
+            response = await subscriber.client.post(config.url, content=body, headers=headers)
+            reason = None if response.is_success else f"HTTP {response.status_code}"
+        except httpx.HTTPError as exc:
+            reason = type(exc).__name__
+        subscriber.last_latency = time.perf_counter() - started
+        BATCH_SECONDS.observe(subscriber.last_latency, config.name)
+        if reason is None:
+            subscriber.failures = 0
+            subscriber.retry_at = 0.0
+            subscriber.last_error = None
+            subscriber.last_delivered_at = db.isoformat(datetime.now(timezone.utc))
+            return True
+        FAILURES.inc(1.0, config.name, reason)
+        subscriber.failures += 1
+        subscriber.last_error = reason
+        delay = min(self.config.backoff_max, self.config.backoff_initial * 2 ** (subscriber.failures - 1))
+        subscriber.retry_at = time.monotonic() + delay * random.uniform(0.8, 1.2)
+        if subscriber.failures == 1:
+            logger.warning("webhook delivery to %s failed: %s", config.name, reason)
+        return False
+
+    async def _prune(self) -> None:
+        names = [subscriber.config.name for subscriber in self.subscribers]
+        while not self._stopped.is_set():
+            await self._sleep(self._stopped, 60.0)
+            await asyncio.to_thread(db.prune_outbox, names)
+
+    def _publish_lag(self, subscriber: Subscriber) -> None:
+        LAG_EVENTS.set(subscriber.pending, subscriber.config.name)
+        LAG_SECONDS.set(subscriber.lag_seconds, subscriber.config.name)
+
+    def _publish_integration(self) -> None:
+        healthy = sum(1 for subscriber in self.subscribers if not subscriber.failures)
+        if healthy == len(self.subscribers):
+            state = "online"
+        elif healthy:
+            state = "degraded"
+        else:
+            state = "offline"
+        latencies = [subscriber.last_latency for subscriber in self.subscribers if subscriber.last_latency is not None]
+        data.update_integration(
+            WEBHOOK_INTEGRATION,
+            status=state,
+            latency_ms=round(max(latencies) * 1000) if latencies else 0,
+            target=f"{healthy}/{len(self.subscribers)} 个订阅方正常",
+        )
+
+    def status(self) -> List[Dict[str, object]]:
+        return [{**subscriber.status(), "delivering": self.lease.held} for subscriber in self.subscribers]
+
+
+_active: Optional[WebhookDispatcher] = None
+
+
+def subscriber_status() -> List[Dict[str, object]]:
+    """Per-subscriber delivery lag of the running dispatcher, if any."""
+    return _active.status() if _active is not None else []
@@ -0,0 +1,186 @@
+"""Streaming xlsx writer built on the standard library's ``zipfile``.
+
+Rows are written as inline-string cells straight into a deflated worksheet
+entry of a zip archive that writes to an in-memory sink; the sink is drained
+whenever it holds ``chunk_size`` bytes.  There is no shared-strings table and
+nothing is kept per row, so memory stays flat regardless of the row count and
+the first bytes go out as soon as the header row is compressed.  Sheets roll
+over at Excel's row limit.
+"""
+from __future__ import annotations
+
+import math
+import re
+import zipfile
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+MAX_ROWS = 1_048_576
+ROWS_PER_WRITE = 256
+
+# Escapes markup and drops characters XML 1.0 cannot carry; most values need
+# neither, so a regex search guards the comparatively slow translate().
+_XML_TEXT = {ord("&"): "&amp;", ord("<"): "&lt;", ord(">"): "&gt;"}
+_XML_TEXT.update({code: None for code in (*range(0x00, 0x09), 0x0B, 0x0C, *range(0x0E, 0x20), 0xFFFE, 0xFFFF)})
+_NEEDS_ESCAPE = re.compile("[&<>\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+_CONTENT_TYPES_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    "</Relationships>"
+)
+_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0">'
+    '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+    "</sheetView></sheetViews>"
+)
+_SHEET_TAIL = "</sheetData></worksheet>"
+
+
+class _Sink:
+    """Write-only file object collecting zip output until it is drained."""
+
+    def __init__(self) -> None:
+        self.chunks: List[bytes] = []
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        self.size = 0
+        return data
+
+
+def _text(value: str) -> str:
+    return value.translate(_XML_TEXT) if _NEEDS_ESCAPE.search(value) else value
+
+
+def _cell(value: object) -> str:
+    kind = type(value)
+    if kind is str:
+        return f'<c t="inlineStr"><is><t xml:space="preserve">{_text(value)}</t></is></c>' if value else "<c/>"
+    if value is None:
+        return "<c/>"
+    if kind is bool:
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if kind is int or (kind is float and math.isfinite(value)):
+        return f"<c><v>{value!r}</v></c>"
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{_text(str(value))}</t></is></c>'
+
+
+def _row(values: Sequence[object]) -> str:
+    return "<row>" + "".join(map(_cell, values)) + "</row>"
+
+
+def _columns(widths: Optional[Sequence[float]]) -> str:
+    if not widths:
+        return ""
+    cols = "".join(
+        f'<col min="{index}" max="{index}" width="{width}" customWidth="1"/>' for index, width in enumerate(widths, 1)
+    )
+    return f"<cols>{cols}</cols>"
+
+
+def stream_workbook(
+    headers: Sequence[str],
+    rows: Iterable[Sequence[object]],
+    *,
+    sheet_name: str = "Sheet",
+    widths: Optional[Sequence[float]] = None,
+    chunk_size: int = 64 * 1024,
+) -> Iterator[bytes]:
+    """Yield an xlsx file for ``rows`` in chunks of roughly ``chunk_size`` bytes."""
+    sink = _Sink()
+    archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6)
+    head = _SHEET_HEAD + _columns(widths) + "<sheetData>" + _row(headers)
+    remaining = iter(rows)
+    sheets = 0
+    more = True
+    while more:
+        sheets += 1
+        with archive.open(f"xl/worksheets/sheet{sheets}.xml", "w", force_zip64=True) as part:
+            part.write(head.encode("utf-8"))
+            if sheets == 1:
+                yield sink.drain()  # start the download before the first row is fetched
+            written = 1
+            pending: List[str] = []
+            more = False
+            for values in remaining:
+                pending.append(_row(values))
+                written += 1
+                if len(pending) >= ROWS_PER_WRITE:
+                    part.write("".join(pending).encode("utf-8"))
+                    pending.clear()
+                    if sink.size >= chunk_size:
+                        yield sink.drain()
+                if written >= MAX_ROWS:
+                    more = True
+                    break
+            if pending:
+                part.write("".join(pending).encode("utf-8"))
+            part.write(_SHEET_TAIL.encode("utf-8"))
+        if sink.size >= chunk_size:
+            yield sink.drain()
+
+    names = [sheet_name if index == 1 else f"{sheet_name} ({index})" for index in range(1, sheets + 1)]
+    archive.writestr("[Content_Types].xml", _content_types(sheets))
+    archive.writestr("_rels/.rels", _ROOT_RELS)
+    archive.writestr("xl/workbook.xml", _workbook(names))
+    archive.writestr("xl/_rels/workbook.xml.rels", _workbook_rels(sheets))
+    archive.close()
+    yield sink.drain()
+
+
+def _content_types(sheets: int) -> str:
+    overrides = "".join(
+        f'<Override PartName="/xl/worksheets/sheet{index}.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for index in range(1, sheets + 1)
+    )
+    return _CONTENT_TYPES_HEAD + overrides + "</Types>"
+
+
+def _workbook(names: List[str]) -> str:
+    sheets = "".join(
+        f'<sheet name="{_text(name)[:31]}" sheetId="{index}" r:id="rId{index}"/>' for index, name in enumerate(names, 1)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f"<sheets>{sheets}</sheets></workbook>"
+    )
+
+
+def _workbook_rels(sheets: int) -> str:
+    relations = "".join(
+        f'<Relationship Id="rId{index}" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        f'Target="worksheets/sheet{index}.xml"/>'
+        for index in range(1, sheets + 1)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f"{relations}</Relationships>"
+    )
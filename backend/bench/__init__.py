@@ -0,0 +1 @@
+"""Offline load-test and benchmark tooling for the UNET Supply Management MVP."""
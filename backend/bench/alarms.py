@@ -0,0 +1,126 @@
+"""Alarm rule engine benchmark.
+
+Run from the ``backend`` directory::
+
+    python -m bench.alarms --devices 1000 --ticks 200
+
+First replays a scripted temperature trace through one high-limit rule and
+checks when it raises and clears (delay-on, hysteresis, missing samples).
+Then compiles the default rules plus a rate rule for ``--devices`` synthetic
+devices, random-walks their values and times one evaluation per tick.
+Exits with status 1 when the script misbehaves or the p99 pass exceeds
+``--budget-ms``.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from typing import Dict, List, Optional
+
+# (seconds, temperature, expected raised afterwards) for limit 100, hysteresis 2, delay 10.
+_SCRIPT = [
+    (0, 95.0, False),
+    (5, 101.0, False),  # over the limit, delay starts
+    (10, 99.0, False),  # dipped back: delay restarts
+    (15, 102.0, False),
+    (20, 103.0, False),
+    (25, 104.0, True),  # held for 10 s
+    (30, 99.0, True),  # below the limit but inside the hysteresis band
+    (35, None, True),  # missing sample changes nothing
+    (40, 97.5, False),
+    (45, 99.5, False),
+]
+
+
+def _script_check() -> List[str]:
+    from app import alarms
+
+    engine = alarms.AlarmEngine([alarms.Rule("high", "temperature", limit=100.0, hysteresis=2.0, delay=10.0)])
+    device: Dict[str, object] = {"deviceId": "Script01", "name": "脚本设备", "status": "online", "alarms": []}
+    failures = []
+    for at, value, expected in _SCRIPT:
+        device["temperature"] = value
+        engine.evaluate([device], now=1_700_000_000.0 + at)
+        raised = any(engine.active)
+        if raised != expected:
+            failures.append(f"t={at}s value={value}: raised={raised}, expected {expected}")
+    return failures
+
+
+def _devices(count: int, rng: random.Random) -> List[Dict[str, object]]:
+    from app import data
+
+    return [
+        {
+            "deviceId": f"Hopper{index:05d}",
+            "name": f"料斗 {index:05d}",
+            "status": "online",
+            "temperature": rng.uniform(60, 100),
+            "level": rng.randint(20, 90),
+            "lastHeartbeat": data._ts(),
+            "alarms": [],
+        }
+        for index in range(count)
+    ]
+
+
+def run(args: argparse.Namespace) -> Dict[str, object]:
+    from app import alarms, data, db
+
+    rng = random.Random(5)
+    devices = _devices(args.devices, rng)
+    rules = alarms.DEFAULT_RULES + [alarms.Rule("rate", "temperature", limit=1.5, delay=5.0)]
+    engine = alarms.AlarmEngine(rules)
+    timings: List[float] = []
+    transitions = 0
+    now = time.time()
+    for _ in range(args.ticks):
+        now += args.interval
+        heartbeat = db.format_ms(int(now * 1000))
+        for device in devices:
+            device["temperature"] = max(30.0, min(130.0, device["temperature"] + rng.uniform(-3, 3.1)))
+            device["level"] = max(0, min(100, device["level"] + rng.randint(-4, 4)))
+            if rng.random() < 0.001:
+                device["status"] = "offline" if device["status"] == "online" else "online"
+            if device["status"] == "online":
+                device["lastHeartbeat"] = heartbeat
+        began = time.perf_counter()
+        transitions += engine.evaluate(devices, now=now)
+        timings.append(time.perf_counter() - began)
+    data.ALERTS.clear()
+    ms = sorted(value * 1000 for value in timings)
+    return {
+        "devices": args.devices,
+        "rules": len(engine.compiled),
+        "ticks": args.ticks,
+        "transitions": transitions,
+        "activeAtEnd": sum(1 for alert in engine.active if alert),
+        "evaluateMs": {
+            "first": round(timings[0] * 1000, 3),
+            "p50": round(statistics.median(ms), 3),
+            "p99": round(ms[max(0, int(len(ms) * 0.99) - 1)], 3),
+        },
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Time the compiled alarm rules.")
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--ticks", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=5.0, help="simulated seconds between ticks")
+    parser.add_argument("--budget-ms", type=float, default=250.0, help="allowed p99 evaluation time")
+    args = parser.parse_args(argv)
+
+    failures = _script_check()
+    report = run(args)
+    report["scriptFailures"] = failures
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 1 if failures or report["evaluateMs"]["p99"] > args.budget_ms else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
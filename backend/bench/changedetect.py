@@ -0,0 +1,107 @@
+"""Change-detector write-volume benchmark on synthetic noisy signals.
+
+Run from the ``backend`` directory::
+
+    python -m bench.changedetect --points 100 --samples 3600 --deadband 1.5
+
+Each analog point is a flat value with Gaussian noise plus a few real steps;
+each discrete point toggles a handful of times.  Reports how many samples
+would have become interface 4 events without the filter, how many pass it,
+and whether every real step and edge was captured.  Exits with status 1 when
+an edge is missed.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+from typing import Dict, List, Optional
+
+from app.changedetect import ChangeDetector
+from app.pointtable import Point
+
+
+def run(args: argparse.Namespace) -> Dict[str, object]:
+    rng = random.Random(args.seed)
+    analog = [
+        Point(
+            f"a{index}",
+            index,
+            events=True,
+            deadband=args.deadband,
+            deadband_percent=args.deadband_percent,
+            hysteresis=args.hysteresis,
+            min_interval=args.min_interval,
+        )
+        for index in range(args.points)
+    ]
+    discrete = [Point(f"d{index}", index, table="coil", type="bool", events=True) for index in range(args.points // 4)]
+    detector = ChangeDetector(analog + discrete)
+
+    steps = {point.field: sorted(rng.sample(range(60, args.samples - 60), args.steps)) for point in analog}
+    edges = {point.field: sorted(rng.sample(range(1, args.samples), args.steps)) for point in discrete}
+    levels = {point.field: rng.uniform(40, 90) for point in analog}
+    states = {point.field: False for point in discrete}
+    missed = 0
+    pending_steps = {name: list(times) for name, times in steps.items()}
+
+    emitted = 0
+    started = time.perf_counter()
+    for tick in range(args.samples):
+        values: Dict[str, object] = {}
+        for name in levels:
+            if pending_steps[name] and pending_steps[name][0] == tick:
+                levels[name] += rng.choice((-1, 1)) * args.step_size
+            values[name] = round(levels[name] + rng.gauss(0, args.noise), 3)
+        for name, times in edges.items():
+            if tick in times:
+                states[name] = not states[name]
+            values[name] = states[name]
+        for change in detector.evaluate(values, float(tick)):
+            emitted += 1
+            times = pending_steps.get(change.point.field)
+            while times and times[0] <= tick:
+                times.pop(0)
+        # A step counts as missed once it has gone unreported for longer than the hold-off window.
+        for name, times in pending_steps.items():
+            while times and tick - times[0] > args.min_interval + 5:
+                times.pop(0)
+                missed += 1
+    elapsed = time.perf_counter() - started
+
+    samples = args.samples * (len(analog) + len(discrete))
+    discrete_edges = sum(len(times) for times in edges.values())
+    return {
+        "samples": samples,
+        "emitted": emitted,
+        "reduction": round(samples / max(emitted, 1), 1),
+        "analogSteps": sum(len(times) for times in steps.values()),
+        "discreteEdges": discrete_edges,
+        "missedSteps": missed,
+        "usPerSample": round(elapsed / samples * 1e6, 3),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure change-detector write reduction.")
+    parser.add_argument("--points", type=int, default=100)
+    parser.add_argument("--samples", type=int, default=3600, help="acquisition cycles per point")
+    parser.add_argument("--steps", type=int, default=5, help="real steps/edges per point")
+    parser.add_argument("--step-size", type=float, default=10.0)
+    parser.add_argument("--noise", type=float, default=0.3, help="Gaussian noise sigma")
+    parser.add_argument("--deadband", type=float, default=1.5)
+    parser.add_argument("--deadband-percent", type=float, default=0.0)
+    parser.add_argument("--hysteresis", type=float, default=0.5)
+    parser.add_argument("--min-interval", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print(json.dumps(report, indent=2))
+    return 1 if report["missedSteps"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""Local request latency while the ERP integration degrades and recovers.
+
+Run from the ``backend`` directory::
+
+    python -m bench.erp_degraded --phase-seconds 6
+
+Serves the app and ``tools.fake_erp`` in one event loop, then drives
+``GET /api/tasks`` through three phases: ERP healthy, ERP answering slower
+than the client timeout, ERP healthy again.  Reports local latency, the
+breaker state and the ERP integration entry per phase, plus how many tasks
+were received and how much feedback reached the fake ERP.  Exits with status
+1 when the degraded phase slows local requests beyond ``--budget-ms`` (p99).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run(args: argparse.Namespace) -> Dict[str, object]:
+    import httpx
+    import uvicorn
+
+    from app import erp
+    from app.main import app
+    from tools.fake_erp import FakeErp
+
+    fake = FakeErp(task_interval=0.5)
+    erp_server = uvicorn.Server(uvicorn.Config(fake.app, host="127.0.0.1", port=args.erp_port, log_level="error"))
+    app_server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.app_port, log_level="error"))
+    serving = [asyncio.create_task(erp_server.serve()), asyncio.create_task(app_server.serve())]
+    while not (erp_server.started and app_server.started):
+        await asyncio.sleep(0.01)
+
+    base = f"http://127.0.0.1:{args.app_port}"
+    phases: Dict[str, Dict[str, object]] = {}
+    async with httpx.AsyncClient(base_url=base) as client:
+        login = await client.post("/api/auth/login", json={"username": "admin", "password": "admin123"})
+        headers = {"Authorization": f"Bearer {login.json()['token']}"}
+        for phase, latency in (("healthy", 0.0), ("degraded", args.degraded_ms / 1000), ("recovered", 0.0)):
+            fake.latency = latency
+            timings: List[float] = []
+            deadline = time.perf_counter() + args.phase_seconds
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                response = await client.get("/api/tasks", headers=headers)
+                response.raise_for_status()
+                timings.append((time.perf_counter() - started) * 1000)
+                await asyncio.sleep(0.01)
+            integrations = (await client.get("/api/integrations", headers=headers)).json()
+            entry = next(item for item in integrations if item["name"] == erp.INTEGRATION_NAMES["ERP"])
+            phases[phase] = {
+                "requests": len(timings),
+                "p50Ms": round(statistics.median(timings), 3),
+                "p99Ms": round(_percentile(timings, 0.99), 3),
+                "integration": {key: entry[key] for key in ("status", "latencyMs")},
+            }
+        tasks = (await client.get("/api/tasks", params={"pageSize": 500}, headers=headers)).json()["items"]
+
+    app_server.should_exit = True
+    erp_server.should_exit = True
+    await asyncio.gather(*serving)
+    stats = fake.snapshot()
+    return {
+        "phases": phases,
+        "erpTasksListed": sum(1 for task in tasks if task["source"] == "ERP"),
+        "erpTasksIssued": stats["issued"],
+        "erpRequestsFailed": stats["failed"],
+        "feedbackBatches": stats["feedbackBatches"],
+        "feedbackTasks": len(stats["feedback"]),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure local latency while the ERP integration degrades.")
+    parser.add_argument("--phase-seconds", type=float, default=6.0)
+    parser.add_argument("--degraded-ms", type=float, default=3000.0, help="fake ERP response delay while degraded")
+    parser.add_argument("--budget-ms", type=float, default=50.0, help="p99 local latency allowed while degraded")
+    parser.add_argument("--app-port", type=int, default=18061)
+    parser.add_argument("--erp-port", type=int, default=18071)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        config = Path(data_dir) / "erp.json"
+        config.write_text(
+            json.dumps(
+                {
+                    "systems": [
+                        {
+                            "name": "ERP",
+                            "baseUrl": f"http://127.0.0.1:{args.erp_port}",
+                            "timeout": 0.5,
+                            "pollInterval": 0.5,
+                            "feedbackInterval": 0.5,
+                            "failureThreshold": 3,
+                            "resetTimeout": 2.0,
+                        }
+                    ]
+                }
+            ),
+            encoding="utf-8",
+        )
+        # Both are read at import time, so set them before importing the app.
+        os.environ["UNET_DATA_DIR"] = data_dir
+        os.environ["UNET_ERP_CONFIG"] = str(config)
+        report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 1 if report["phases"]["degraded"]["p99Ms"] > args.budget_ms else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
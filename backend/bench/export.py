@@ -0,0 +1,151 @@
+"""Interface 4 export throughput and memory benchmark.
+
+Run from the ``backend`` directory::
+
+    python -m bench.export --rows 1000000 --format xlsx
+    python -m bench.export --rows 1000000 --format ndjson --compress gzip
+
+Seeds a throwaway database with ``--rows`` events, then drains the export
+stream exactly as the endpoint builds it and reports time to first byte,
+throughput, output size and the growth of RSS while streaming (sampled from
+``/proc`` on Linux).  A streaming export keeps that growth flat as
+``--rows`` grows.  For NDJSON the export is also cut off halfway and resumed
+from the last cursor received; the report counts missing and repeated rows.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+
+def seed(rows: int) -> None:
+    from app import db, migrations
+
+    migrations.migrate()
+    batch: List[tuple] = []
+    with db.get_connection() as conn:
+        for index in range(rows):
+            stamp = db.to_ms(f"2024-01-{1 + index % 28:02d}T{index % 24:02d}:{index % 60:02d}:{(index // 60) % 60:02d}Z")
+            batch.append(
+                (
+                    f"EVT-{index:08d}",
+                    f"Hopper{index % 9 + 1:02d}",
+                    f"P{index % 900 + 100}",
+                    "PA66",
+                    f"B{index:08d}",
+                    round(index % 500 * 1.1, 1),
+                    "kg",
+                    index % 1000 / 1000,
+                    "completed",
+                    "Modbus 轮询",
+                    "自动采集并入库 <批量>",
+                    "Modbus",
+                    stamp,
+                    stamp,
+                )
+            )
+            if len(batch) >= 10_000:
+                conn.executemany(f"INSERT INTO interface4_events {_COLUMNS} VALUES ({', '.join('?' * 14)})", batch)
+                batch.clear()
+        if batch:
+            conn.executemany(f"INSERT INTO interface4_events {_COLUMNS} VALUES ({', '.join('?' * 14)})", batch)
+        conn.commit()
+
+
+_COLUMNS = (
+    "(event_id, device_id, point_code, material_code, batch_no, produced_qty, unit, trigger_value,"
+    " status, handler, remarks, trigger_source, triggered_ms, created_ms)"
+)
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as handle:
+            return int(handle.read().split()[1]) * resource.getpagesize() / 2**20
+    except OSError:  # not Linux: fall back to the lifetime peak
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(args: argparse.Namespace) -> Dict[str, object]:
+    from app import db, main
+
+    seed(args.rows)
+    stream, columns, _, _ = main.EXPORT_FORMATS[args.format]
+    baseline = peak = _rss_mb()
+    started = time.perf_counter()
+    first_byte: Optional[float] = None
+    size = 0
+    chunks = 0
+    body = stream(db.iter_interface4_events(columns=columns))
+    if args.compress:
+        body = main._gzip_stream(body)
+    for chunk in body:
+        if first_byte is None and chunk:
+            first_byte = time.perf_counter() - started
+        size += len(chunk)
+        chunks += 1
+        if chunks % 16 == 0:
+            peak = max(peak, _rss_mb())
+    elapsed = time.perf_counter() - started
+    report: Dict[str, object] = {
+        "rows": args.rows,
+        "format": args.format,
+        "compress": args.compress,
+        "firstByteMs": round((first_byte or 0) * 1000, 3),
+        "seconds": round(elapsed, 3),
+        "rowsPerSecond": round(args.rows / elapsed),
+        "bytes": size,
+        "peakRssGrowthMb": round(max(peak, _rss_mb()) - baseline, 1),
+    }
+    if args.format == "ndjson":
+        report["resume"] = resume_check(args.rows)
+    return report
+
+
+def resume_check(total: int) -> Dict[str, int]:
+    """Drop the NDJSON export after half the rows and continue from the last cursor."""
+    from app import db, main
+
+    seen = set()
+    repeated = 0
+    cursor: Optional[str] = None
+    for attempt in range(2):
+        after = db.decode_cursor(cursor) if cursor else None
+        rows = db.iter_interface4_events(after=after, columns=main.NDJSON_COLUMNS)
+        for chunk in main._ndjson_stream(rows):
+            for line in chunk.decode("utf-8").splitlines():
+                record = json.loads(line)
+                if "cursor" not in record:
+                    continue
+                repeated += record["id"] in seen
+                seen.add(record["id"])
+                cursor = record["cursor"]
+            if attempt == 0 and len(seen) >= total // 2:
+                break  # the connection drops here
+    return {"received": len(seen), "missing": total - len(seen), "repeated": repeated}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure interface 4 export streaming.")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--format", default="xlsx", choices=("csv", "ndjson", "xlsx"))
+    parser.add_argument("--compress", choices=("gzip",), help="gzip the stream as the endpoint does")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        # db reads UNET_DATA_DIR at import time, so set it before importing the app.
+        os.environ["UNET_DATA_DIR"] = data_dir
+        report = run(args)
+    print(json.dumps(report, indent=2))
+    resume = report.get("resume")
+    return 1 if resume and (resume["missing"] or resume["repeated"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
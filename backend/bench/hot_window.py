@@ -0,0 +1,169 @@
+"""Interface 4 hot window benchmark.
+
+Run from the ``backend`` directory::
+
+    python -m bench.hot_window --history 200000 --recent 50000 --repeat 200
+
+Seeds ``--history`` old events plus ``--recent`` events spread over the last
+few hours (slightly out of order, several devices and statuses), then runs a
+set of list queries both through the hot window and straight against SQLite
+and checks they return the same pages and totals.  Times the default page
+with the result cache off, inserts a few events and checks the next page
+sees them.  Exits with status 1 when any answer differs or the default page
+p50 exceeds ``--budget-ms``.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+STATUSES = ("captured", "processing", "completed", "failed")
+
+# (name, query) pairs; the window answers the first group and defers the rest to SQLite.
+_QUERIES = [
+    ("default", {}),
+    ("status", {"status": "failed", "page": 2}),
+    ("device", {"device_id": "Line01"}),
+    ("statusDevice", {"status": "processing", "device_id": "Line03", "page": 3}),
+    ("lastTwoHours", {"start": "-2h", "end": "-1h", "page": 4, "page_size": 50}),
+    ("olderRange", {"start": "2024-01-03", "end": "2024-01-05"}),
+    ("deepPage", {"page": 5000, "page_size": 20}),
+    ("lastHourKeyword", {"keyword": "line02", "start": "-1h"}),
+    ("keywordAllTime", {"keyword": "EVT-0000"}),
+]
+
+
+def _seed_recent(count: int, now_ms: int, rng: random.Random) -> None:
+    from app import db
+
+    span = 5 * 3_600_000
+    payloads = [
+        {
+            "event_id": f"HOT-{index:07d}",
+            "device_id": f"Line{index % 6:02d}",
+            "status": STATUSES[rng.randrange(len(STATUSES))],
+            # Mostly in order, with some jitter as several writers would produce.
+            "triggered_at": db.format_ms(now_ms - span + index * span // count + rng.randint(-5000, 5000)),
+        }
+        for index in range(count)
+    ]
+    for start in range(0, count, 5000):
+        db.insert_interface4_events(payloads[start : start + 5000])
+
+
+def _resolve(query: Dict[str, object], now_ms: int) -> Dict[str, object]:
+    from app import db
+
+    resolved = dict(query)
+    for key in ("start", "end"):
+        value = resolved.get(key)
+        if isinstance(value, str) and value.startswith("-"):
+            resolved[key] = db.format_ms(now_ms - int(value[1:-1]) * 3_600_000)
+    return resolved
+
+
+def _params(query: Dict[str, object]) -> tuple:
+    """The positional key ``db`` uses for a list query."""
+    from app import db
+
+    start = query.get("start")
+    end = query.get("end")
+    return (
+        query.get("keyword"),
+        query.get("status"),
+        query.get("device_id"),
+        db.to_ms(str(start)) if start else None,
+        db.to_ms(str(end), end_of_day=True) if end else None,
+        int(query.get("page", 1)),
+        int(query.get("page_size", 20)),
+    )
+
+
+def run(args: argparse.Namespace) -> Dict[str, object]:
+    from app import db
+    from bench.export import seed
+
+    seed(args.history)
+    now_ms = db.now_ms()
+    _seed_recent(args.recent, now_ms, random.Random(11))
+    # Time the window itself, not the result cache in front of it.
+    db.EVENT_QUERY_CACHE.max_entries = 0
+
+    checks: Dict[str, Dict[str, object]] = {}
+    for name, query in _QUERIES:
+        resolved = _resolve(query, now_ms)
+        began = time.perf_counter()
+        answer = db.query_interface4_events(**resolved)
+        elapsed = (time.perf_counter() - began) * 1000
+        began = time.perf_counter()
+        expected = db._select_interface4_page(*_params(resolved))
+        sqlite_ms = (time.perf_counter() - began) * 1000
+        with db.HOT_WINDOW.lock:
+            served = db.HOT_WINDOW.page(*_params(resolved)) is not None
+        checks[name] = {
+            "total": answer["total"],
+            "servedFrom": "memory" if served else "sqlite",
+            "match": answer == expected,
+            "ms": round(elapsed, 3),
+            "sqliteMs": round(sqlite_ms, 3),
+        }
+
+    timings: List[float] = []
+    for _ in range(args.repeat):
+        began = time.perf_counter()
+        db.query_interface4_events(page=1, page_size=20)
+        timings.append((time.perf_counter() - began) * 1000)
+
+    total = db.query_interface4_events()["total"]
+    # Ahead of the seeded jitter, so they lead the first page.
+    late = db.format_ms(db.now_ms() + 10_000)
+    db.insert_interface4_events(
+        [{"event_id": f"LATE-{index}", "device_id": "Line01", "triggered_at": late} for index in range(3)]
+    )
+    page = db.query_interface4_events()
+    caught_up = page["total"] == total + 3 and page["items"][0]["event_id"].startswith("LATE-")
+
+    ordered = sorted(timings)
+    return {
+        "history": args.history,
+        "recent": args.recent,
+        "windowRows": len(db.HOT_WINDOW),
+        "queries": checks,
+        "defaultPageMs": {
+            "p50": round(statistics.median(ordered), 4),
+            "p99": round(ordered[max(0, int(len(ordered) * 0.99) - 1)], 4),
+        },
+        "caughtUpAfterInsert": caught_up,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare hot window answers and latency with SQLite.")
+    parser.add_argument("--history", type=int, default=200_000, help="events from long ago")
+    parser.add_argument("--recent", type=int, default=50_000, help="events in the last five hours")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--budget-ms", type=float, default=1.0, help="allowed default page p50")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        # db reads UNET_DATA_DIR at import time, so set it before importing the app.
+        os.environ["UNET_DATA_DIR"] = data_dir
+        report = run(args)
+    print(json.dumps(report, indent=2))
+    ok = (
+        all(check["match"] for check in report["queries"].values())
+        and report["caughtUpAfterInsert"]
+        and report["defaultPageMs"]["p50"] <= args.budget_ms
+    )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,384 @@
+"""Reproducible load test that replays dashboard, PLC and operator traffic.
+
+Run from the ``backend`` directory::
+
+    python -m bench.loadtest --duration 30 --dashboards 20 --output result.json
+    python -m bench.loadtest --baseline baseline.json --save-baseline   # record on this machine
+    python -m bench.loadtest --baseline baseline.json --threshold 0.2   # compare against it
+
+Latencies depend on the machine, so no baseline is committed: record one on
+the host the comparison will run on.  A ``--baseline`` file that does not
+exist is an error unless ``--save-baseline`` is given.
+By default the app is started with uvicorn in a subprocess on a free localhost
+port and an empty temporary data directory; ``--in-process`` runs it in a
+thread instead and ``--url`` targets a server that is already running.  The
+report is JSON; when a baseline is given, any endpoint whose p95/p99 latency or
+throughput regresses beyond the threshold makes the run exit with status 1.
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import http.client
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urlencode, urlsplit
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+DASHBOARD_ENDPOINTS = (
+    "/api/dashboard/overview",
+    "/api/monitoring/devices",
+    "/api/tasks",
+    "/api/alerts",
+    "/api/audit/logs",
+    "/api/integrations",
+)
+SEARCH_KEYWORDS = ("PA66", "ABS", "Hopper", "EVT", "料斗", "TPU")
+EVENT_STATUSES = ("captured", "processing", "completed", "failed")
+DEVICES = ("Hopper01", "Hopper02", "Hopper03", "Hopper05", "Hopper07", "Dryer01")
+
+
+@dataclass
+class Recorder:
+    """Latency samples per endpoint, shared by all virtual users."""
+
+    measuring: threading.Event = field(default_factory=threading.Event)
+    latencies: Dict[str, List[float]] = field(default_factory=lambda: defaultdict(list))
+    errors: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def record(self, name: str, seconds: float, ok: bool) -> None:
+        if not self.measuring.is_set():
+            return
+        with self.lock:
+            if ok:
+                self.latencies[name].append(seconds * 1000)
+            else:
+                self.errors[name] += 1
+
+
+class Session:
+    """One keep-alive connection with a bearer token, like a browser tab."""
+
+    def __init__(self, base_url: str, recorder: Recorder, username: str, password: str) -> None:
+        parts = urlsplit(base_url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 80
+        self.recorder = recorder
+        self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        self.token = ""
+        status, body = self.request("POST", "/api/auth/login", {"username": username, "password": password})
+        if status != 200:
+            raise RuntimeError(f"login failed with status {status}")
+        self.token = json.loads(body)["token"]
+
+    def request(self, method: str, path: str, payload: Optional[dict] = None, name: Optional[str] = None):
+        headers = {"Accept-Encoding": "gzip"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        body = None
+        if payload is not None:
+            body = json.dumps(payload).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        label = name or f"{method} {path.split('?', 1)[0]}"
+        started = time.perf_counter()
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            data = response.read()
+            status = response.status
+            if response.getheader("Content-Encoding") == "gzip":
+                data = gzip.decompress(data)
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.recorder.record(label, time.perf_counter() - started, False)
+            return 0, b""
+        self.recorder.record(label, time.perf_counter() - started, 200 <= status < 300)
+        return status, data
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def _sleep_until(deadline: float, stop: threading.Event) -> None:
+    remaining = deadline - time.perf_counter()
+    if remaining > 0:
+        stop.wait(remaining)
+
+
+def dashboard_user(session: Session, stop: threading.Event, interval: float, rng: random.Random) -> None:
+    next_run = time.perf_counter() + rng.uniform(0, interval)
+    while not stop.is_set():
+        _sleep_until(next_run, stop)
+        if stop.is_set():
+            break
+        for path in DASHBOARD_ENDPOINTS:
+            session.request("GET", path)
+        next_run += interval
+
+
+def plc_stream(session: Session, stop: threading.Event, rate: float, rng: random.Random) -> None:
+    if rate <= 0:
+        return
+    period = 1.0 / rate
+    next_run = time.perf_counter()
+    while not stop.is_set():
+        _sleep_until(next_run, stop)
+        if stop.is_set():
+            break
+        session.request(
+            "POST",
+            "/api/interface4/events",
+            {
+                "device_id": rng.choice(DEVICES),
+                "point_code": f"P{rng.randint(100, 999)}",
+                "material_code": rng.choice(("PA66", "ABS-UV", "PC+GF", "TPU")),
+                "produced_qty": round(rng.uniform(120, 560), 1),
+                "trigger_value": round(rng.random(), 3),
+                "trigger_source": rng.choice(("OPC_UA", "Modbus")),
+            },
+        )
+        next_run += period
+
+
+def operator_user(session: Session, stop: threading.Event, think_time: float, rng: random.Random) -> None:
+    while not stop.is_set():
+        action = rng.random()
+        if action < 0.6:
+            query = {"page": rng.randint(1, 5), "pageSize": rng.choice((10, 20, 50))}
+            session.request("GET", f"/api/interface4/events?{urlencode(query)}", name="GET /api/interface4/events [page]")
+        elif action < 0.9:
+            query = {"keyword": rng.choice(SEARCH_KEYWORDS), "pageSize": 20}
+            if rng.random() < 0.5:
+                query["status"] = rng.choice(EVENT_STATUSES)
+            session.request("GET", f"/api/interface4/events?{urlencode(query)}", name="GET /api/interface4/events [search]")
+        else:
+            session.request("GET", "/api/interface4/events/export")
+        stop.wait(rng.expovariate(1.0 / think_time) if think_time > 0 else 0)
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    rank = min(len(samples), max(1, math.ceil(fraction * len(samples))))
+    return samples[rank - 1]
+
+
+def summarize(recorder: Recorder, duration: float) -> Dict[str, object]:
+    endpoints: Dict[str, Dict[str, float]] = {}
+    names = sorted(set(recorder.latencies) | set(recorder.errors))
+    total_requests = 0
+    total_errors = 0
+    for name in names:
+        samples = sorted(recorder.latencies.get(name, []))
+        errors = recorder.errors.get(name, 0)
+        total_requests += len(samples) + errors
+        total_errors += errors
+        endpoints[name] = {
+            "requests": len(samples) + errors,
+            "errors": errors,
+            "throughput": round(len(samples) / duration, 3),
+            "mean": round(sum(samples) / len(samples), 3) if samples else 0.0,
+            "p50": round(percentile(samples, 0.50), 3),
+            "p95": round(percentile(samples, 0.95), 3),
+            "p99": round(percentile(samples, 0.99), 3),
+        }
+    return {
+        "durationSeconds": round(duration, 3),
+        "requests": total_requests,
+        "errors": total_errors,
+        "throughput": round((total_requests - total_errors) / duration, 3),
+        "endpoints": endpoints,
+    }
+
+
+def compare(report: Dict[str, object], baseline: Dict[str, object], threshold: float) -> List[str]:
+    """Return human-readable regressions of ``report`` against ``baseline``."""
+    regressions: List[str] = []
+    current = report["endpoints"]
+    for name, base in baseline.get("endpoints", {}).items():
+        stats = current.get(name)
+        if stats is None:
+            regressions.append(f"{name}: missing from this run")
+            continue
+        for key in ("p95", "p99"):
+            if base[key] and stats[key] > base[key] * (1 + threshold):
+                regressions.append(f"{name}: {key} {stats[key]:.1f}ms > baseline {base[key]:.1f}ms")
+        if base["throughput"] and stats["throughput"] < base["throughput"] * (1 - threshold):
+            regressions.append(
+                f"{name}: throughput {stats['throughput']:.1f}/s < baseline {base['throughput']:.1f}/s"
+            )
+        if stats["errors"] > base.get("errors", 0):
+            regressions.append(f"{name}: {stats['errors']} errors (baseline {base.get('errors', 0)})")
+    return regressions
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"server did not start on port {port}")
+
+
+def start_subprocess(port: int, data_dir: str) -> subprocess.Popen:
+    env = {**os.environ, "UNET_DATA_DIR": data_dir, "UNET_SEED_DEMO": "1"}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    _wait_for_port(port)
+    return process
+
+
+def start_in_process(port: int, data_dir: str):
+    os.environ["UNET_DATA_DIR"] = data_dir
+    os.environ["UNET_SEED_DEMO"] = "1"
+    sys.path.insert(0, str(BACKEND_DIR))
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config("app.main:app", host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="uvicorn", daemon=True)
+    thread.start()
+    _wait_for_port(port)
+    return server, thread
+
+
+def run(args: argparse.Namespace) -> Dict[str, object]:
+    recorder = Recorder()
+    stop = threading.Event()
+    sessions: List[Session] = []
+    workers: List[threading.Thread] = []
+
+    def spawn(target, *extra) -> None:
+        session = Session(args.url, recorder, args.username, args.password)
+        sessions.append(session)
+        rng = random.Random(args.seed * 1000 + len(workers))
+        workers.append(threading.Thread(target=target, args=(session, stop, *extra, rng), daemon=True))
+
+    for _ in range(args.dashboards):
+        spawn(dashboard_user, args.refresh_interval)
+    for _ in range(args.plc_streams):
+        spawn(plc_stream, args.plc_rate)
+    for _ in range(args.operators):
+        spawn(operator_user, args.think_time)
+
+    for worker in workers:
+        worker.start()
+    stop.wait(args.warmup)
+    recorder.measuring.set()
+    started = time.perf_counter()
+    stop.wait(args.duration)
+    recorder.measuring.clear()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for worker in workers:
+        worker.join(timeout=30)
+    for session in sessions:
+        session.close()
+
+    report = summarize(recorder, elapsed)
+    report["config"] = {
+        "dashboards": args.dashboards,
+        "refreshInterval": args.refresh_interval,
+        "plcStreams": args.plc_streams,
+        "plcRate": args.plc_rate,
+        "operators": args.operators,
+        "thinkTime": args.think_time,
+        "seed": args.seed,
+    }
+    return report
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="target an already running server instead of starting one")
+    parser.add_argument("--in-process", action="store_true", help="run uvicorn in a thread of this process")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds excluded from the report")
+    parser.add_argument("--dashboards", type=int, default=10, help="dashboards running the six-endpoint poll")
+    parser.add_argument("--refresh-interval", type=float, default=5.0, help="dashboard poll period in seconds")
+    parser.add_argument("--plc-streams", type=int, default=1, help="PLC streams posting interface 4 events")
+    parser.add_argument("--plc-rate", type=float, default=10.0, help="events per second per PLC stream")
+    parser.add_argument("--operators", type=int, default=3, help="users paging, searching and exporting")
+    parser.add_argument("--think-time", type=float, default=1.0, help="mean operator think time in seconds")
+    parser.add_argument("--seed", type=int, default=2024)
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--baseline", help="baseline report to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    if args.baseline and not args.save_baseline and not Path(args.baseline).exists():
+        # Checked before the run: a silently skipped comparison would pass any regression.
+        print(f"baseline {args.baseline} not found; record one with --save-baseline", file=sys.stderr)
+        return 2
+    process = None
+    server = None
+    with tempfile.TemporaryDirectory(prefix="unet-bench-") as data_dir:
+        if not args.url:
+            port = _free_port()
+            args.url = f"http://127.0.0.1:{port}"
+            if args.in_process:
+                server, _ = start_in_process(port, data_dir)
+            else:
+                process = start_subprocess(port, data_dir)
+        try:
+            report = run(args)
+        finally:
+            if server is not None:
+                server.should_exit = True
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=10)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+    if args.baseline and args.save_baseline:
+        Path(args.baseline).write_text(text + "\n", encoding="utf-8")
+        return 0
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        if baseline.get("config") != report["config"]:
+            print("WARNING baseline was recorded with a different traffic mix", file=sys.stderr)
+        regressions = compare(report, baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
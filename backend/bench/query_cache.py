@@ -0,0 +1,96 @@
+"""Interface 4 list query cache benchmark.
+
+Run from the ``backend`` directory::
+
+    python -m bench.query_cache --rows 200000 --repeat 200
+
+Seeds a throwaway database, then issues the same filtered page query
+``--repeat`` times with the cache disabled and enabled, inserting an event
+every ``--write-every`` queries.  Reports latency percentiles, the hit rate
+and how many queries reached SQLite.  Exits with status 1 when a query right
+after a write returns a stale total.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+
+def _measure(args: argparse.Namespace, enabled: bool) -> Dict[str, object]:
+    from app import db
+
+    db.EVENT_QUERY_CACHE.max_entries = 256 if enabled else 0
+    db.EVENT_QUERY_CACHE.clear()
+    # Compare the cache with SQLite itself; bench.hot_window covers the in-memory window.
+    db.HOT_WINDOW.max_rows = 0
+    select = db._select_interface4_page
+    reached = 0
+    stale = 0
+    timings: List[float] = []
+
+    def counting(*params):
+        nonlocal reached
+        reached += 1
+        return select(*params)
+
+    db._select_interface4_page = counting
+    try:
+        previous = None
+        for index in range(args.repeat):
+            wrote = bool(args.write_every and index and index % args.write_every == 0)
+            if wrote:
+                db.insert_interface4_events([{"event_id": f"BENCH-{enabled}-{index}", "status": "completed"}])
+            began = time.perf_counter()
+            result = db.query_interface4_events(status="completed", page=3, page_size=50)
+            timings.append(time.perf_counter() - began)
+            if wrote and result["total"] != previous + 1:
+                stale += 1
+            previous = result["total"]
+    finally:
+        db._select_interface4_page = select
+    ms = sorted(value * 1000 for value in timings)
+    return {
+        "p50Ms": round(statistics.median(ms), 4),
+        "p99Ms": round(ms[max(0, int(len(ms) * 0.99) - 1)], 4),
+        "reachedSqlite": reached,
+        "hitRate": round(1 - reached / args.repeat, 4),
+        "staleAfterWrite": stale,
+    }
+
+
+def run(args: argparse.Namespace) -> Dict[str, object]:
+    from bench.export import seed
+
+    seed(args.rows)
+    return {
+        "rows": args.rows,
+        "repeat": args.repeat,
+        "writeEvery": args.write_every,
+        "uncached": _measure(args, False),
+        "cached": _measure(args, True),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure the interface 4 list query cache.")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--write-every", type=int, default=50, help="insert an event every N queries (0: never)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        # db reads UNET_DATA_DIR at import time, so set it before importing the app.
+        os.environ["UNET_DATA_DIR"] = data_dir
+        report = run(args)
+    print(json.dumps(report, indent=2))
+    return 1 if report["cached"]["staleAfterWrite"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
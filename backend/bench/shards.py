@@ -0,0 +1,130 @@
+"""Sharded interface 4 ingest benchmark.
+
+Run from the ``backend`` directory::
+
+    python -m bench.shards --lines 4 --events 500
+
+One writer thread per production line inserts ``--events`` events one
+request at a time, first into a single database file and then with one shard
+per line, and then both again with the webhook outbox filled on every insert.
+Reports events per second for each run, checks that every outbox got one entry
+per event, and that paging through the sharded store returns exactly the rows
+of the merged export, in the same order.  Exits with status 1 when a check
+fails.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+def _ingest(args: argparse.Namespace) -> float:
+    from app import db
+
+    barrier = threading.Barrier(args.lines + 1)
+
+    def writer(line: int) -> None:
+        barrier.wait()
+        for index in range(args.events):
+            db.insert_interface4_event(
+                {
+                    "event_id": f"L{line}-{index:06d}",
+                    "device_id": f"Line{line}-Hopper{index % 4}",
+                    "status": "captured",
+                    "triggered_at": db.format_ms(1_700_000_000_000 + index * 1000 + line),
+                }
+            )
+
+    threads = [threading.Thread(target=writer, args=(line,)) for line in range(args.lines)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    began = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return args.lines * args.events / (time.perf_counter() - began)
+
+
+def _layout(root: Path, name: str, lines: int):
+    from app import shards
+
+    main = shards.Shard(shards.MAIN, root / f"{name}.sqlite3")
+    parts = [
+        shards.Shard(f"line{line}", root / f"{name}.line{line}.sqlite3", (f"Line{line}-*",)) for line in range(lines)
+    ]
+    return shards.ShardMap(main, parts)
+
+
+def _outbox_rows(layout) -> int:
+    from app import db
+
+    total = 0
+    for shard in layout.all:
+        with db.get_connection(path=shard.path) as conn:
+            total += conn.execute("SELECT COUNT(*) FROM webhook_outbox").fetchone()[0]
+    return total
+
+
+def run(args: argparse.Namespace, root: Path) -> Dict[str, object]:
+    from app import db, migrations
+
+    db.EVENT_QUERY_CACHE.max_entries = 0
+    report: Dict[str, object] = {"lines": args.lines, "eventsPerLine": args.events}
+    outboxes: Dict[str, int] = {}
+    for name, lines, outbox in (
+        ("singleWebhooks", 0, True),
+        ("shardedWebhooks", args.lines, True),
+        ("single", 0, False),
+        ("sharded", args.lines, False),
+    ):
+        db.SHARDS = _layout(root, name, lines)
+        db.OUTBOX_ENABLED = outbox
+        migrations.migrate()
+        report[f"{name}EventsPerSecond"] = round(_ingest(args))
+        if outbox:
+            outboxes[name] = _outbox_rows(db.SHARDS)
+    db.OUTBOX_ENABLED = False
+    report["speedup"] = round(report["shardedEventsPerSecond"] / report["singleEventsPerSecond"], 2)
+    report["webhooksSpeedup"] = round(
+        report["shardedWebhooksEventsPerSecond"] / report["singleWebhooksEventsPerSecond"], 2
+    )
+    report["outboxMatchesEvents"] = all(count == args.lines * args.events for count in outboxes.values())
+
+    exported = [row[0] for row in db.iter_interface4_events(columns=["event_id"])]
+    paged: List[str] = []
+    page = 1
+    while True:
+        items = db.query_interface4_events(page=page, page_size=args.page_size)["items"]
+        if not items:
+            break
+        paged.extend(item["event_id"] for item in items)
+        page += 1
+    report["rows"] = len(exported)
+    report["pagesMatchExport"] = paged == exported and len(set(exported)) == args.lines * args.events
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare single-file and per-line sharded event ingest.")
+    parser.add_argument("--lines", type=int, default=4)
+    parser.add_argument("--events", type=int, default=500, help="events inserted per line")
+    parser.add_argument("--page-size", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        # db reads UNET_DATA_DIR at import time, so set it before importing the app.
+        os.environ["UNET_DATA_DIR"] = data_dir
+        report = run(args, Path(data_dir))
+    print(json.dumps(report, indent=2))
+    return 0 if report["pagesMatchExport"] and report["outboxMatchesEvents"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""State snapshot save/load benchmark.
+
+Run from the ``backend`` directory::
+
+    python -m bench.snapshot --devices 1000 --runs 20
+
+Grows the live state to ``--devices`` devices with a full alert and audit
+list, raises alarms through the default rules, then times writing the
+snapshot and loading it back into a reset state.  Checks the restored state
+equals what was saved, that the alarm engine takes over the raised alarms
+without raising them again, and that a truncated or corrupted file is ignored.
+Exits with status 1 when a check fails or the p99 load exceeds
+``--budget-ms``.
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+def _grow_state(count: int) -> None:
+    from app import data
+
+    template = data.DEVICES[0]
+    data.DEVICES[:] = [
+        {
+            **copy.deepcopy(template),
+            "deviceId": f"Hopper{index:05d}",
+            "name": f"料斗 {index:05d}",
+            # Every tenth device runs hot enough to raise the temperature alarm.
+            "temperature": 130.0 if index % 10 == 0 else 80.0,
+            "lastHeartbeat": data._ts(),
+        }
+        for index in range(count)
+    ]
+    for index in range(60):
+        data.AUDIT_LOGS.insert(
+            0,
+            {
+                "logId": f"L{index:06d}",
+                "category": "系统",
+                "description": f"基准审计记录 {index}",
+                "actor": "system",
+                "timestamp": data._ts(),
+            },
+        )
+    del data.AUDIT_LOGS[50:]
+
+
+def _live() -> Dict[str, object]:
+    from app import data
+
+    return copy.deepcopy(
+        {
+            "devices": data.DEVICES,
+            "alerts": data.ALERTS,
+            "audits": data.AUDIT_LOGS,
+            "dashboard": data.DASHBOARD_STATE,
+            "integrations": data.INTEGRATIONS,
+        }
+    )
+
+
+def _reset() -> None:
+    from app import data
+
+    data.DEVICES[:] = []
+    data.ALERTS[:] = []
+    data.AUDIT_LOGS[:] = []
+    data.DASHBOARD_STATE.clear()
+
+
+def run(args: argparse.Namespace, root: Path) -> Dict[str, object]:
+    from app import alarms, data, snapshot
+
+    _grow_state(args.devices)
+    engine = alarms.AlarmEngine(alarms.DEFAULT_RULES)
+    now = time.time()
+    engine.evaluate(now=now)
+    engine.evaluate(now=now + 11)  # past the 10 s delay
+    raised = sum(1 for alert_id in engine.active if alert_id)
+    saved = _live()
+
+    path = root / "state.snapshot"
+    writer = snapshot.StateSnapshots(path, 5.0, engine)
+    save_ms: List[float] = []
+    load_ms: List[float] = []
+    for _ in range(args.runs):
+        began = time.perf_counter()
+        size = writer.save()
+        save_ms.append((time.perf_counter() - began) * 1000)
+    for _ in range(args.runs):
+        _reset()
+        reader = snapshot.StateSnapshots(path, 5.0, alarms.AlarmEngine(alarms.DEFAULT_RULES))
+        began = time.perf_counter()
+        loaded = reader.load()
+        load_ms.append((time.perf_counter() - began) * 1000)
+    restored_equal = loaded and _live() == saved
+
+    # The restarted engine adopts the raised alarms: nothing new on its next pass.
+    transitions = reader.alarm_engine.evaluate(now=now + 16)
+    adopted = sum(1 for alert_id in reader.alarm_engine.active if alert_id)
+
+    blob = path.read_bytes()
+    rejected = []
+    for name, damaged in (("truncated", blob[: len(blob) // 2]), ("flipped", blob[:-1] + bytes([blob[-1] ^ 1]))):
+        path.write_bytes(damaged)
+        _reset()
+        rejected.append(not snapshot.StateSnapshots(path, 5.0).load() and not data.DEVICES)
+    data.ALERTS.clear()
+
+    def summary(values: List[float]) -> Dict[str, float]:
+        ordered = sorted(values)
+        return {
+            "p50": round(statistics.median(ordered), 3),
+            "p99": round(ordered[max(0, int(len(ordered) * 0.99) - 1)], 3),
+        }
+
+    return {
+        "devices": args.devices,
+        "bytes": size,
+        "saveMs": summary(save_ms),
+        "loadMs": summary(load_ms),
+        "restoredEqual": restored_equal,
+        "alarmsRaised": raised,
+        "alarmsAdopted": adopted,
+        "transitionsAfterRestore": transitions,
+        "damagedRejected": all(rejected),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Time writing and restoring the state snapshot.")
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=50.0, help="allowed p99 load time")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        # db reads UNET_DATA_DIR at import time, so set it before importing the app.
+        os.environ["UNET_DATA_DIR"] = data_dir
+        report = run(args, Path(data_dir))
+    print(json.dumps(report, indent=2))
+    ok = (
+        report["restoredEqual"]
+        and report["alarmsAdopted"] == report["alarmsRaised"]
+        and report["transitionsAfterRestore"] == 0
+        and report["damagedRejected"]
+        and report["loadMs"]["p99"] <= args.budget_ms
+    )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""Startup-time benchmark for the API process.
+
+Run from the ``backend`` directory::
+
+    python -m bench.startup --runs 10 --budget-ms 50
+
+Each run is a fresh interpreter against one temporary data directory, so the
+first run pays for creating the schema and the rest measure a warm restart.
+Third-party imports (FastAPI, pydantic, uvicorn) and building the routes in
+``app.main`` are timed separately from the lifespan startup (migrations and
+background services), and the whole way from spawning the interpreter to the
+first ``200`` response for ``GET /`` is timed as well.  The warm medians are
+held to ``--budget-ms`` (lifespan), ``--import-budget-ms`` (``app.main``
+import) and ``--first-response-budget-ms`` (spawn to first response).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+async def _first_response(app) -> int:
+    """Status of ``GET /`` sent straight through the ASGI stack, without a server or client library."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/",
+        "raw_path": b"/",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 0),
+        "server": ("127.0.0.1", 80),
+    }
+    status = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await app(scope, receive, send)
+    return status[0]
+
+
+def child() -> None:
+    import asyncio
+
+    spawned = float(os.environ["UNET_BENCH_SPAWNED"])
+    started = time.perf_counter()
+    import fastapi  # noqa: F401
+    import pydantic  # noqa: F401
+    import uvicorn  # noqa: F401
+
+    frameworks = time.perf_counter()
+    from app.main import app
+
+    imported = time.perf_counter()
+
+    async def startup() -> Dict[str, float]:
+        async with app.router.lifespan_context(app):
+            ready = time.perf_counter()
+            if await _first_response(app) != 200:
+                raise SystemExit("GET / did not answer 200")
+            answered = time.time()
+        return {"lifespanMs": (ready - imported) * 1000, "firstResponseMs": (answered - spawned) * 1000}
+
+    timings = asyncio.run(startup())
+    print(
+        json.dumps(
+            {
+                "frameworkImportMs": (frameworks - started) * 1000,
+                "appImportMs": (imported - frameworks) * 1000,
+                **timings,
+            }
+        )
+    )
+
+
+def measure(runs: int) -> List[Dict[str, float]]:
+    samples = []
+    with tempfile.TemporaryDirectory(prefix="unet-startup-") as data_dir:
+        env = {**os.environ, "UNET_DATA_DIR": data_dir}
+        for _ in range(runs):
+            env["UNET_BENCH_SPAWNED"] = repr(time.time())
+            output = subprocess.run(
+                [sys.executable, "-m", "bench.startup", "--child"],
+                cwd=BACKEND_DIR,
+                env=env,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            samples.append(json.loads(output.strip().splitlines()[-1]))
+    return samples
+
+
+def summarize(samples: List[Dict[str, float]]) -> Dict[str, object]:
+    def stats(key: str, rows: List[Dict[str, float]]) -> Dict[str, float]:
+        values = [row[key] for row in rows]
+        return {"median": round(statistics.median(values), 3), "max": round(max(values), 3)}
+
+    warm = samples[1:] or samples
+    totals = [{"appStartupMs": row["appImportMs"] + row["lifespanMs"]} for row in warm]
+    return {
+        "runs": len(samples),
+        "cold": {key: round(value, 3) for key, value in samples[0].items()},
+        "warm": {
+            "frameworkImportMs": stats("frameworkImportMs", warm),
+            "appImportMs": stats("appImportMs", warm),
+            "lifespanMs": stats("lifespanMs", warm),
+            "appStartupMs": stats("appStartupMs", totals),
+            "firstResponseMs": stats("firstResponseMs", warm),
+        },
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure API cold and warm startup time.")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=50.0, help="max median lifespan startup time")
+    parser.add_argument("--import-budget-ms", type=float, default=150.0, help="max median app.main import time")
+    parser.add_argument(
+        "--first-response-budget-ms",
+        type=float,
+        default=400.0,
+        help="max median time from spawning the interpreter to the first 200 response",
+    )
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child()
+        return 0
+
+    report = summarize(measure(max(1, args.runs)))
+    report["budgetMs"] = {
+        "lifespan": args.budget_ms,
+        "appImport": args.import_budget_ms,
+        "firstResponse": args.first_response_budget_ms,
+    }
+    print(json.dumps(report, indent=2))
+    failures = []
+    if report["warm"]["lifespanMs"]["median"] > args.budget_ms:
+        failures.append(f"lifespan {report['warm']['lifespanMs']['median']:.1f}ms > {args.budget_ms:.1f}ms")
+    if report["warm"]["appImportMs"]["median"] > args.import_budget_ms:
+        failures.append(f"import {report['warm']['appImportMs']['median']:.1f}ms > {args.import_budget_ms:.1f}ms")
+    first = report["warm"]["firstResponseMs"]["median"]
+    if first > args.first_response_budget_ms:
+        failures.append(f"first response {first:.1f}ms > {args.first_response_budget_ms:.1f}ms")
+    for line in failures:
+        print(f"startup budget exceeded: {line}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""Task plan import benchmark.
+
+Run from the ``backend`` directory::
+
+    python -m bench.tasks --tasks 1000
+
+Imports a ``--tasks`` plan through ``POST /api/tasks/batch`` against a fresh
+database, then re-submits it to check the whole batch is rejected with 409
+and nothing is written twice.  Pages through ``GET /api/tasks`` filtered by
+target device and checks the pages add up to that device's share of the plan,
+latest scheduled first.  Exits with status 1 when any check fails or the
+import exceeds ``--budget-ms``.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+
+def _plan(count: int) -> List[Dict[str, object]]:
+    return [
+        {
+            "taskId": f"P{index:06d}",
+            "materialCode": ("PA66", "ABS-UV", "PC+GF", "TPU")[index % 4],
+            "targetDevice": f"Hopper{index % 8 + 1:02d}",
+            "quantity": 100 + index % 500,
+            "priority": ("low", "medium", "high")[index % 3],
+            "scheduledAt": f"2024-05-{index % 28 + 1:02d}T{index % 24:02d}:{index % 60:02d}:00Z",
+        }
+        for index in range(count)
+    ]
+
+
+def run(args: argparse.Namespace) -> Dict[str, object]:
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    plan = _plan(args.tasks)
+    with TestClient(app) as client:
+        login = client.post("/api/auth/login", json={"username": "admin", "password": "admin123"})
+        headers = {"Authorization": f"Bearer {login.json()['token']}"}
+        began = time.perf_counter()
+        response = client.post("/api/tasks/batch", json={"source": "ERP", "tasks": plan}, headers=headers)
+        import_ms = (time.perf_counter() - began) * 1000
+        response.raise_for_status()
+        imported = response.json()["imported"]
+
+        repeat = client.post("/api/tasks/batch", json={"source": "ERP", "tasks": plan[:10]}, headers=headers)
+
+        device = "Hopper01"
+        expected = sorted(
+            (task for task in plan if task["targetDevice"] == device),
+            key=lambda task: (task["scheduledAt"], task["taskId"]),
+            reverse=True,
+        )
+        paged: List[str] = []
+        page = 1
+        began = time.perf_counter()
+        while True:
+            body = client.get(
+                "/api/tasks", params={"targetDevice": device, "page": page, "pageSize": args.page_size}, headers=headers
+            ).json()
+            if not body["items"]:
+                break
+            paged.extend(item["taskId"] for item in body["items"])
+            page += 1
+        page_ms = (time.perf_counter() - began) * 1000 / max(page - 1, 1)
+        total = client.get("/api/tasks", params={"pageSize": 1}, headers=headers).json()["total"]
+    return {
+        "tasks": args.tasks,
+        "imported": imported,
+        "importMs": round(import_ms, 1),
+        "duplicateStatus": repeat.status_code,
+        "storedTotal": total,
+        "pageMs": round(page_ms, 2),
+        "pagesMatchPlan": paged == [task["taskId"] for task in expected],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Time a batch task plan import.")
+    parser.add_argument("--tasks", type=int, default=1000)
+    parser.add_argument("--page-size", type=int, default=30)
+    parser.add_argument("--budget-ms", type=float, default=500.0, help="allowed time for the import request")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        # db reads UNET_DATA_DIR at import time, so set it before importing the app.
+        os.environ["UNET_DATA_DIR"] = data_dir
+        report = run(args)
+    print(json.dumps(report, indent=2))
+    ok = (
+        report["imported"] == args.tasks
+        and report["storedTotal"] == args.tasks
+        and report["duplicateStatus"] == 409
+        and report["pagesMatchPlan"]
+        and report["importMs"] <= args.budget_ms
+    )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
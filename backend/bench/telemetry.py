@@ -0,0 +1,190 @@
+"""Telemetry tier benchmark.
+
+Run from the ``backend`` directory::
+
+    python -m bench.telemetry --devices 20 --days 10 --repeat 50
+
+Simulates ``--days`` of 5-second samples for ``--devices`` devices with short
+retentions (raw 6 h, minutes 2 days, hours a year), writing an hour of
+samples at a time and compacting after each simulated hour.  Records the row
+count of every tier at the end of each day, which stops growing once the
+retention is reached, then runs trend queries over different windows and
+resolutions, checks each picked the expected tier and that every returned
+min/avg/max equals the one computed from the raw samples, and times them.
+Also times writing one acquisition cycle and a steady-state compaction pass.
+Exits with status 1 when a check fails or a query p50 exceeds ``--budget-ms``.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+HOUR_MS = 3_600_000
+INTERVAL_MS = 5_000
+
+# (name, window in hours before the end, resolution in seconds, expected tier)
+_QUERIES = [
+    ("lastHourRaw", 1, 5, "raw"),
+    ("lastThreeHours", 3, 60, "minute"),
+    ("lastDay", 24, 300, "minute"),
+    ("lastDayHourly", 24, 3600, "hour"),
+    ("lastWeek", 24 * 7, 1800, "hour"),
+]
+
+
+def _simulate(store, devices: List[Dict[str, object]], start_ms: int, hours: int, rng: random.Random, kept: list):
+    sizes = []
+    for hour in range(hours):
+        begin = start_ms + hour * HOUR_MS
+        for at in range(begin, begin + HOUR_MS, INTERVAL_MS):
+            for device in devices:
+                device["temperature"] = round(min(120.0, max(30.0, device["temperature"] + rng.uniform(-0.8, 0.9))), 1)
+                device["level"] = max(0, min(100, device["level"] + rng.randint(-4, 4)))
+                device["throughput"] = round(max(0.0, device["throughput"] + rng.uniform(-4, 5)), 1)
+                device["lastHeartbeat"] = at
+            store.sample(devices, at)
+            kept.append((at, devices[0]["temperature"]))
+        store.flush()
+        store.compact(now_ms=begin + HOUR_MS)
+        if (hour + 1) % 24 == 0:
+            sizes.append(_sizes(store.tiers))
+    return sizes
+
+
+def _sizes(tiers) -> Dict[str, int]:
+    from app import db
+
+    with db.get_connection() as conn:
+        return {tier.name: conn.execute(f"SELECT COUNT(*) FROM {tier.table}").fetchone()[0] for tier in tiers}
+
+
+def _expected(kept: List[Tuple[int, float]], lo: int, hi: int, step: int) -> Dict[int, Tuple[int, float, float, float]]:
+    buckets: Dict[int, List[float]] = {}
+    for at, value in kept:
+        if lo <= at < hi:
+            buckets.setdefault(at // step * step, []).append(value)
+    return {at: (len(values), min(values), sum(values) / len(values), max(values)) for at, values in buckets.items()}
+
+
+def run(args: argparse.Namespace) -> Dict[str, object]:
+    from app import db, migrations, telemetry
+
+    migrations.migrate()
+    config = telemetry.TelemetryConfig.from_dict({"retentionDays": {"raw": 0.25, "minute": 2, "hour": 365}})
+    store = telemetry.TelemetryStore(config)
+    rng = random.Random(7)
+    devices = [
+        {"deviceId": f"Hopper{index:03d}", "temperature": 80.0, "level": 50, "throughput": 100.0}
+        for index in range(args.devices)
+    ]
+    end_ms = db.now_ms() // HOUR_MS * HOUR_MS
+    start_ms = end_ms - args.days * 24 * HOUR_MS
+    kept: List[Tuple[int, float]] = []
+    began = time.perf_counter()
+    daily = _simulate(store, devices, start_ms, args.days * 24, rng, kept)
+    simulate_s = time.perf_counter() - began
+
+    # One more cycle past the last compaction, so queries also fill from raw.
+    for device in devices:
+        device["lastHeartbeat"] = end_ms
+    store.sample(devices, end_ms)
+    kept.append((end_ms, devices[0]["temperature"]))
+    cycle_ms: List[float] = []
+    for offset in range(1, args.repeat + 1):
+        at = end_ms + offset * INTERVAL_MS
+        for device in devices:
+            device["lastHeartbeat"] = at
+        store.sample(devices, at)
+        kept.append((at, devices[0]["temperature"]))
+        began = time.perf_counter()
+        store.flush()
+        cycle_ms.append((time.perf_counter() - began) * 1000)
+    now = end_ms + (args.repeat + 1) * INTERVAL_MS
+    began = time.perf_counter()
+    store.compact(now_ms=now + 60_000)
+    compact_ms = (time.perf_counter() - began) * 1000
+
+    checks: Dict[str, Dict[str, object]] = {}
+    for name, hours, resolution, tier in _QUERIES:
+        lo, hi = now - hours * HOUR_MS, now
+        lo -= lo % HOUR_MS
+        timings: List[float] = []
+        for _ in range(args.repeat):
+            began = time.perf_counter()
+            answer = telemetry.history(
+                "Hopper000", "temperature", lo, hi, resolution * 1000, now_ms=now, tiers=store.tiers
+            )
+            timings.append((time.perf_counter() - began) * 1000)
+        step = max(resolution * 1000, next(item.step_ms for item in store.tiers if item.name == answer["tier"]))
+        expected = _expected(kept, lo, hi, step)
+        got = {
+            db.to_ms(point["at"]): (point["samples"], point["min"], point["avg"], point["max"])
+            for point in answer["points"]
+        }
+        match = set(got) == set(expected) and all(
+            got[at][0] == want[0]
+            and abs(got[at][1] - want[1]) < 1e-6
+            and abs(got[at][2] - want[2]) < 1e-3
+            and abs(got[at][3] - want[3]) < 1e-6
+            for at, want in expected.items()
+        )
+        checks[name] = {
+            "tier": answer["tier"],
+            "expectedTier": tier,
+            "points": len(answer["points"]),
+            "match": match,
+            "p50Ms": round(statistics.median(timings), 3),
+        }
+
+    try:
+        telemetry.history("Hopper000", "temperature", now - 30 * 24 * HOUR_MS, now, 1000, now_ms=now, tiers=store.tiers)
+        rejected = False
+    except ValueError:
+        rejected = True
+
+    return {
+        "devices": args.devices,
+        "days": args.days,
+        "simulateSeconds": round(simulate_s, 1),
+        "rowsAtEndOfDay": daily,
+        "cycleFlushMs": round(statistics.median(cycle_ms), 3),
+        "compactMs": round(compact_ms, 3),
+        "queries": checks,
+        "tooManyPointsRejected": rejected,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check telemetry rollups, retention and tier choice.")
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--days", type=int, default=10, help="simulated days; at least 4 for the flatness check")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--budget-ms", type=float, default=20.0, help="allowed query p50")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        # db reads UNET_DATA_DIR at import time, so set it before importing the app.
+        os.environ["UNET_DATA_DIR"] = data_dir
+        report = run(args)
+    print(json.dumps(report, indent=2))
+    daily = report["rowsAtEndOfDay"]
+    # Raw and minute rows stop growing once their retention is reached; hours keep growing until theirs.
+    flat = len(daily) >= 4 and all(daily[-1][name] == daily[-2][name] for name in ("raw", "minute"))
+    ok = (
+        flat
+        and report["tooManyPointsRejected"]
+        and all(check["match"] and check["tier"] == check["expectedTier"] for check in report["queries"].values())
+        and all(check["p50Ms"] <= args.budget_ms for check in report["queries"].values())
+    )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
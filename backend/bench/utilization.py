@@ -0,0 +1,106 @@
+"""Equipment-utilization report benchmark.
+
+Run from the ``backend`` directory::
+
+    python -m bench.utilization --devices 200 --days 62 --mean-minutes 20
+
+Seeds a throwaway database with a synthetic status history (a change every
+``--mean-minutes`` on average per device), then times the monthly report for
+all devices against a plain scan that clips every interval row to the
+window.  Exits with status 1 when the two disagree.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+_SCAN_SQL = """
+    SELECT device_id, status, SUM(MIN(COALESCE(ended_at, :hi), :hi) - MAX(started_at, :lo))
+    FROM device_status_intervals
+    WHERE started_at < :hi AND COALESCE(ended_at, :hi) > :lo
+    GROUP BY device_id, status
+"""
+
+
+def seed(args: argparse.Namespace, now: float) -> int:
+    from app import utilization
+
+    rng = random.Random(3)
+    transitions = 0
+    for index in range(args.devices):
+        at = now - args.days * 86400
+        changes = []
+        while at < now:
+            changes.append((f"Hopper{index:03d}", rng.choices(("online", "maintenance", "offline"), (8, 1, 1))[0], at))
+            at += rng.expovariate(1 / (args.mean_minutes * 60))
+        transitions += utilization.record_transitions(changes)
+    return transitions
+
+
+def run(args: argparse.Namespace) -> Dict[str, object]:
+    from app import db, migrations, utilization
+
+    migrations.migrate()
+    now = time.time()
+    transitions = seed(args, now)
+    start, end = now - 30 * 86400 - 3600 * 7.5, now
+
+    timings: List[float] = []
+    for _ in range(args.repeat):
+        began = time.perf_counter()
+        report = utilization.status_seconds(start, end, now=now)
+        timings.append(time.perf_counter() - began)
+
+    began = time.perf_counter()
+    with db.get_connection() as conn:
+        scanned: Dict[str, Dict[str, float]] = {}
+        for device_id, status, seconds in conn.execute(_SCAN_SQL, {"lo": start, "hi": end}):
+            scanned.setdefault(device_id, {})[status] = seconds
+        rows = conn.execute("SELECT COUNT(*) FROM device_status_intervals").fetchone()[0]
+        daily = conn.execute("SELECT COUNT(*) FROM device_status_daily").fetchone()[0]
+    scan_seconds = time.perf_counter() - began
+
+    worst = max(
+        abs(report.get(device, {}).get(status, 0.0) - seconds)
+        for device, statuses in scanned.items()
+        for status, seconds in statuses.items()
+    )
+    return {
+        "devices": args.devices,
+        "transitions": transitions,
+        "intervalRows": rows,
+        "dailyRows": daily,
+        "reportMs": {
+            "p50": round(statistics.median(timings) * 1000, 3),
+            "max": round(max(timings) * 1000, 3),
+        },
+        "fullScanMs": round(scan_seconds * 1000, 3),
+        "maxDifferenceSeconds": round(worst, 6),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Time the monthly utilization report.")
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--days", type=int, default=62, help="length of the seeded history")
+    parser.add_argument("--mean-minutes", type=float, default=20.0, help="average time between status changes")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        # db reads UNET_DATA_DIR at import time, so set it before importing the app.
+        os.environ["UNET_DATA_DIR"] = data_dir
+        report = run(args)
+    print(json.dumps(report, indent=2))
+    return 0 if report["maxDifferenceSeconds"] < 0.01 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""Webhook fan-out benchmark against the local stand-in receiver.
+
+Run from the ``backend`` directory::
+
+    python -m bench.webhook_fanout --events 5000 --slow-ms 500
+
+Uses a throwaway database, starts ``tools.webhook_receiver`` and the
+dispatcher in one event loop and ingests events while the subscribers
+listen: a fast one, a slow one, a flaky one (half its batches fail), one
+pointing at a closed port and ``--hung`` that answer only after the client
+timeout.  Reports ingest latency, how long each healthy subscriber took to
+catch up and the lag left on the others.  Exits with status 1 when the fast
+subscriber does not receive every event, e.g. because hung subscribers held
+up its deliveries.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+
+async def run(args: argparse.Namespace) -> Dict[str, object]:
+    import uvicorn
+
+    from app import db, migrations, webhooks
+    from tools.webhook_receiver import Receiver
+
+    migrations.migrate()
+    hung = [f"hung{index}" for index in range(args.hung)]
+    latency = {"slow": args.slow_ms / 1000, **{name: 5.0 for name in hung}}
+    receiver = Receiver(latency=latency, fail_rate={"flaky": 0.5})
+    server = uvicorn.Server(uvicorn.Config(receiver.app, host="127.0.0.1", port=args.port, log_level="error"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    base = f"http://127.0.0.1:{args.port}/hook"
+    config = webhooks.WebhookConfig(
+        subscribers=[
+            webhooks.SubscriberConfig("fast", f"{base}/fast", batch_size=args.batch_size),
+            webhooks.SubscriberConfig("slow", f"{base}/slow", batch_size=args.batch_size),
+            webhooks.SubscriberConfig("flaky", f"{base}/flaky", batch_size=args.batch_size),
+            webhooks.SubscriberConfig("dead", "http://127.0.0.1:9/hook", batch_size=args.batch_size),
+            *(webhooks.SubscriberConfig(name, f"{base}/{name}", batch_size=args.batch_size) for name in hung),
+        ],
+        timeout=2.0,
+        backoff_initial=0.2,
+        backoff_max=2.0,
+    )
+    dispatcher = webhooks.WebhookDispatcher(config)
+    dispatching = asyncio.create_task(dispatcher.run())
+    await asyncio.sleep(0.1)
+
+    ingest: List[float] = []
+    started = time.perf_counter()
+    for offset in range(0, args.events, args.ingest_batch):
+        records = [
+            {"event_id": f"BENCH-{index:07d}", "device_id": "Hopper01", "trigger_value": index}
+            for index in range(offset, min(offset + args.ingest_batch, args.events))
+        ]
+        began = time.perf_counter()
+        await asyncio.to_thread(db.insert_interface4_events, records)
+        ingest.append(time.perf_counter() - began)
+    ingested = time.perf_counter() - started
+
+    caught_up: Dict[str, float] = {}
+    deadline = time.perf_counter() + args.wait
+    while time.perf_counter() < deadline and len(caught_up) < 3:
+        for subscriber in dispatcher.subscribers:
+            name = subscriber.config.name
+            if name not in caught_up and subscriber.delivered >= args.events:
+                caught_up[name] = round(time.perf_counter() - started, 3)
+        await asyncio.sleep(0.02)
+
+    status = {item["name"]: item for item in dispatcher.status()}
+    await dispatcher.close()
+    await dispatching
+    outbox_stopped = not db.OUTBOX_ENABLED
+    server.should_exit = True
+    await serving
+
+    ingest_ms = sorted(value * 1000 for value in ingest)
+    received = receiver.snapshot()
+    return {
+        "events": args.events,
+        "ingestSeconds": round(ingested, 3),
+        "ingestBatchMs": {
+            "p50": round(statistics.median(ingest_ms), 3),
+            "max": round(ingest_ms[-1], 3),
+        },
+        "caughtUpSeconds": caught_up,
+        "outboxStoppedAfterClose": outbox_stopped,
+        "subscribers": {
+            name: {
+                "delivered": item["deliveredEvents"],
+                "pending": item["pendingEvents"],
+                "lagSeconds": item["lagSeconds"],
+                "failures": item["consecutiveFailures"],
+                "duplicates": received.get(name, {}).get("duplicates", 0),
+            }
+            for name, item in status.items()
+        },
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure webhook fan-out delivery and lag.")
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--ingest-batch", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=200, help="events per webhook batch")
+    parser.add_argument("--hung", type=int, default=4, help="subscribers that answer after the timeout")
+    parser.add_argument("--slow-ms", type=float, default=500.0)
+    parser.add_argument("--port", type=int, default=18081)
+    parser.add_argument("--wait", type=float, default=30.0, help="seconds to wait for delivery")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        # db reads UNET_DATA_DIR at import time, so set it before importing the app.
+        os.environ["UNET_DATA_DIR"] = data_dir
+        report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    ok = report["subscribers"]["fast"]["delivered"] >= args.events and report["outboxStoppedAfterClose"]
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+"""Shared fixtures.  Run from the ``backend`` directory with ``python -m pytest``."""
+from __future__ import annotations
+
+import os
+import tempfile
+
+import pytest
+
+# app.db reads UNET_DATA_DIR at import time, so point it somewhere disposable first.
+os.environ.setdefault("UNET_DATA_DIR", tempfile.mkdtemp(prefix="unet-tests-"))
+
+from app import db, migrations, shards  # noqa: E402
+
+
+@pytest.fixture
+def layout(tmp_path, monkeypatch):
+    """Build a fresh store in ``tmp_path`` with one shard per line, ``Line<n>-*`` devices going to line ``n``."""
+
+    def build(lines: int = 0) -> shards.ShardMap:
+        main = shards.Shard(shards.MAIN, tmp_path / "events.sqlite3")
+        parts = [
+            shards.Shard(f"line{line}", tmp_path / f"events.line{line}.sqlite3", (f"Line{line}-*",))
+            for line in range(lines)
+        ]
+        monkeypatch.setattr(db, "DB_DIR", tmp_path)
+        monkeypatch.setattr(db, "DB_PATH", main.path)
+        monkeypatch.setattr(db, "SHARDS", shards.ShardMap(main, parts))
+        migrations.migrate()
+        db.EVENT_QUERY_CACHE.clear()
+        db.HOT_WINDOW.clear()
+        return db.SHARDS
+
+    monkeypatch.setattr(db.EVENT_QUERY_CACHE, "max_entries", 0)
+    yield build
+    db.HOT_WINDOW.clear()
+    db.close_connections()
+
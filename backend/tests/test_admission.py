@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import asyncio
+
+from app import admission
+
+
+def _lane(**overrides) -> admission.Lane:
+    config = {"name": "test", "max_concurrency": 1, "max_per_client": 2, "queue_size": 1, "queue_timeout": 0.05}
+    return admission.Lane(admission.LaneConfig(**{**config, **overrides}))
+
+
+def test_limits_reject_with_429_and_503():
+    async def scenario() -> None:
+        lane = _lane(max_concurrency=1, max_per_client=1)
+        assert await lane.acquire("a") is None
+        assert (await lane.acquire("a")).status_code == 429
+        queued = asyncio.ensure_future(lane.acquire("b"))
+        await asyncio.sleep(0)
+        assert (await lane.acquire("c")).reason == "queue_full"
+        assert (await queued).reason == "queue_timeout"
+        assert lane.active == 1 and lane.per_client == {"a": 1}
+
+    asyncio.run(scenario())
+
+
+def test_queued_request_gets_the_released_slot():
+    async def scenario() -> None:
+        lane = _lane(queue_timeout=1.0)
+        assert await lane.acquire("a") is None
+        queued = asyncio.ensure_future(lane.acquire("b"))
+        await asyncio.sleep(0)
+        lane.release("a")
+        assert await queued is None
+        assert lane.active == 1 and lane.per_client == {"b": 1}
+
+    asyncio.run(scenario())
+
+
+def test_slot_handed_over_as_the_wait_times_out_is_not_leaked(monkeypatch):
+    async def late_wait_for(future, timeout):
+        # What wait_for may do on Python 3.12+: the result is set, yet it still times out.
+        await future
+        raise asyncio.TimeoutError
+
+    monkeypatch.setattr(admission.asyncio, "wait_for", late_wait_for)
+
+    async def scenario() -> None:
+        lane = _lane()
+        assert await lane.acquire("a") is None
+        queued = asyncio.ensure_future(lane.acquire("b"))
+        await asyncio.sleep(0)
+        lane.release("a")
+        assert await queued is None
+        assert lane.active == 1
+        lane.release("b")
+        assert lane.active == 0 and not lane.per_client
+
+    asyncio.run(scenario())
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import pytest
+
+from app import data
+from app.alarms import AlarmEngine, Rule
+
+
+@pytest.fixture(autouse=True)
+def alerts(monkeypatch):
+    monkeypatch.setattr(data, "ALERTS", [])
+    monkeypatch.setattr(data, "UNREACHABLE", set())
+    return data.ALERTS
+
+
+def _devices(**temperatures):
+    return [
+        {"deviceId": device_id, "name": device_id, "status": "online", "temperature": value}
+        for device_id, value in temperatures.items()
+    ]
+
+
+def _run(engine, devices, device_id, samples):
+    # samples: (time, temperature); returns the alarms raised on the device after each tick
+    device = next(device for device in devices if device["deviceId"] == device_id)
+    raised = []
+    for at, value in samples:
+        device["temperature"] = value
+        engine.evaluate(devices, at)
+        raised.append(bool(device.get("alarms")))
+    return raised
+
+
+def test_high_alarm_waits_for_its_delay_and_clears_past_the_hysteresis(alerts):
+    engine = AlarmEngine([Rule("high", "temperature", limit=100, hysteresis=5, delay=10, name="温度过高")])
+    devices = _devices(Hopper01=20.0)
+    samples = [(0, 105.0), (5, 106.0), (10, 104.0), (11, 97.0), (12, None), (13, 94.0)]
+    assert _run(engine, devices, "Hopper01", samples) == [False, False, True, True, True, False]
+    assert alerts == []
+
+    # Dropping below the limit restarts the delay.
+    assert _run(engine, devices, "Hopper01", [(20, 105.0), (25, 99.0), (31, 105.0), (35, 105.0)]) == [False] * 4
+    assert _run(engine, devices, "Hopper01", [(41, 101.0)]) == [True]
+    (alert,) = alerts
+    assert (alert["deviceId"], alert["severity"]) == ("Hopper01", "warning")
+    assert alert["message"] == "Hopper01温度过高：101（限值 100）"
+
+
+def test_low_rules_apply_to_matching_devices_only():
+    engine = AlarmEngine([Rule("low", "level", limit=10, hysteresis=3, devices=("Hopper*",))])
+    devices = [{"deviceId": "Hopper01", "level": 5.0}, {"deviceId": "Vacuum01", "level": 5.0}]
+    assert engine.evaluate(devices, 0) == 1
+    assert devices[0]["alarms"] == ["level低于下限"] and "alarms" not in devices[1]
+    devices[0]["level"] = 12.0
+    assert engine.evaluate(devices, 1) == 0
+    devices[0]["level"] = 13.5
+    assert engine.evaluate(devices, 2) == 1
+    assert devices[0]["alarms"] == []
+
+
+def test_offline_and_comm_alarms(alerts):
+    engine = AlarmEngine([Rule("offline", severity="critical"), Rule("comm", severity="critical")])
+    devices = _devices(Hopper01=20.0)
+    devices[0]["status"] = "offline"
+    data.UNREACHABLE.add("Hopper01")
+    assert engine.evaluate(devices, 0) == 2
+    assert [alert["message"] for alert in alerts] == ["Hopper01通讯故障", "Hopper01设备离线"]
+    devices[0]["status"] = "online"
+    data.UNREACHABLE.clear()
+    assert engine.evaluate(devices, 1) == 2
+    assert alerts == []
+
+
+def test_raised_alarms_survive_a_restore(alerts):
+    rules = [Rule("high", "temperature", limit=100)]
+    engine = AlarmEngine(rules)
+    devices = _devices(Hopper01=120.0, Hopper02=20.0)
+    assert engine.evaluate(devices, 0) == 1
+    state = engine.state()
+    assert [row[0] for row in state["raised"]] == ["Hopper01"]
+
+    restarted = AlarmEngine(rules)
+    restarted.restore(state)
+    # The still-listed alert is taken over rather than raised a second time, and clears as usual.
+    assert restarted.evaluate(devices, 1) == 0
+    assert len(alerts) == 1
+    devices[0]["temperature"] = 90.0
+    assert restarted.evaluate(devices, 2) == 1
+    assert alerts == [] and devices[0]["alarms"] == []
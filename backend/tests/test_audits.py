@@ -0,0 +1,11 @@
+from __future__ import annotations
+
+from app import data
+
+
+def test_audits_in_the_same_second_get_distinct_ids(monkeypatch):
+    monkeypatch.setattr(data, "AUDIT_LOGS", [])
+    for index in range(5):
+        data._audit_task(f"任务 T{index} 已自动标记完成", "system", "2024-05-01T08:00:00Z")
+    ids = [log["logId"] for log in data.AUDIT_LOGS]
+    assert len(set(ids)) == 5
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from app.changedetect import ChangeDetector
+from app.pointtable import Point
+
+
+def _run(detector, field, samples):
+    # samples: (time, value); returns the (time, value) pairs that came out as changes
+    return [(change.at, change.value) for at, value in samples for change in detector.evaluate({field: value}, at)]
+
+
+def test_first_sample_is_only_a_baseline():
+    detector = ChangeDetector([Point("level", 1, events=True), Point("quiet", 2)])
+    assert detector.points[0].field == "level" and len(detector.points) == 1
+    assert detector.evaluate({"level": 50}, 0.0) == []
+    assert not ChangeDetector([Point("quiet", 2)])
+
+
+def test_absolute_deadband_measures_from_the_last_emit():
+    detector = ChangeDetector([Point("level", 1, events=True, deadband=2.0)])
+    # Creeping up by 1 per cycle: nothing until the drift from 50 exceeds 2.
+    assert _run(detector, "level", [(0, 50), (1, 51), (2, 52), (3, 53), (4, 54), (5, 55.5), (6, None)]) == [
+        (3, 53),
+        (5, 55.5),
+    ]
+
+
+def test_percent_deadband_uses_span_or_value():
+    of_value = ChangeDetector([Point("t", 0, events=True, deadband_percent=10)])
+    assert _run(of_value, "t", [(0, 200), (1, 215), (2, 221)]) == [(2, 221)]
+    of_span = ChangeDetector([Point("t", 0, events=True, deadband_percent=1, span=100)])
+    assert _run(of_span, "t", [(0, 200), (1, 201), (2, 202)]) == [(2, 202)]
+
+
+def test_hysteresis_applies_when_direction_reverses():
+    detector = ChangeDetector([Point("level", 1, events=True, deadband=1.0, hysteresis=2.0)])
+    assert _run(detector, "level", [(0, 10), (1, 12), (2, 14), (3, 12), (4, 10.5)]) == [(1, 12), (2, 14), (4, 10.5)]
+
+
+def test_min_interval_holds_changes_until_due():
+    detector = ChangeDetector([Point("level", 1, events=True, deadband=1.0, min_interval=10)])
+    # The change at 3 is held back, then re-evaluated and emitted once the interval has passed.
+    assert _run(detector, "level", [(0, 10), (3, 20), (6, 25), (11, 25)]) == [(11, 25)]
+
+
+def test_discrete_points_emit_every_edge():
+    detector = ChangeDetector([Point("running", 0, table="coil", events=True, deadband=5, min_interval=60)])
+    changes = [
+        (change.value, change.previous)
+        for at, value in [(0, False), (1, True), (1.5, True), (2, False)]
+        for change in detector.evaluate({"running": value}, at)
+    ]
+    assert changes == [(True, False), (False, True)]
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+import pytest
+
+from app import erp
+
+
+def test_breaker_opens_probes_once_and_closes():
+    breaker = erp.CircuitBreaker(failure_threshold=2, reset_timeout=0.0)
+    breaker.record_failure()
+    assert breaker.state == erp.CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == erp.OPEN
+
+    # Past the reset timeout one probe goes through; nothing else until it answers.
+    assert breaker.allow()
+    assert breaker.state == erp.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == erp.OPEN
+
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == erp.CLOSED and breaker.failures == 0
+    assert breaker.allow() and breaker.allow()
+
+
+def test_breaker_stays_open_until_the_reset_timeout():
+    breaker = erp.CircuitBreaker(failure_threshold=1, reset_timeout=60.0)
+    breaker.record_failure()
+    assert not breaker.allow()
+    assert breaker.state == erp.OPEN
+
+
+@pytest.mark.parametrize("error", [asyncio.CancelledError, RuntimeError])
+def test_abandoned_probe_frees_the_breaker(error):
+    async def scenario() -> None:
+        client = erp.SystemClient(erp.SystemConfig(name="ERP", base_url="http://erp.test", failure_threshold=1, reset_timeout=0.0))
+
+        async def request(method, path, **kwargs):
+            raise error()
+
+        client.client.request = request
+        client.breaker.record_failure()
+        with pytest.raises(error):
+            await client.call("intake", "GET", "/tasks")
+        assert client.breaker.state == erp.HALF_OPEN
+        # The next call may probe again instead of being refused forever.
+        assert client.breaker.allow()
+        await client.client.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_http_errors_count_as_failures():
+    async def scenario() -> None:
+        transport = httpx.MockTransport(lambda request: httpx.Response(503))
+        client = erp.SystemClient(erp.SystemConfig(name="ERP", base_url="http://erp.test", failure_threshold=2))
+        client.client = httpx.AsyncClient(base_url="http://erp.test", transport=transport)
+        for _ in range(2):
+            with pytest.raises(httpx.HTTPStatusError):
+                await client.call("intake", "GET", "/tasks")
+        assert client.breaker.state == erp.OPEN
+        with pytest.raises(erp.CircuitOpenError):
+            await client.call("intake", "GET", "/tasks")
+        await client.client.aclose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import db
+from app.main import app, get_current_user
+
+EVENT = {"device_id": "Hopper01", "status": "captured", "triggered_at": "2024-05-01T08:00:00Z"}
+
+
+def _stored() -> int:
+    with db.get_connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM interface4_events").fetchone()[0]
+
+
+def test_replayed_idempotency_key_returns_the_stored_row(layout):
+    layout()
+    first, created = db.insert_interface4_event(EVENT, idempotency_key="req-1")
+    assert created
+    # A retry may carry a different generated event id and body; the key decides.
+    replay, created = db.insert_interface4_event({**EVENT, "status": "failed"}, idempotency_key="req-1")
+    assert not created
+    assert replay == first
+    assert _stored() == 1
+
+    other, created = db.insert_interface4_event(EVENT, idempotency_key="req-2")
+    assert created
+    assert other["event_id"] != first["event_id"]
+    assert _stored() == 2
+
+
+def test_replayed_event_id_returns_the_stored_row(layout):
+    layout()
+    first, _ = db.insert_interface4_event({**EVENT, "event_id": "EVT-1"})
+    replay, created = db.insert_interface4_event({**EVENT, "event_id": "EVT-1", "status": "failed"})
+    assert not created
+    assert replay == first
+    assert _stored() == 1
+
+
+@pytest.fixture
+def client(layout):
+    layout()
+    app.dependency_overrides[get_current_user] = lambda: None
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_current_user)
+
+
+def test_api_replay_answers_200_with_the_original_event(client):
+    headers = {"Idempotency-Key": "req-1"}
+    first = client.post("/api/interface4/events", json=EVENT, headers=headers)
+    assert first.status_code == 201
+    assert "Idempotent-Replayed" not in first.headers
+
+    replay = client.post("/api/interface4/events", json={**EVENT, "status": "failed"}, headers=headers)
+    assert replay.status_code == 200
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert replay.json() == first.json()
+    assert _stored() == 1
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import pytest
+
+from app import db
+
+HOUR_MS = 3_600_000
+STATUSES = ("captured", "processing", "completed", "failed")
+
+
+def _events(now: int, count: int, *, spacing_ms: int = 120_000, prefix: str = "E") -> list:
+    # Newest first, reaching back count * spacing_ms; devices spread over two shards and the main file.
+    return [
+        {
+            "event_id": f"{prefix}-{index:04d}",
+            "device_id": ("Line0-Hopper1", "Line1-Hopper2", "Dock")[index % 3],
+            "status": STATUSES[index % 4],
+            "triggered_at": db.format_ms(now - index * spacing_ms),
+        }
+        for index in range(count)
+    ]
+
+
+@pytest.fixture
+def store(layout):
+    layout(2)
+    now = db.now_ms()
+    # Ten hours of events against the default six-hour window.
+    db.insert_interface4_events(_events(now, 300))
+    return now
+
+
+def _window(status=None, device_id=None, start_ms=None, end_ms=None, page=1, page_size=20):
+    assert db._sync_hot_window()
+    with db.HOT_WINDOW.lock:
+        found = db.HOT_WINDOW.page(None, status, device_id, start_ms, end_ms, page, page_size)
+    if found is None:
+        return None
+    rows, total = found
+    return [db._window_row(row) for row in rows], total
+
+
+def _sqlite(status=None, device_id=None, start_ms=None, end_ms=None, page=1, page_size=20):
+    found = db._select_interface4_page(None, status, device_id, start_ms, end_ms, page, page_size)
+    return found["items"], found["total"]
+
+
+@pytest.mark.parametrize(
+    "filters, start_hours, end_hours",
+    [
+        ({}, None, None),
+        ({"status": "processing"}, None, None),
+        ({"device_id": "Line1-Hopper2"}, None, None),
+        ({"status": "captured", "device_id": "Line0-Hopper1"}, None, None),
+        ({}, 3, None),
+        ({"status": "failed"}, 5, 1),
+    ],
+)
+def test_window_pages_match_sqlite(store, filters, start_hours, end_hours):
+    if start_hours is not None:
+        filters["start_ms"] = store - start_hours * HOUR_MS
+    if end_hours is not None:
+        filters["end_ms"] = store - end_hours * HOUR_MS
+    answered = 0
+    for page in range(1, 8):
+        found = _window(page=page, page_size=15, **filters)
+        if found is not None:
+            answered += 1
+            assert found == _sqlite(page=page, page_size=15, **filters)
+    assert answered
+
+
+def test_page_past_the_floor_falls_back_to_sqlite(store):
+    assert db._sync_hot_window()
+    held = len(db.HOT_WINDOW)
+    assert 0 < held < 300
+    # The last full page inside the window is answered from memory, one reaching past it is not.
+    assert _window(page=held // 10, page_size=10) is not None
+    assert _window(page=held // 10 + 1, page_size=10) is None
+    # So is a range ending before the floor.
+    assert _window(end_ms=db.HOT_WINDOW.floor_ms - 1) is None
+
+    page = db.query_interface4_events(page=held // 10 + 2, page_size=10)
+    items, total = _sqlite(page=held // 10 + 2, page_size=10)
+    assert items
+    assert (page["items"], page["total"]) == (items, total)
+
+
+def test_window_catches_up_by_id(store, monkeypatch):
+    assert db._sync_hot_window()
+    seen = dict(db.HOT_WINDOW.seen)
+    db.insert_interface4_events(_events(store + 1000, 6, spacing_ms=1, prefix="N"))
+    assert _window(page_size=50) == _sqlite(page_size=50)
+    assert all(db.HOT_WINDOW.seen[name] > seen[name] for name in seen)
+
+    # Rows committed by another process only show up once the sync interval has passed.
+    with db.get_connection(path=db.SHARDS.main.path) as conn:
+        conn.execute(
+            "INSERT INTO interface4_events (event_id, device_id, status, triggered_ms, created_ms) VALUES (?, ?, ?, ?, ?)",
+            ("X-1", "Dock", "captured", store + 5000, store + 5000),
+        )
+        conn.commit()
+    monkeypatch.setattr(db, "HOT_WINDOW_SYNC", 3600.0)
+    assert "X-1" not in [item["event_id"] for item in _window()[0]]
+    monkeypatch.setattr(db, "HOT_WINDOW_SYNC", 0.0)
+    assert _window()[0][0]["event_id"] == "X-1"
+    assert _window(page_size=50) == _sqlite(page_size=50)
+
+
+def test_max_rows_trims_the_oldest_buckets(layout, monkeypatch):
+    layout(2)
+    monkeypatch.setattr(db.HOT_WINDOW, "max_rows", 40)
+    now = db.now_ms()
+    db.insert_interface4_events(_events(now, 120, spacing_ms=30_000))
+    assert db._sync_hot_window()
+    assert 0 < len(db.HOT_WINDOW) <= 40
+    # Whole minute buckets are dropped, so the floor moves up to a bucket edge well inside the six hours.
+    assert db.HOT_WINDOW.floor_ms % 60_000 == 0
+    assert db.HOT_WINDOW.floor_ms > now - HOUR_MS
+
+    # Catching up trims again.
+    db.insert_interface4_events(_events(now + 60_000, 30, spacing_ms=1_000, prefix="N"))
+    assert db._sync_hot_window()
+    assert 0 < len(db.HOT_WINDOW) <= 40
+    # Trimmed rows are still counted, so totals agree with SQLite while pages past the floor fall back.
+    for filters in ({}, {"status": "failed"}, {"device_id": "Dock"}):
+        assert _window(page_size=5, **filters) == _sqlite(page_size=5, **filters)
+    assert _window(page=6, page_size=10) is None
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from app import db, migrations
+
+MAIN_ONLY = {"tasks", "device_status_intervals", "device_status_daily", "telemetry_raw", "telemetry_rollups"}
+
+
+def _tables(path) -> set:
+    with db.get_connection(path=path) as conn:
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def _pragma(path, name: str):
+    with db.get_connection(path=path) as conn:
+        return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+def test_event_shards_only_get_event_tables(layout):
+    layout(2)
+    assert MAIN_ONLY <= _tables(db.SHARDS.main.path)
+    for shard in db.SHARDS.all[1:]:
+        tables = _tables(shard.path)
+        assert {"interface4_events", "webhook_outbox", "webhook_cursors"} <= tables
+        assert not MAIN_ONLY & tables
+
+
+def test_every_file_uses_wal_and_shards_reserve_their_id_range(layout):
+    layout(2)
+    for shard in db.SHARDS.all:
+        assert _pragma(shard.path, "journal_mode") == "wal"
+    for shard in db.SHARDS.all[1:]:
+        with db.get_connection(path=shard.path) as conn:
+            seqs = dict(conn.execute("SELECT name, seq FROM sqlite_sequence").fetchall())
+        assert seqs["interface4_events"] == seqs["webhook_outbox"] == shard.id_base
+
+
+def test_shard_files_from_the_full_chain_are_upgraded(layout, monkeypatch):
+    # A shard migrated before the chain was split: every step up to 9, rollback journal.
+    original = list(migrations.MIGRATIONS)
+    monkeypatch.setattr(
+        migrations,
+        "MIGRATIONS",
+        [
+            migrations.Migration(step.version, step.description, step.apply)
+            for step in original
+            if step.version <= 9
+        ],
+    )
+    layout(1)
+    shard = db.SHARDS.all[1]
+    assert MAIN_ONLY <= _tables(shard.path)
+    assert _pragma(shard.path, "journal_mode") == "delete"
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", original)
+    migrations.migrate()
+    assert not MAIN_ONLY & _tables(shard.path)
+    assert _pragma(shard.path, "journal_mode") == "wal"
+    with db.get_connection(path=shard.path) as conn:
+        assert migrations.current_version(conn) == migrations.LATEST_VERSION
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import asyncio
+import socket
+
+import pytest
+
+from app import modbus
+from app.changedetect import Change
+from app.pointtable import Point
+from tools import modbus_simulator
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _poller(port: int, points=None) -> modbus.DevicePoller:
+    config = modbus.DeviceConfig("SIM0001", "127.0.0.1", port, points=points or list(modbus.DEFAULT_POINTS))
+    return modbus.DevicePoller(config, modbus.PollerConfig([config], timeout=1.0, backoff_initial=30.0))
+
+
+def test_device_is_read_in_compiled_blocks():
+    async def scenario():
+        device = modbus_simulator.SimulatedDevice("SIM0001")
+        device.registers[:4] = [0xFFF6, 57, 655, 2]  # -1.0 ℃, 57 %, 65.5 kg/h, maintenance
+        device.coils[9] = True
+        server = modbus_simulator.SimulatorServer({0: device}, host="127.0.0.1", latency=0, drop_rate=0)
+        await server.start()
+        port = server.servers[0].sockets[0].getsockname()[1]
+        poller = _poller(port, list(modbus.DEFAULT_POINTS) + [Point("running", 9, table="coil")])
+        try:
+            values = await poller.poll()
+            with pytest.raises(modbus.ModbusError, match="exception code 2"):
+                await poller.client.read_holding_registers(250, 10)
+        finally:
+            await poller.close()
+            await server.stop()
+        return poller, values
+
+    poller, values = asyncio.run(scenario())
+    assert values == {"temperature": -1.0, "level": 57, "throughput": 65.5, "status": "maintenance", "running": True}
+    assert len(poller.table.blocks) == 2
+    assert poller.failures == 0 and poller.last_latency is not None
+
+
+def test_unreachable_device_backs_off():
+    async def scenario():
+        poller = _poller(_free_port())
+        first = await poller.poll()
+        retry_at = poller.retry_at
+        # Within the backoff the device is skipped without a connection attempt.
+        second = await poller.poll()
+        await poller.close()
+        return poller, first, second, retry_at
+
+    poller, first, second, retry_at = asyncio.run(scenario())
+    assert first is None and second is None
+    assert poller.failures == 1 and poller.last_error == "ConnectionRefusedError"
+    assert poller.retry_at == retry_at
+
+
+def test_unknown_status_codes_read_as_offline():
+    poller = _poller(502)
+    assert poller.decode([bytes.fromhex("00c8 0032 0064 0007")])["status"] == "offline"
+
+
+def test_change_event_record():
+    device = modbus.DeviceConfig("Hopper01", "127.0.0.1", material="PA66")
+    point = Point("level", 1, unit="%", events=True, point_code="LV-01")
+    event = modbus.change_event(device, Change(point, 42, 30, 1_700_000_000.5))
+    assert event["event_id"] == "MB-Hopper01-LV-01-1700000000500"
+    assert (event["point_code"], event["material_code"], event["unit"]) == ("LV-01", "PA66", "%")
+    assert event["trigger_value"] == 42.0
+    assert event["remarks"] == "level: 30 → 42"
+    assert event["triggered_at"].startswith("2023-11-14T22:13:20")
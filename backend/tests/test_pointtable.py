@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import struct
+
+import pytest
+
+from app import pointtable
+from app.pointtable import Point, PointTable, PointTableError
+
+
+def _registers(values: dict, start: int, count: int) -> bytes:
+    # values: register address -> raw 16-bit word
+    return b"".join(struct.pack(">H", values.get(address, 0)) for address in range(start, start + count))
+
+
+def test_points_coalesce_into_few_reads():
+    points = [
+        Point("a", 0),
+        Point("b", 5),
+        Point("c", 20),  # a gap of 14 registers splits the read
+        Point("d", 21, type="float32"),
+        Point("run", 3, table="coil"),
+        Point("alarm", 100, table="coil"),  # 96 unused bits: read through
+        Point("far", 1000, table="coil"),  # beyond 8 * 16 bits: a read of its own
+    ]
+    blocks = pointtable.compile_blocks(points)
+    assert [(block.function, block.start, block.count) for block in blocks] == [
+        (pointtable.READ_COILS, 3, 98),
+        (pointtable.READ_COILS, 1000, 1),
+        (pointtable.READ_HOLDING_REGISTERS, 0, 6),
+        (pointtable.READ_HOLDING_REGISTERS, 20, 3),
+    ]
+
+
+def test_reads_respect_the_protocol_limit():
+    blocks = pointtable.compile_blocks([Point(f"p{address}", address) for address in range(0, 300)])
+    assert [(block.start, block.count) for block in blocks] == [(0, 125), (125, 125), (250, 50)]
+
+
+def test_decode_scales_and_orders_words():
+    table = PointTable(
+        [
+            Point("temperature", 0, type="int16", scale=0.1),
+            Point("level", 1),
+            Point("total", 4, type="uint32"),
+            Point("flow", 6, type="float32", word_order="little", scale=2.0, offset=1.0),
+            Point("total_high", 4),  # the high word of ``total`` on its own
+            Point("running", 7, table="discrete"),
+        ]
+    )
+    high, low = struct.unpack(">HH", struct.pack(">f", 12.5))
+    words = {0: 0xFF38, 1: 57, 4: 0x0001, 5: 0x0002, 6: low, 7: high}
+    payloads = []
+    for block in table.blocks:
+        if block.is_bits:
+            payloads.append(bytes([0b1]))
+        else:
+            payloads.append(_registers(words, block.start, block.count))
+    assert table.decode(payloads) == {
+        "temperature": -20.0,
+        "level": 57,
+        "total": 65538,
+        "total_high": 1,
+        "flow": 26.0,
+        "running": True,
+    }
+
+
+def test_extend_and_remove_recompile():
+    table = PointTable(pointtable.DEFAULT_POINTS)
+    assert [(block.start, block.count) for block in table.blocks] == [(0, 4)]
+    table.extend([Point("level", 40)])
+    assert [(block.start, block.count) for block in table.blocks] == [(0, 4), (40, 1)]
+    table.remove(["level"])
+    assert [(block.start, block.count) for block in table.blocks] == [(0, 4)]
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        {"field": "x", "address": 0, "table": "flags"},
+        {"field": "x", "address": 0, "type": "int64"},
+        {"field": "x", "address": 0xFFFF, "type": "float32"},
+        {"field": "x", "address": 0, "wordOrder": "middle"},
+        {"field": "x", "address": 0, "deadband": -1},
+    ],
+)
+def test_bad_points_are_rejected(raw):
+    with pytest.raises(PointTableError):
+        Point.from_dict(raw)
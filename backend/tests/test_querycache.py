@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from app.querycache import MISSING, ResultCache
+
+
+def test_a_write_invalidates_earlier_results():
+    cache = ResultCache("test", max_entries=4)
+    loads = []
+
+    def load():
+        loads.append(1)
+        return len(loads)
+
+    assert cache.get_or_load("page", load) == 1
+    assert cache.get_or_load("page", load) == 1
+    cache.bump()
+    assert cache.get("page") is MISSING
+    assert cache.get_or_load("page", load) == 2
+    assert cache.stats()["hits"] == 1
+
+
+def test_results_read_before_a_write_are_not_stored():
+    cache = ResultCache("test")
+    version = cache.version
+    cache.bump()  # a write lands while the query runs
+    cache.put("page", version, "old")
+    assert cache.get("page") is MISSING
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResultCache("test", max_entries=2)
+    cache.put("a", cache.version, 1)
+    cache.put("b", cache.version, 2)
+    assert cache.get("a") == 1
+    cache.put("c", cache.version, 3)
+    assert cache.get("b") is MISSING
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_entries_expire_after_max_age(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr("app.querycache.time.monotonic", lambda: clock[0])
+    cache = ResultCache("test", max_age=30)
+    cache.put("page", cache.version, 1)
+    clock[0] += 30
+    assert cache.get("page") == 1
+    clock[0] += 1
+    assert cache.get("page") is MISSING
+
+
+def test_disabled_cache_stores_nothing():
+    cache = ResultCache("test", max_entries=0)
+    cache.put("page", cache.version, 1)
+    assert cache.get("page") is MISSING and cache.stats()["entries"] == 0
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+from app import db
+
+BASE_MS = 1_700_000_000_000
+
+
+def _event(line: int, index: int, **extra) -> dict:
+    return {
+        "event_id": f"L{line}-{index:04d}",
+        "device_id": f"Line{line}-Hopper{index % 3}",
+        "status": ("captured", "processing", "completed")[index % 3],
+        # Lines interleave in time and share some timestamps, so the merge has to break ties by id.
+        "triggered_at": db.format_ms(BASE_MS + index * 1000 + (line % 2) * 500),
+        **extra,
+    }
+
+
+def _fill(lines: int, per_line: int) -> None:
+    for line in range(lines):
+        db.insert_interface4_events([_event(line, index) for index in range(per_line)])
+    # Devices no shard claims land in the main file.
+    db.insert_interface4_events([{**_event(0, index), "event_id": f"M-{index:04d}", "device_id": "Dock"} for index in range(5)])
+
+
+def _expected(**filters) -> list:
+    rows = []
+    for shard in db.SHARDS.all:
+        with db.get_connection(path=shard.path) as conn:
+            rows.extend(conn.execute("SELECT triggered_ms, id, event_id, status, device_id FROM interface4_events").fetchall())
+    rows = [row for row in rows if all(row[name] == value for name, value in filters.items())]
+    rows.sort(key=lambda row: (row["triggered_ms"], row["id"]), reverse=True)
+    return [row["event_id"] for row in rows]
+
+
+def _pages(page_size: int, **filters) -> tuple:
+    paged, totals, page = [], set(), 1
+    while True:
+        found = db._select_interface4_page(None, filters.get("status"), filters.get("device_id"), None, None, page, page_size)
+        totals.add(found["total"])
+        if not found["items"]:
+            return paged, totals
+        paged.extend(item["event_id"] for item in found["items"])
+        page += 1
+
+
+def test_ids_are_unique_across_shards(layout):
+    layout(3)
+    _fill(3, 20)
+    ids = [row[0] for row in db.iter_interface4_events(columns=["id"])]
+    assert len(ids) == len(set(ids)) == 65
+
+
+def test_pages_and_totals_match_the_merged_order(layout):
+    layout(3)
+    _fill(3, 40)
+    for filters in ({}, {"status": "processing"}, {"device_id": "Line1-Hopper2"}):
+        expected = _expected(**filters)
+        for page_size in (1, 7, 50, 500):
+            paged, totals = _pages(page_size, **filters)
+            assert paged == expected
+            assert totals == {len(expected)}
+
+
+def test_export_cursor_resumes_in_merged_order(layout):
+    layout(3)
+    _fill(3, 30)
+    expected = _expected()
+    rows = list(db.iter_interface4_events(columns=["event_id", "triggered_at", "id"]))
+    assert [row[0] for row in rows] == expected
+    for cut in (0, 1, 17, len(rows) - 1):
+        token = db.encode_cursor(rows[cut][1], rows[cut][2])
+        resumed = [row[0] for row in db.iter_interface4_events(columns=["event_id"], after=db.decode_cursor(token))]
+        assert resumed == expected[cut + 1 :]
+
+
+def test_idempotency_key_is_global_across_shards(layout):
+    layout(2)
+    first, created = db.insert_interface4_event(_event(0, 1), idempotency_key="req-1")
+    assert created
+    replay, created = db.insert_interface4_event(_event(1, 2), idempotency_key="req-1")
+    assert not created
+    assert replay == first
+    assert _expected() == [first["event_id"]]
+
+
+def test_event_id_is_global_across_shards(layout):
+    layout(2)
+    first, _ = db.insert_interface4_event(_event(0, 1))
+    replay, created = db.insert_interface4_event({**_event(1, 1), "event_id": first["event_id"]})
+    assert not created
+    assert replay == first
+
+    added = db.insert_interface4_events(
+        [
+            {**_event(1, 2), "event_id": first["event_id"]},  # stored in another shard
+            _event(1, 3),
+            {**_event(0, 4), "event_id": "L1-0003"},  # repeats a row of this batch bound for another shard
+        ]
+    )
+    assert added == 1
+    assert sorted(_expected()) == [first["event_id"], "L1-0003"]
+
+
+def test_lookup_connections_follow_the_layout(layout, tmp_path, monkeypatch):
+    layout(2)
+    db.insert_interface4_event(_event(0, 1))
+    old = {path for _, path in db._DEDUP_CONNECTIONS}
+    assert old == {shard.path for shard in db.SHARDS.all}
+
+    monkeypatch.setattr(db, "SHARDS", db.shards.ShardMap(db.SHARDS.main, db.SHARDS.all[1:2]))
+    db.insert_interface4_event(_event(0, 2))
+    assert {path for _, path in db._DEDUP_CONNECTIONS} == {shard.path for shard in db.SHARDS.all}
+
+    db.close_connections()
+    assert not db._DEDUP_CONNECTIONS
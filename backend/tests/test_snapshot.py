@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import copy
+
+import pytest
+
+from app import data, snapshot
+
+
+@pytest.fixture
+def live(monkeypatch):
+    # Private copies of the live state, so a restore never leaks into other tests.
+    for name in ("DASHBOARD_STATE", "MATERIAL_SUMMARY", "DEVICES", "UNREACHABLE", "ALERTS", "AUDIT_LOGS", "INTEGRATIONS"):
+        monkeypatch.setattr(data, name, copy.deepcopy(getattr(data, name)))
+
+
+def _state():
+    return snapshot.decode(snapshot.encode(snapshot.capture()))
+
+
+def test_snapshot_round_trip(live, tmp_path):
+    snapshots = snapshot.StateSnapshots(tmp_path / "state.snapshot", 5)
+    snapshots.save()
+    devices = copy.deepcopy(data.DEVICES)
+    data.DEVICES.clear()
+    data.UNREACHABLE.add("Gone")
+    assert snapshots.load()
+    assert data.DEVICES == devices
+    assert "Gone" not in data.UNREACHABLE
+
+
+@pytest.mark.parametrize("missing", ["integrations", "alerts", "dashboard"])
+def test_incomplete_snapshot_changes_nothing(live, tmp_path, missing):
+    state = _state()
+    state["devices"] = []
+    state["unreachable"] = ["Gone"]
+    del state[missing]
+    path = tmp_path / "state.snapshot"
+    path.write_bytes(snapshot.encode(state))
+    before = copy.deepcopy((data.DASHBOARD_STATE, data.DEVICES, data.UNREACHABLE, data.ALERTS, data.INTEGRATIONS))
+
+    assert not snapshot.StateSnapshots(path, 5).load()
+    assert (data.DASHBOARD_STATE, data.DEVICES, data.UNREACHABLE, data.ALERTS, data.INTEGRATIONS) == before
+
+
+def test_corrupt_snapshot_is_ignored(live, tmp_path):
+    blob = bytearray(snapshot.encode(_state()))
+    blob[-1] ^= 0xFF
+    path = tmp_path / "state.snapshot"
+    path.write_bytes(bytes(blob))
+    assert not snapshot.StateSnapshots(path, 5).load()
+    assert not snapshot.StateSnapshots(tmp_path / "absent", 5).load()
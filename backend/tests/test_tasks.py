@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import pytest
+
+from app import data, tasks
+
+NOW = "2024-05-01T08:00:00Z"
+
+
+def _task(task_id, **extra) -> dict:
+    return tasks.normalize({"taskId": task_id, "materialCode": "PA66", "targetDevice": "Hopper01", **extra}, source="ERP", now=NOW)
+
+
+def _stored() -> dict:
+    return {item["taskId"]: item for item in tasks.query(page_size=100)["items"]}
+
+
+def test_conflicting_plan_is_rejected_whole(layout):
+    layout()
+    tasks.insert([_task("T1")])
+    with pytest.raises(tasks.TaskConflictError) as raised:
+        tasks.insert([_task("T2"), _task("T1")])
+    assert raised.value.task_ids == ["T1"]
+    assert list(_stored()) == ["T1"]
+
+
+def test_skip_existing_leaves_out_stored_ids(layout):
+    layout()
+    tasks.insert([_task("T1", quantity=1)])
+    stored = tasks.insert([_task("T1", quantity=2), _task("T2")], skip_existing=True)
+    assert [item["taskId"] for item in stored] == ["T2"]
+    assert _stored()["T1"]["quantity"] == 1
+
+
+def test_skip_existing_keeps_the_last_of_repeated_ids(layout):
+    layout()
+    stored = tasks.insert([_task("T1", quantity=1), _task("T2"), _task("T1", quantity=3)], skip_existing=True)
+    assert [item["taskId"] for item in stored] == ["T2", "T1"]
+    assert _stored()["T1"]["quantity"] == 3
+
+
+def test_external_poll_with_a_repeated_id_is_queued_once(layout):
+    layout()
+    payloads = [{"taskId": "E1", "targetDevice": "Hopper01"}, {"taskId": "E1", "targetDevice": "Hopper02"}]
+    assert data.receive_external_tasks(payloads, "ERP") == 1
+    assert _stored()["E1"]["targetDevice"] == "Hopper02"
+    # The next poll of the same page is a no-op instead of failing again.
+    assert data.receive_external_tasks(payloads, "ERP") == 0
+
+
+def test_missing_ids_continue_the_days_sequence(layout):
+    layout()
+    first = tasks.insert([_task(None), _task(None)])
+    second = tasks.insert([_task(None)])
+    ids = [item["taskId"] for item in first + second]
+    assert len(set(ids)) == 3
+    assert [int(task_id[-3:]) for task_id in ids] == [1, 2, 3]
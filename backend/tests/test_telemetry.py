@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import pytest
+
+from app import db, telemetry
+
+HOUR_MS = 3_600_000
+START = 1_700_000_000_000 // HOUR_MS * HOUR_MS
+
+
+@pytest.fixture
+def tiers(layout):
+    layout()
+    return telemetry.TelemetryConfig(flush_interval=5).tiers()
+
+
+def _rows(table):
+    with db.get_connection() as conn:
+        return [tuple(row) for row in conn.execute(f"SELECT * FROM {table} ORDER BY device_id, bucket_ms")]
+
+
+def test_compact_rolls_minutes_into_hours(tiers):
+    telemetry.write_samples(
+        [
+            # Minute 0: temperature missing, level 10 and 20.
+            ("Hopper01", START + 1_000, None, 10.0, 1.0),
+            ("Hopper01", START + 31_000, None, 20.0, 1.0),
+            # Minute 1: one full sample.
+            ("Hopper01", START + 61_000, 40.0, 60.0, 2.0),
+            # Next hour, not finished yet.
+            ("Hopper01", START + HOUR_MS + 1_000, 50.0, 50.0, 5.0),
+        ]
+    )
+    changed = telemetry.compact(tiers, now_ms=START + HOUR_MS + 30_000)
+    assert changed["minute"] == 2 and changed["hour"] == 1
+
+    minutes = _rows("telemetry_1m")
+    assert [row[1:3] for row in minutes] == [(START, 2), (START + 60_000, 1)]
+    assert minutes[0][3:6] == (None, None, None)
+    ((device_id, bucket, samples, *values),) = _rows("telemetry_1h")
+    assert (device_id, bucket, samples) == ("Hopper01", START, 3)
+    # The temperature average only counts the minute that had one.
+    assert values[:3] == [40.0, 40.0, 40.0]
+    assert values[3:6] == [10.0, pytest.approx(30.0), 60.0]
+
+    # A second pass over the same time changes nothing.
+    assert telemetry.compact(tiers, now_ms=START + HOUR_MS + 30_000) == {"raw": 0, "minute": 0, "hour": 0}
+
+
+def test_history_fills_in_from_the_finer_tiers(tiers):
+    samples = [("Hopper01", START + minute * 60_000, float(minute), float(minute), 1.0) for minute in range(120)]
+    telemetry.write_samples(samples)
+    now = START + 2 * HOUR_MS
+    telemetry.compact(tiers, now_ms=START + 90 * 60_000)
+
+    found = telemetry.history("Hopper01", "level", START, now, HOUR_MS, now_ms=now, tiers=tiers)
+    assert found["tier"] == "hour"
+    # The first hour comes from telemetry_1h, the second is rebucketed from minutes and raw samples.
+    assert [(point["samples"], point["min"], point["avg"], point["max"]) for point in found["points"]] == [
+        (60, 0.0, 29.5, 59.0),
+        (60, 60.0, 89.5, 119.0),
+    ]
+    minutes = telemetry.history("Hopper01", "level", START, START + 5 * 60_000, 60_000, now_ms=now, tiers=tiers)
+    assert (minutes["tier"], [point["avg"] for point in minutes["points"]]) == ("minute", [0.0, 1.0, 2.0, 3.0, 4.0])
+
+    with pytest.raises(ValueError):
+        telemetry.history("Hopper01", "pressure", START, now, now_ms=now, tiers=tiers)
+    with pytest.raises(ValueError):
+        telemetry.history("Hopper01", "level", START, now, 1, now_ms=now, tiers=tiers)
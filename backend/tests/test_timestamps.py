@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import pytest
+
+from app import db, migrations
+
+STAMP = 1_697_588_100_000  # 2023-10-18T00:15:00Z
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("2023-10-18T00:15:00Z", STAMP),
+        ("2023-10-18T08:15:00+08:00", STAMP),
+        ("2023-10-18T00:15:00", STAMP),
+        ("2023-10-18T00:15:00.250z", STAMP + 250),
+        ("  2023-10-18  ", STAMP - 15 * 60_000),
+    ],
+)
+def test_to_ms_reads_offsets_and_bare_dates(text, expected):
+    assert db.to_ms(text) == expected
+
+
+def test_end_of_day_only_stretches_bare_dates():
+    assert db.to_ms("2023-10-18", end_of_day=True) == STAMP - 15 * 60_000 + db.DAY_MS - 1
+    assert db.to_ms("2023-10-18T00:15:00Z", end_of_day=True) == STAMP
+    with pytest.raises(ValueError):
+        db.to_ms(" ")
+
+
+def test_format_ms_round_trips():
+    assert db.format_ms(STAMP) == "2023-10-18T00:15:00Z"
+    assert db.format_ms(STAMP + 7) == "2023-10-18T00:15:00.007Z"
+    assert db.ensure_iso("2023-10-18T08:15:00.5+08:00") == "2023-10-18T00:15:00.500Z"
+    assert db.to_ms(db.format_ms(STAMP + 999)) == STAMP + 999
+
+
+def test_text_timestamps_are_converted_on_upgrade(layout, monkeypatch):
+    original = list(migrations.MIGRATIONS)
+    monkeypatch.setattr(migrations, "MIGRATIONS", [step for step in original if step.version <= 4])
+    layout()
+    with db.get_connection() as conn:
+        conn.executemany(
+            "INSERT INTO interface4_events (event_id, triggered_at, created_at) VALUES (?, ?, ?)",
+            [
+                ("E-1", "2023-10-18T00:15:00Z", "2023-10-18T00:15:01Z"),
+                ("E-2", "2023-10-18T08:15:00+08:00", "2023-10-18T08:15:00.500+08:00"),
+            ],
+        )
+        conn.commit()
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", original)
+    migrations.migrate()
+    with db.get_connection() as conn:
+        rows = conn.execute("SELECT event_id, triggered_ms, created_ms FROM interface4_events ORDER BY id").fetchall()
+    assert [tuple(row) for row in rows] == [("E-1", STAMP, STAMP + 1000), ("E-2", STAMP, STAMP + 500)]
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import pytest
+
+from app import db, utilization
+
+DAY = 86400.0
+HOUR = 3600.0
+D0 = 19676 * DAY  # 2023-11-15 00:00 UTC
+
+
+@pytest.fixture
+def history(layout):
+    layout()
+    utilization.record_transitions(
+        [
+            ("Hopper01", "online", D0 + 22 * HOUR),
+            ("Hopper01", "maintenance", 2 * DAY + D0 + 2 * HOUR),
+            ("Hopper01", "online", 2 * DAY + D0 + 3 * HOUR),
+            ("Vacuum01", "offline", D0 + 23 * HOUR),
+            ("Vacuum01", None, D0 + DAY + 1 * HOUR),
+        ]
+    )
+
+
+def test_closed_intervals_are_split_at_midnight(history):
+    with db.get_connection() as conn:
+        rows = conn.execute("SELECT day, device_id, status, seconds FROM device_status_daily ORDER BY 2, 1, 3")
+        daily = [tuple(row) for row in rows]
+    assert daily == [
+        ("2023-11-15", "Hopper01", "online", 2 * HOUR),
+        ("2023-11-16", "Hopper01", "online", DAY),
+        ("2023-11-17", "Hopper01", "maintenance", HOUR),
+        ("2023-11-17", "Hopper01", "online", 2 * HOUR),
+        ("2023-11-15", "Vacuum01", "offline", HOUR),
+        ("2023-11-16", "Vacuum01", "offline", HOUR),
+    ]
+
+
+@pytest.mark.parametrize(
+    "start, end, expected",
+    [
+        # Straddling one midnight, inside a single interval.
+        (D0 + 23 * HOUR, D0 + DAY + HOUR, {"Hopper01": {"online": 2 * HOUR}, "Vacuum01": {"offline": 2 * HOUR}}),
+        # Exactly one whole day: answered from the daily rows alone.
+        (D0 + DAY, D0 + 2 * DAY, {"Hopper01": {"online": DAY}, "Vacuum01": {"offline": HOUR}}),
+        # Partial days at both edges around a whole one, plus the open interval up to now.
+        (
+            D0 + 12 * HOUR,
+            D0 + 3 * DAY,
+            {"Hopper01": {"online": 29 * HOUR, "maintenance": HOUR}, "Vacuum01": {"offline": 2 * HOUR}},
+        ),
+    ],
+)
+def test_status_seconds_across_midnight(history, start, end, expected):
+    assert utilization.status_seconds(start, end, now=2 * DAY + D0 + 4 * HOUR) == expected
+
+
+def test_report_rates_online_time(history):
+    now = 2 * DAY + D0 + 4 * HOUR
+    report = utilization.utilization_report(D0 + 2 * DAY, now, names={"Hopper01": "1# 料斗"})
+    (item,) = [item for item in report["items"] if item["deviceId"] == "Hopper01"]
+    assert (item["name"], item["onlineSeconds"], item["maintenanceSeconds"], item["observedSeconds"]) == (
+        "1# 料斗",
+        3 * HOUR,
+        HOUR,
+        4 * HOUR,
+    )
+    assert item["utilization"] == 0.75
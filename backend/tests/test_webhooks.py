@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import asyncio
+
+from app import db, webhooks
+
+
+def _config() -> webhooks.WebhookConfig:
+    return webhooks.WebhookConfig(
+        subscribers=[webhooks.SubscriberConfig("mes", "http://127.0.0.1:9/hook")], poll_interval=0.05
+    )
+
+
+def test_one_process_delivers_and_a_standby_takes_over(layout):
+    layout()
+
+    async def scenario() -> None:
+        # Two dispatchers stand in for two API worker processes sharing the data directory.
+        first, second = webhooks.WebhookDispatcher(_config()), webhooks.WebhookDispatcher(_config())
+        runs = {first: asyncio.create_task(first.run()), second: asyncio.create_task(second.run())}
+        await asyncio.sleep(0.2)
+        assert db.OUTBOX_ENABLED
+        assert [first.lease.held, second.lease.held].count(True) == 1
+        leader, standby = (first, second) if first.lease.held else (second, first)
+        assert [item["delivering"] for item in standby.status()] == [False]
+
+        db.insert_interface4_event({"device_id": "Hopper01", "status": "captured"})
+        await asyncio.sleep(0.2)
+        # The standby reads the shared lag figures without delivering anything.
+        assert standby.subscribers[0].pending == 1
+        assert standby.subscribers[0].delivered == 0
+
+        await leader.close()
+        await runs[leader]
+        await asyncio.sleep(0.2)
+        assert standby.lease.held
+        await standby.close()
+        await runs[standby]
+        assert not standby.lease.held
+
+    asyncio.run(scenario())
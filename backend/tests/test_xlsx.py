@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import io
+import xml.etree.ElementTree as ET
+import zipfile
+
+from app import xlsx
+
+NS = {"m": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+
+
+def _sheets(blob: bytes) -> dict:
+    # sheet name -> rows of cell texts (None for empty cells)
+    archive = zipfile.ZipFile(io.BytesIO(blob))
+    workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+    sheets = {}
+    for index, sheet in enumerate(workbook.iterfind("m:sheets/m:sheet", NS), 1):
+        root = ET.fromstring(archive.read(f"xl/worksheets/sheet{index}.xml"))
+        sheets[sheet.get("name")] = [
+            [cell.findtext("m:v", namespaces=NS) or cell.findtext("m:is/m:t", namespaces=NS) for cell in row]
+            for row in root.iterfind("m:sheetData/m:row", NS)
+        ]
+    return sheets
+
+
+def test_cells_keep_their_types_and_are_escaped():
+    rows = [("a<b & c", 1, 2.5, True, None, "", float("nan"), "bell\x07")]
+    blob = b"".join(xlsx.stream_workbook(["text", "int", "float", "bool", "none", "empty", "nan", "ctrl"], rows))
+    assert _sheets(blob) == {
+        "Sheet": [
+            ["text", "int", "float", "bool", "none", "empty", "nan", "ctrl"],
+            ["a<b & c", "1", "2.5", "1", None, None, "nan", "bell"],
+        ]
+    }
+
+
+def test_the_header_goes_out_before_any_row_is_read():
+    consumed = []
+
+    def rows():
+        for index in range(3):
+            consumed.append(index)
+            yield (index,)
+
+    chunks = xlsx.stream_workbook(["n"], rows())
+    first = next(chunks)
+    assert first.startswith(b"PK") and consumed == []
+    assert _sheets(first + b"".join(chunks)) == {"Sheet": [["n"], ["0"], ["1"], ["2"]]}
+
+
+def test_sheets_roll_over_at_the_row_limit(monkeypatch):
+    monkeypatch.setattr(xlsx, "MAX_ROWS", 3)
+    blob = b"".join(xlsx.stream_workbook(["n"], ((index,) for index in range(5)), sheet_name="事件"))
+    assert _sheets(blob) == {"事件": [["n"], ["0"], ["1"]], "事件 (2)": [["n"], ["2"], ["3"]], "事件 (3)": [["n"], ["4"]]}
+
+
+def test_chunks_stay_near_the_chunk_size():
+    rows = ((index, f"row {index}" * 20) for index in range(20_000))
+    chunks = list(xlsx.stream_workbook(["n", "text"], rows, chunk_size=16 * 1024))
+    assert len(chunks) > 3
+    assert max(len(chunk) for chunk in chunks[1:-1]) < 64 * 1024
+    assert len(_sheets(b"".join(chunks))["Sheet"]) == 20_001
@@ -0,0 +1 @@
+"""Local stand-in servers for offline development and testing."""
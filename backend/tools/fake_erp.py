@@ -0,0 +1,139 @@
+"""Local fake ERP/MES server for the outbound integration client.
+
+Run from the ``backend`` directory::
+
+    python -m tools.fake_erp --port 18070 --task-interval 10 --latency-ms 210
+    echo '{"systems": [{"name": "ERP", "baseUrl": "http://127.0.0.1:18070"}]}' > erp.json
+    UNET_ERP_CONFIG=erp.json uvicorn app.main:app
+
+Serves ``GET /tasks?since=<cursor>`` (a new task every ``--task-interval``
+seconds) and ``POST /tasks/status``.  ``PUT /admin/mode`` with
+``{"latencyMs": ..., "failRate": ...}`` degrades or breaks the server at
+runtime; ``GET /stats`` shows the issued tasks and the latest feedback per
+task.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+MATERIALS = (("PA66", "Hopper01"), ("ABS-UV", "Hopper03"), ("PC+GF", "Hopper05"), ("TPU", "Hopper07"))
+
+
+class FakeErp:
+    def __init__(self, *, task_interval: float = 10.0, latency: float = 0.0, fail_rate: float = 0.0, prefix: str = "ERP") -> None:
+        self.task_interval = task_interval
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.prefix = prefix
+        self.rng = random.Random(5)
+        self.started = time.monotonic()
+        self.tasks: List[Dict[str, object]] = []
+        self.feedback: Dict[str, Dict[str, object]] = {}
+        self.feedback_batches = 0
+        self.requests = 0
+        self.failed = 0
+        self.app = Starlette(
+            routes=[
+                Route("/tasks", self.list_tasks, methods=["GET"]),
+                Route("/tasks/status", self.receive_status, methods=["POST"]),
+                Route("/admin/mode", self.set_mode, methods=["PUT"]),
+                Route("/stats", self.stats, methods=["GET"]),
+            ]
+        )
+
+    def _issue_due_tasks(self) -> None:
+        due = int((time.monotonic() - self.started) / self.task_interval) + 1 if self.task_interval > 0 else 0
+        while len(self.tasks) < due:
+            material, device = self.rng.choice(MATERIALS)
+            stamp = datetime.now(timezone.utc)
+            self.tasks.append(
+                {
+                    "taskId": f"{self.prefix}{stamp:%Y%m%d}{len(self.tasks) + 1:04d}",
+                    "materialCode": material,
+                    "targetDevice": device,
+                    "quantity": self.rng.randrange(200, 800, 10),
+                    "priority": self.rng.choice(("high", "medium", "low")),
+                    "scheduledAt": stamp.replace(microsecond=0).isoformat().replace("+00:00", "Z"),
+                }
+            )
+
+    async def _degrade(self) -> Optional[Response]:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.rng.random() < self.fail_rate:
+            self.failed += 1
+            return Response(status_code=503)
+        return None
+
+    async def list_tasks(self, request: Request) -> Response:
+        failure = await self._degrade()
+        if failure is not None:
+            return failure
+        self._issue_due_tasks()
+        since = int(request.query_params.get("since") or 0)
+        return JSONResponse({"tasks": self.tasks[since:], "cursor": str(len(self.tasks))})
+
+    async def receive_status(self, request: Request) -> Response:
+        body = await request.json()
+        failure = await self._degrade()
+        if failure is not None:
+            return failure
+        for update in body.get("updates", []):
+            self.feedback[str(update["taskId"])] = update
+        self.feedback_batches += 1
+        return Response(status_code=204)
+
+    async def set_mode(self, request: Request) -> Response:
+        body = await request.json()
+        if "latencyMs" in body:
+            self.latency = float(body["latencyMs"]) / 1000
+        if "failRate" in body:
+            self.fail_rate = float(body["failRate"])
+        return JSONResponse({"latencyMs": self.latency * 1000, "failRate": self.fail_rate})
+
+    def snapshot(self) -> Dict[str, object]:
+        return {
+            "issued": len(self.tasks),
+            "requests": self.requests,
+            "failed": self.failed,
+            "feedbackBatches": self.feedback_batches,
+            "feedback": self.feedback,
+        }
+
+    async def stats(self, _: Request) -> Response:
+        return JSONResponse(self.snapshot())
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve a fake ERP/MES task interface.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18070)
+    parser.add_argument("--task-interval", type=float, default=10.0, help="seconds between new tasks")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--prefix", default="ERP", help="task id prefix")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    server = FakeErp(
+        task_interval=args.task_interval, latency=args.latency_ms / 1000, fail_rate=args.fail_rate, prefix=args.prefix
+    )
+    uvicorn.run(server.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""Local Modbus TCP simulator for offline acquisition testing.
+
+Run from the ``backend`` directory::
+
+    python -m tools.modbus_simulator --devices 300 --base-port 15020 --config-out modbus.json
+    UNET_MODBUS_CONFIG=modbus.json uvicorn app.main:app
+
+Each simulated device listens on its own port and serves read coils,
+discrete inputs, holding and input registers.  Register values follow the
+default point layout of ``app.modbus`` (temperature x10, level, throughput
+x10, status code) and drift every second; ``--latency-ms`` and
+``--drop-rate`` emulate slow or flaky field devices.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import struct
+from pathlib import Path
+from typing import Dict, List, Optional
+
+MBAP = struct.Struct(">HHHB")
+READ_REQUEST = struct.Struct(">BHH")
+
+ILLEGAL_FUNCTION = 0x01
+ILLEGAL_DATA_ADDRESS = 0x02
+
+MATERIALS = ("PA66", "ABS-UV", "PC+GF", "TPU")
+
+
+class SimulatedDevice:
+    """Register and coil images of one device plus a drift model."""
+
+    def __init__(self, device_id: str, *, registers: int = 256, coils: int = 256, seed: int = 0) -> None:
+        self.device_id = device_id
+        self.rng = random.Random(seed)
+        self.registers: List[int] = [0] * registers
+        self.coils: List[bool] = [False] * coils
+        self.registers[0] = int(self.rng.uniform(600, 900))
+        self.registers[1] = self.rng.randint(40, 90)
+        self.registers[2] = int(self.rng.uniform(300, 900))
+        self.registers[3] = 1
+
+    def drift(self) -> None:
+        regs = self.registers
+        regs[0] = max(300, min(1200, regs[0] + self.rng.randint(-8, 9)))
+        regs[1] = max(0, min(100, regs[1] + self.rng.randint(-3, 3)))
+        regs[2] = max(0, regs[2] + self.rng.randint(-40, 50)) if regs[3] == 1 else 0
+        if self.rng.random() < 0.01:
+            regs[3] = 2 if regs[3] == 1 else 1
+        for index in range(4, len(regs)):
+            regs[index] = (regs[index] + self.rng.randint(-2, 3)) & 0xFFFF
+        if self.rng.random() < 0.05:
+            index = self.rng.randrange(len(self.coils))
+            self.coils[index] = not self.coils[index]
+
+    def read(self, function: int, address: int, count: int) -> Optional[bytes]:
+        if function in (0x03, 0x04):
+            if count < 1 or count > 125 or address + count > len(self.registers):
+                return None
+            values = self.registers[address : address + count]
+            return bytes([count * 2]) + struct.pack(f">{count}H", *values)
+        if function in (0x01, 0x02):
+            if count < 1 or count > 2000 or address + count > len(self.coils):
+                return None
+            packed = bytearray((count + 7) // 8)
+            for offset, bit in enumerate(self.coils[address : address + count]):
+                if bit:
+                    packed[offset // 8] |= 1 << (offset % 8)
+            return bytes([len(packed)]) + bytes(packed)
+        return b""
+
+
+class SimulatorServer:
+    def __init__(self, devices: Dict[int, SimulatedDevice], *, host: str, latency: float, drop_rate: float) -> None:
+        self.devices = devices
+        self.host = host
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.servers: List[asyncio.AbstractServer] = []
+        self._drift_task: Optional[asyncio.Task] = None
+        self.rng = random.Random(7)
+
+    async def start(self) -> None:
+        for port, device in self.devices.items():
+            server = await asyncio.start_server(
+                lambda r, w, d=device: self._serve(d, r, w), self.host, port, reuse_address=True
+            )
+            self.servers.append(server)
+        self._drift_task = asyncio.create_task(self._drift())
+
+    async def stop(self) -> None:
+        if self._drift_task is not None:
+            self._drift_task.cancel()
+        for server in self.servers:
+            server.close()
+        await asyncio.gather(*(server.wait_closed() for server in self.servers), return_exceptions=True)
+
+    async def _drift(self) -> None:
+        while True:
+            await asyncio.sleep(1.0)
+            for device in self.devices.values():
+                device.drift()
+
+    async def _serve(self, device: SimulatedDevice, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                transaction, protocol, length, unit = MBAP.unpack(await reader.readexactly(MBAP.size))
+                pdu = await reader.readexactly(length - 1)
+                if self.drop_rate and self.rng.random() < self.drop_rate:
+                    continue
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                function = pdu[0]
+                if len(pdu) == READ_REQUEST.size:
+                    _, address, count = READ_REQUEST.unpack(pdu)
+                    payload = device.read(function, address, count)
+                else:
+                    payload = b""
+                if payload is None:
+                    response = bytes([function | 0x80, ILLEGAL_DATA_ADDRESS])
+                elif not payload:
+                    response = bytes([function | 0x80, ILLEGAL_FUNCTION])
+                else:
+                    response = bytes([function]) + payload
+                writer.write(MBAP.pack(transaction, protocol, len(response) + 1, unit) + response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def build_devices(count: int, base_port: int) -> Dict[int, SimulatedDevice]:
+    return {base_port + index: SimulatedDevice(f"SIM{index + 1:04d}", seed=index) for index in range(count)}
+
+
+def poller_config(devices: Dict[int, SimulatedDevice], host: str, interval: float, timeout: float) -> Dict[str, object]:
+    return {
+        "interval": interval,
+        "timeout": timeout,
+        "devices": [
+            {
+                "deviceId": device.device_id,
+                "name": f"模拟设备 {device.device_id[3:]}",
+                "material": MATERIALS[index % len(MATERIALS)],
+                "host": host,
+                "port": port,
+                "unitId": 1,
+            }
+            for index, (port, device) in enumerate(devices.items())
+        ],
+    }
+
+
+async def serve_forever(args: argparse.Namespace) -> None:
+    devices = build_devices(args.devices, args.base_port)
+    server = SimulatorServer(devices, host=args.host, latency=args.latency_ms / 1000, drop_rate=args.drop_rate)
+    await server.start()
+    if args.config_out:
+        config = poller_config(devices, args.host, args.interval, args.timeout)
+        Path(args.config_out).write_text(json.dumps(config, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"simulating {len(devices)} devices on {args.host}:{args.base_port}-{args.base_port + len(devices) - 1}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve simulated Modbus TCP devices.")
+    parser.add_argument("--devices", type=int, default=9)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--base-port", type=int, default=15020)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="added delay per response")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fraction of requests left unanswered")
+    parser.add_argument("--config-out", help="write a poller config for these devices")
+    parser.add_argument("--interval", type=float, default=5.0, help="cycle written to --config-out")
+    parser.add_argument("--timeout", type=float, default=1.0, help="read timeout written to --config-out")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    try:
+        asyncio.run(serve_forever(parse_args(argv)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
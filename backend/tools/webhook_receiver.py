@@ -0,0 +1,103 @@
+"""Local stand-in HTTP receiver for webhook fan-out testing.
+
+Run from the ``backend`` directory::
+
+    python -m tools.webhook_receiver --port 18080 --slow mes:2000 --failing erp:0.5
+
+Every ``POST /hook/<name>`` is accepted as one webhook batch; ``--slow``
+delays and ``--failing`` rejects (HTTP 503) a fraction of the batches of the
+named subscriber.  ``GET /stats`` reports batches, events and duplicate
+event ids received per subscriber.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+from typing import Dict, List, Optional, Set
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+
+class Receiver:
+    def __init__(self, *, latency: Optional[Dict[str, float]] = None, fail_rate: Optional[Dict[str, float]] = None) -> None:
+        self.latency = latency or {}
+        self.fail_rate = fail_rate or {}
+        self.rng = random.Random(11)
+        self.batches: Dict[str, int] = {}
+        self.rejected: Dict[str, int] = {}
+        self.seen: Dict[str, Set[str]] = {}
+        self.duplicates: Dict[str, int] = {}
+        self.app = Starlette(
+            routes=[
+                Route("/hook/{name}", self.receive, methods=["POST"]),
+                Route("/stats", self.stats, methods=["GET"]),
+            ]
+        )
+
+    async def receive(self, request: Request) -> Response:
+        name = request.path_params["name"]
+        # Read the batch before stalling, as a receiver that is slow to answer would.
+        body = await request.json()
+        delay = self.latency.get(name, 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.rng.random() < self.fail_rate.get(name, 0.0):
+            self.rejected[name] = self.rejected.get(name, 0) + 1
+            return Response(status_code=503)
+        seen = self.seen.setdefault(name, set())
+        for event in body.get("events", []):
+            event_id = event.get("eventId")
+            if event_id in seen:
+                self.duplicates[name] = self.duplicates.get(name, 0) + 1
+            seen.add(event_id)
+        self.batches[name] = self.batches.get(name, 0) + 1
+        return Response(status_code=204)
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        names = set(self.batches) | set(self.rejected)
+        return {
+            name: {
+                "batches": self.batches.get(name, 0),
+                "rejected": self.rejected.get(name, 0),
+                "events": len(self.seen.get(name, ())),
+                "duplicates": self.duplicates.get(name, 0),
+            }
+            for name in sorted(names)
+        }
+
+    async def stats(self, _: Request) -> Response:
+        return JSONResponse(self.snapshot())
+
+
+def _pairs(values: List[str], convert) -> Dict[str, float]:
+    result: Dict[str, float] = {}
+    for value in values:
+        name, _, amount = value.partition(":")
+        result[name] = convert(float(amount))
+    return result
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve a local webhook receiver.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--slow", action="append", default=[], metavar="NAME:MS", help="delay batches of NAME")
+    parser.add_argument("--failing", action="append", default=[], metavar="NAME:RATE", help="reject a share of NAME's batches")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    receiver = Receiver(latency=_pairs(args.slow, lambda ms: ms / 1000), fail_rate=_pairs(args.failing, float))
+    print(json.dumps({"hooks": f"http://{args.host}:{args.port}/hook/<name>", "stats": f"http://{args.host}:{args.port}/stats"}))
+    uvicorn.run(receiver.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
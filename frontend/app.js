@@ -8,7 +8,7 @@ const state = {
 
   events: {
     page: 1,
-    pageSize: 10,
+    pageSize: 200,
     total: 0,
     filters: {
       keyword: "",
@@ -58,6 +58,28 @@ const interface4PageInfo = document.getElementById("interface4-page-info");
 const interface4Prev = document.getElementById("interface4-prev");
 const interface4Next = document.getElementById("interface4-next");
 const interface4Export = document.getElementById("interface4-export");
+const interface4ExportXlsx = document.getElementById("interface4-export-xlsx");
+const interface4Viewport = document.getElementById("interface4-viewport");
+
+// Events come back with the API's snake_case field names.
+const interface4Rows = createVirtualTable({
+  viewport: interface4Viewport,
+  body: interface4TableBody,
+  columns: 10,
+  key: (item) => item.id,
+  render: (item) => [
+    item.event_id,
+    formatTimestamp(item.triggered_at),
+    item.device_id || "--",
+    item.point_code || "--",
+    item.material_code || "--",
+    item.batch_no || "--",
+    item.produced_qty != null ? `${Number(item.produced_qty).toFixed(1)} ${item.unit || ""}`.trim() : "--",
+    `<span class="status-pill event ${item.status}">${translateEventStatus(item.status)}</span>`,
+    formatSource(item.trigger_source),
+    item.handler || "--",
+  ],
+});
 
 const LOGIN_BACKGROUND_ASSET = "/assets/images/login-background.jpg";
 
@@ -127,7 +149,11 @@ if (interface4Next) {
 }
 
 if (interface4Export) {
-  interface4Export.addEventListener("click", handleExportInterface4Events);
+  interface4Export.addEventListener("click", () => handleExportInterface4Events("csv"));
+}
+
+if (interface4ExportXlsx) {
+  interface4ExportXlsx.addEventListener("click", () => handleExportInterface4Events("xlsx"));
 }
 
 applyLoginBackgroundImage();
@@ -318,14 +344,14 @@ async function refreshData() {
     const [metrics, devices, tasks, alerts, audits, integrations] = await Promise.all([
       apiFetch("/dashboard/overview"),
       apiFetch("/monitoring/devices"),
-      apiFetch("/tasks"),
+      apiFetch("/tasks?pageSize=30"),
       apiFetch("/alerts"),
       apiFetch("/audit/logs"),
       apiFetch("/integrations"),
     ]);
     renderMetrics(metrics);
     renderDevices(devices);
-    renderTasks(tasks);
+    renderTasks(tasks.items);
     renderAlerts(alerts);
     renderAudits(audits);
     renderIntegrations(integrations);
@@ -438,81 +464,60 @@ function renderMetrics(metrics) {
 }
 
 function renderDevices(devices) {
-  deviceTable.innerHTML = devices
-    .map((device) => {
-      const alarms = device.alarms?.length ? device.alarms.join("、") : "--";
-      return `
-        <tr>
-          <td>${device.name}</td>
-          <td>${device.material || "--"}</td>
-          <td><span class="status-pill ${device.status}">${translateStatus(device.status)}</span></td>
-          <td>${device.temperature.toFixed(1)}</td>
-          <td>${device.level}%</td>
-          <td>${device.throughput.toFixed(1)}</td>
-          <td>${formatTimestamp(device.lastHeartbeat)}</td>
-          <td>${alarms}</td>
-        </tr>
-      `;
-    })
-    .join("");
+  patchRows(deviceTable, devices, {
+    key: (device) => device.deviceId,
+    render: (device) => [
+      device.name,
+      device.material || "--",
+      `<span class="status-pill ${device.status}">${translateStatus(device.status)}</span>`,
+      device.temperature.toFixed(1),
+      `${device.level}%`,
+      device.throughput.toFixed(1),
+      formatTimestamp(device.lastHeartbeat),
+      device.alarms?.length ? device.alarms.join("、") : "--",
+    ],
+  });
 }
 
 function renderTasks(tasks) {
-  taskTable.innerHTML = tasks
-    .map((task) => {
-      return `
-        <tr>
-          <td>${task.taskId}</td>
-          <td>${task.materialCode}</td>
-          <td>${task.targetDevice}</td>
-          <td>${task.quantity}</td>
-          <td class="priority ${task.priority}">${translatePriority(task.priority)}</td>
-          <td>
-            <div class="progress-bar"><span style="width:${task.progress}%"></span></div>
-            <small>${task.progress}%</small>
-          </td>
-          <td>${translateStatus(task.status)}</td>
-        </tr>
-      `;
-    })
-    .join("");
+  patchRows(taskTable, tasks, {
+    key: (task) => task.taskId,
+    render: (task) => [
+      task.taskId,
+      task.materialCode,
+      task.targetDevice,
+      task.quantity,
+      { html: translatePriority(task.priority), className: `priority ${task.priority}` },
+      `<div class="progress-bar"><span style="width:${task.progress}%"></span></div><small>${task.progress}%</small>`,
+      translateStatus(task.status),
+    ],
+  });
 }
 
 function renderAlerts(alerts) {
-  alertTable.innerHTML = alerts
-    .map((alert) => {
-      const severityClass = `severity-${alert.severity}`;
-      const statusLabel = alert.acknowledged ? "已确认" : "待处理";
-      return `
-        <tr>
-          <td>${formatTimestamp(alert.raisedAt)}</td>
-          <td>${alert.deviceId}</td>
-          <td><span class="badge ${severityClass}">${translateSeverity(alert.severity)}</span></td>
-          <td>${alert.message}</td>
-          <td>${statusLabel}</td>
-        </tr>
-      `;
-    })
-    .join("");
+  patchRows(alertTable, alerts, {
+    key: (alert) => alert.alertId,
+    render: (alert) => [
+      formatTimestamp(alert.raisedAt),
+      alert.deviceId,
+      `<span class="badge severity-${alert.severity}">${translateSeverity(alert.severity)}</span>`,
+      alert.message,
+      alert.acknowledged ? "已确认" : "待处理",
+    ],
+  });
 }
 
 function renderAudits(audits) {
-  auditList.innerHTML = audits
-    .map((log) => {
-      return `
-        <li class="audit-item">
-          <div>
-            <strong>${log.category}</strong>
-            <p>${log.description}</p>
-          </div>
-          <div class="meta">
-            <div>${formatTimestamp(log.timestamp)}</div>
-            <div>${log.actor}</div>
-          </div>
-        </li>
-      `;
-    })
-    .join("");
+  patchRows(auditList, audits, {
+    key: (log) => log.logId,
+    rowTag: "li",
+    rowClass: "audit-item",
+    cellTag: "div",
+    render: (log) => [
+      `<strong>${log.category}</strong><p>${log.description}</p>`,
+      { html: `<div>${formatTimestamp(log.timestamp)}</div><div>${log.actor}</div>`, className: "meta" },
+    ],
+  });
 }
 
 function renderIntegrations(integrations) {
@@ -535,25 +540,7 @@ function renderIntegrations(integrations) {
 
 function renderInterface4Events(data) {
   const items = Array.isArray(data.items) ? data.items : [];
-  interface4TableBody.innerHTML = items
-    .map((item) => {
-      const quantity = item.producedQty != null ? `${Number(item.producedQty).toFixed(1)} ${item.unit || ""}`.trim() : "--";
-      return `
-        <tr>
-          <td>${item.eventId}</td>
-          <td>${formatTimestamp(item.triggeredAt)}</td>
-          <td>${item.deviceId || "--"}</td>
-          <td>${item.pointCode || "--"}</td>
-          <td>${item.materialCode || "--"}</td>
-          <td>${item.batchNo || "--"}</td>
-          <td>${quantity}</td>
-          <td><span class="status-pill event ${item.status}">${translateEventStatus(item.status)}</span></td>
-          <td>${formatSource(item.triggerSource)}</td>
-          <td>${item.handler || "--"}</td>
-        </tr>
-      `;
-    })
-    .join("");
+  interface4Rows.setItems(items);
 
   interface4Empty.classList.toggle("hidden", items.length > 0);
   const total = typeof data.total === "number" ? data.total : 0;
@@ -590,6 +577,7 @@ async function loadInterface4Events({ resetPage = false } = {}) {
     interface4Feedback.textContent = "正在加载...";
     const data = await apiFetch(`/interface4/events?${params.toString()}`);
     renderInterface4Events(data);
+    interface4Rows.scrollToTop();
     interface4Feedback.textContent = "";
   } catch (error) {
     interface4Feedback.textContent = error.message || "加载失败";
@@ -597,9 +585,9 @@ async function loadInterface4Events({ resetPage = false } = {}) {
   }
 }
 
-async function handleExportInterface4Events() {
+async function handleExportInterface4Events(format = "csv") {
   if (!state.token) return;
-  const params = new URLSearchParams();
+  const params = new URLSearchParams({ format });
   const { keyword, status, start, end } = state.events.filters;
   if (keyword) params.set("keyword", keyword);
   if (status) params.set("status", status);
@@ -612,7 +600,7 @@ async function handleExportInterface4Events() {
     const url = window.URL.createObjectURL(blob);
     const link = document.createElement("a");
     link.href = url;
-    link.download = `interface4-events-${Date.now()}.csv`;
+    link.download = `interface4-events-${Date.now()}.${format}`;
     document.body.appendChild(link);
     link.click();
     link.remove();
@@ -624,6 +612,107 @@ async function handleExportInterface4Events() {
 }
 
 
+// Keyed reconciliation for table bodies and lists: rows are matched by key and
+// moved rather than rebuilt, and a cell is only written when its markup changed,
+// so a refresh costs DOM work in proportion to what changed. Rows are placed
+// between `after` and the next non-keyed node (the bottom spacer of a virtual
+// table); cells are HTML strings or { html, className }.
+function patchRows(container, items, { key, render, rowTag = "tr", rowClass = "", cellTag = "td", after = null }) {
+  const rows = container.keyedRows || (container.keyedRows = new Map());
+  const seen = new Set();
+  let cursor = after ? after.nextSibling : container.firstChild;
+  for (const item of items) {
+    const itemKey = String(key(item));
+    let rowKey = itemKey;
+    // A repeated key would reuse one row for both items and drop the first; repeats get rows of their own.
+    for (let repeat = 2; seen.has(rowKey); repeat += 1) rowKey = `${itemKey}#${repeat}`;
+    seen.add(rowKey);
+    let row = rows.get(rowKey);
+    if (!row) {
+      row = document.createElement(rowTag);
+      if (rowClass) row.className = rowClass;
+      row.cellMarkup = [];
+      rows.set(rowKey, row);
+    }
+    patchCells(row, render(item), cellTag);
+    if (row === cursor) {
+      cursor = cursor.nextSibling;
+    } else {
+      container.insertBefore(row, cursor);
+    }
+  }
+  for (const [rowKey, row] of rows) {
+    if (!seen.has(rowKey)) {
+      row.remove();
+      rows.delete(rowKey);
+    }
+  }
+}
+
+function patchCells(row, cells, cellTag) {
+  cells.forEach((cell, index) => {
+    const html = typeof cell === "object" && cell !== null ? cell.html : String(cell ?? "");
+    const className = typeof cell === "object" && cell !== null ? cell.className || "" : "";
+    const markup = `${className}\u0000${html}`;
+    if (row.cellMarkup[index] === markup) return;
+    const element = row.children[index] || row.appendChild(document.createElement(cellTag));
+    element.className = className;
+    element.innerHTML = html;
+    row.cellMarkup[index] = markup;
+  });
+}
+
+// Renders only the rows inside the scroll viewport (plus `overscan` above and
+// below) between two spacer rows that stand in for the rest, so a long list
+// costs the same as a screenful. Row height is measured from the first row.
+function createVirtualTable({ viewport, body, columns, key, render, overscan = 8 }) {
+  const top = document.createElement("tr");
+  const bottom = document.createElement("tr");
+  top.className = bottom.className = "virtual-spacer";
+  top.innerHTML = bottom.innerHTML = `<td colspan="${columns}"></td>`;
+  body.append(top, bottom);
+
+  let items = [];
+  let rowHeight = 0;
+  let scheduled = false;
+
+  function update() {
+    scheduled = false;
+    if (!rowHeight && items.length) {
+      // Stays unmeasured (0) while the page is hidden; measured on the next update.
+      patchRows(body, items.slice(0, 1), { key, render, after: top });
+      rowHeight = top.nextSibling.getBoundingClientRect().height;
+    }
+    const height = rowHeight || 48;
+    const first = Math.max(0, Math.floor(viewport.scrollTop / height) - overscan);
+    const visible = Math.ceil(viewport.clientHeight / height) + overscan * 2;
+    const last = Math.min(items.length, first + visible);
+    patchRows(body, items.slice(first, last), { key, render, after: top });
+    top.firstChild.style.height = `${first * height}px`;
+    bottom.firstChild.style.height = `${(items.length - last) * height}px`;
+  }
+
+  function schedule() {
+    if (!scheduled) {
+      scheduled = true;
+      window.requestAnimationFrame(update);
+    }
+  }
+
+  viewport.addEventListener("scroll", schedule, { passive: true });
+  window.addEventListener("resize", schedule);
+
+  return {
+    setItems(next) {
+      items = next;
+      schedule();
+    },
+    scrollToTop() {
+      viewport.scrollTop = 0;
+    },
+  };
+}
+
 function translateStatus(status) {
   const map = {
     online: "在线",